@@ -45,6 +45,7 @@ class Base(Configuration):
 
     MIDDLEWARE = [
         'log_request_id.middleware.RequestIDMiddleware',
+        'flocarebase.middleware.CompressionMiddleware',
         'flocarebase.middleware.DBStatsMiddleWare',
         'django.middleware.security.SecurityMiddleware',
         'django.contrib.sessions.middleware.SessionMiddleware',
@@ -126,4 +127,41 @@ class Base(Configuration):
     pnconfig.ssl = True
 
     PUBNUB = PubNub(pnconfig)
+    # One of the publishers in flocarebase.common.publishers. Messages are only sent to PubNub by the PubnubPublisher
+    PUBNUB_PUBLISHER = os.environ.get('PUBNUB_PUBLISHER', 'flocarebase.common.publishers.PubnubPublisher')
+    # Where the HttpSinkPublisher posts messages to
+    PUBNUB_SINK_URL = os.environ.get('PUBNUB_SINK_URL', 'http://127.0.0.1:8765/')
+
+    # Local memory by default. Point it at a cache shared by the workers, eg: Redis, with the CACHE_BACKEND and
+    # CACHE_LOCATION environment variables
+    CACHES = {
+        'default': {
+            'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+            'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+        }
+    }
+
+    # Used by user_auth.authentication.CachedTokenAuthentication. With a per-process cache, invalidations only reach
+    # the worker that made the change, so prod only uses it with a shared CACHE_BACKEND
+    AUTH_TOKEN_CACHE_ALIAS = 'default'
+    AUTH_TOKEN_CACHE_TTL = 60
+
+    # Fraction of the requests whose latency, DB queries and DB time are recorded by DBStatsMiddleWare
+    DB_STATS_SAMPLE_RATE = float(os.environ.get('DB_STATS_SAMPLE_RATE', '0.1'))
+    # Bearer token required to scrape the metrics endpoint. When this is empty, the endpoint is open with DEBUG on
+    # and denied otherwise
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+    # Stream the large list responses (full syncs, org patients and visits) a chunk of rows at a time, instead of
+    # rendering them whole. See flocarebase.common.streaming
+    STREAMING_RESPONSES = False
+
+    # The bytes rendered by flocarebase.renderers.FastJSONRenderer are the same as the ones of the REST framework's
+    # JSONRenderer. Off, orjson encodes the datetimes, UUIDs and floats itself
+    JSON_RENDERER_COMPAT = True
+
+    # Gzip the responses of at least GZIP_MIN_LENGTH bytes, and the streaming ones. See
+    # flocarebase.middleware.CompressionMiddleware
+    GZIP_RESPONSES = False
+    GZIP_MIN_LENGTH = 1024
 
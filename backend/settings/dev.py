@@ -25,9 +25,11 @@ class Dev(Base):
 
     CORS_ORIGIN_ALLOW_ALL = True
 
+    DB_STATS_SAMPLE_RATE = 1.0
+
     REST_FRAMEWORK = {
         'DEFAULT_AUTHENTICATION_CLASSES': (
-            'rest_framework.authentication.TokenAuthentication',
+            'user_auth.authentication.TokenAuthentication',
         ),
         # 'DEFAULT_PERMISSION_CLASSES': (
         #     'rest_framework.permissions.IsAuthenticated',
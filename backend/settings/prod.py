@@ -37,10 +37,30 @@ class Prod(Base):
     #     'dashboard.flocare.health:80',
     # )
 
+    STREAMING_RESPONSES = True
+    GZIP_RESPONSES = True
+
+    # The cached authentication only with a cache shared by the workers. With a per-process one, a token deleted or a
+    # user deactivated on one worker would keep authenticating on the others until their entries expire
+    if Base.CACHES['default']['BACKEND'] in ('django.core.cache.backends.locmem.LocMemCache',
+                                             'django.core.cache.backends.dummy.DummyCache'):
+        authentication_class = 'user_auth.authentication.TokenAuthentication'
+    else:
+        authentication_class = 'user_auth.authentication.CachedTokenAuthentication'
+
     # Todo: Revisit the REST FRAMEWORK settings for prod
     REST_FRAMEWORK = {
         'DEFAULT_AUTHENTICATION_CLASSES': (
-            'rest_framework.authentication.TokenAuthentication',
+            authentication_class,
+        ),
+        'DEFAULT_RENDERER_CLASSES': (
+            'flocarebase.renderers.FastJSONRenderer',
+            'rest_framework.renderers.BrowsableAPIRenderer',
+        ),
+        'DEFAULT_PARSER_CLASSES': (
+            'flocarebase.renderers.FastJSONParser',
+            'rest_framework.parsers.FormParser',
+            'rest_framework.parsers.MultiPartParser',
         ),
         # Todo: Uncomment in production
         # 'DEFAULT_PERMISSION_CLASSES': (
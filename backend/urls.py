@@ -18,6 +18,7 @@ from django.urls import path
 from django.conf.urls import url, include
 from rest_framework.authtoken import views as rest_framework_views
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
+from flocarebase import views as flocarebase_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -25,6 +26,7 @@ urlpatterns = [
     path('users/', include('user_auth.urls')),
     url(r'^api-auth/', include('rest_framework.urls')),
     url(r'^get-token/$', rest_framework_views.obtain_auth_token, name='get_auth_token'),
+    url(r'^metrics/$', flocarebase_views.metrics, name='metrics'),
 ]
 
 urlpatterns += staticfiles_urlpatterns()
@@ -0,0 +1,91 @@
+"""
+In process metrics, exported in the Prometheus text format. Every worker process keeps its own metrics, and the
+Prometheus server aggregates the scrapes of all of them
+"""
+from collections import OrderedDict
+
+import threading
+
+
+class Histogram:
+    """
+    Cumulative histogram with a fixed set of label names, like the Prometheus client ones
+    """
+    def __init__(self, name, description, label_names, buckets):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            # label values -> [bucket counts..., +Inf count, sum]
+            self.series = OrderedDict()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def get_series(self, **labels):
+        """
+        Returns (count, sum) of the observations with the labels, or None if there are none
+        """
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self.lock:
+            series = self.series.get(key)
+            return None if series is None else (series[-2], series[-1])
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.description), '# TYPE %s histogram' % self.name]
+        with self.lock:
+            items = [(key, list(series)) for key, series in self.series.items()]
+        for key, series in items:
+            labels = ['%s="%s"' % (name, escape_label_value(value)) for name, value in zip(self.label_names, key)]
+            for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+                bucket_labels = ','.join(labels + ['le="%s"' % format_value(bound)])
+                lines.append('%s_bucket{%s} %s' % (self.name, bucket_labels, count))
+            lines.append('%s_sum{%s} %s' % (self.name, ','.join(labels), format_value(series[-1])))
+            lines.append('%s_count{%s} %s' % (self.name, ','.join(labels), series[-2]))
+        return '\n'.join(lines)
+
+
+def escape_label_value(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_value(value):
+    return value if isinstance(value, str) else repr(float(value))
+
+
+REQUEST_LABELS = ('route', 'method')
+
+REQUEST_DURATION = Histogram(
+    'flocare_request_duration_seconds', 'Latency of the sampled requests', REQUEST_LABELS,
+    (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+REQUEST_DB_QUERIES = Histogram(
+    'flocare_request_db_queries', 'DB queries made by the sampled requests', REQUEST_LABELS,
+    (0, 1, 2, 5, 10, 20, 50, 100, 200, 500))
+REQUEST_DB_DURATION = Histogram(
+    'flocare_request_db_duration_seconds', 'Time spent in DB queries by the sampled requests', REQUEST_LABELS,
+    (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+
+HISTOGRAMS = (REQUEST_DURATION, REQUEST_DB_QUERIES, REQUEST_DB_DURATION)
+
+
+def render_metrics():
+    return '\n'.join(histogram.render() for histogram in HISTOGRAMS) + '\n'
+
+
+def reset_metrics():
+    for histogram in HISTOGRAMS:
+        histogram.reset()
@@ -0,0 +1,108 @@
+"""
+Keyset (cursor) pagination for the list endpoints. A page is fetched by seeking past the sort key and the primary key
+of the last row of the previous page, instead of with an OFFSET, so deep pages cost the same as the first one
+"""
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from flocarebase.constants import CURSOR_PAGE_SIZE, MAX_CURSOR_PAGE_SIZE
+from flocarebase.exceptions import InvalidPayloadError
+
+import base64
+import binascii
+import datetime
+import json
+
+CURSOR_PARAM = 'cursor'
+NEXT_CURSOR_HEADER = 'next-cursor'
+
+
+def is_cursor_request(query_params):
+    return CURSOR_PARAM in query_params
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """
+    Keeps the microseconds that DjangoJSONEncoder truncates to milliseconds, so that the rows created in the same
+    millisecond as the last row of a page are not skipped
+    """
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(sort_field, sort_value, pk):
+    data = json.dumps([sort_field, sort_value, pk], cls=CursorEncoder)
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, sort_field):
+    try:
+        cursor_sort_field, sort_value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except (binascii.Error, UnicodeError, ValueError, TypeError):
+        raise InvalidPayloadError('Invalid cursor passed')
+    if cursor_sort_field != sort_field:
+        raise InvalidPayloadError('Cursor was created for a different sort order')
+    return sort_value, pk
+
+
+def get_page_size(size):
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        return CURSOR_PAGE_SIZE
+    return min(max(size, 1), MAX_CURSOR_PAGE_SIZE)
+
+
+def get_sort_value(obj, field):
+    for attribute in field.split('__'):
+        obj = getattr(obj, attribute)
+    return obj
+
+
+def get_seek_filter(field, descending, sort_value, pk):
+    """
+    Rows after (sort_value, pk), with Postgres ordering NULLs last in ascending and first in descending order
+    """
+    after = 'lt' if descending else 'gt'
+    if sort_value is None:
+        seek = Q(**{field + '__isnull': True, 'pk__' + after: pk})
+        if descending:
+            seek |= Q(**{field + '__isnull': False})
+        return seek
+    # The redundant bound on the sort key lets an index on (sort key, pk) seek to the position
+    bound = Q(**{field + ('__lte' if descending else '__gte'): sort_value})
+    seek = bound & (Q(**{field + '__' + after: sort_value}) | Q(**{field: sort_value, 'pk__' + after: pk}))
+    if not descending:
+        seek |= Q(**{field + '__isnull': True})
+    return seek
+
+
+def paginate_by_cursor(queryset, sort_field, query_params):
+    """
+    Returns the page of the queryset after the cursor in the query params, ordered by the sort field (prefixed with
+    '-' for descending) and the primary key, and the cursor of the next page or None if this is the last one
+    """
+    descending = sort_field.startswith('-')
+    field = sort_field.lstrip('-')
+    size = get_page_size(query_params.get('size'))
+    queryset = queryset.order_by(sort_field, '-pk' if descending else 'pk')
+    cursor = query_params.get(CURSOR_PARAM)
+    if cursor:
+        queryset = queryset.filter(get_seek_filter(field, descending, *decode_cursor(cursor, sort_field)))
+
+    # One extra row tells whether there is a next page
+    objects = list(queryset[:size + 1])
+    if len(objects) <= size:
+        return objects, None
+    objects = objects[:size]
+    last = objects[-1]
+    return objects, encode_cursor(sort_field, get_sort_value(last, field), last.pk)
+
+
+def set_next_cursor(response, next_cursor):
+    # Custom header, whitelisted for the browser like content-range
+    if next_cursor:
+        response[NEXT_CURSOR_HEADER] = next_cursor
+    response['Access-Control-Expose-Headers'] = NEXT_CURSOR_HEADER
+    return response
@@ -0,0 +1,49 @@
+"""
+Backends that PubNub messages are published with. settings.PUBNUB_PUBLISHER names the one in use
+"""
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+import requests
+
+
+class PubnubPublisher:
+
+    def publish(self, channel, message):
+        # Raises PubNubException if the message could not be published
+        settings.PUBNUB.publish().channel(channel).message(message).sync()
+
+
+class InMemoryPublisher:
+    """
+    Records the messages instead of publishing them, for local runs and benchmarks
+    """
+    messages = list()
+
+    def publish(self, channel, message):
+        InMemoryPublisher.messages.append((channel, message))
+
+    @staticmethod
+    def clear():
+        del InMemoryPublisher.messages[:]
+
+
+class HttpSinkPublisher:
+    """
+    Posts the messages as JSON to settings.PUBNUB_SINK_URL, eg: to the run_pubnub_sink command standing in for PubNub
+    """
+    def __init__(self):
+        self.session = requests.Session()
+
+    def publish(self, channel, message):
+        response = self.session.post(settings.PUBNUB_SINK_URL, json={'channel': channel, 'message': message}, timeout=5)
+        response.raise_for_status()
+
+
+_publishers = dict()
+
+
+def get_publisher():
+    if settings.PUBNUB_PUBLISHER not in _publishers:
+        _publishers[settings.PUBNUB_PUBLISHER] = import_string(settings.PUBNUB_PUBLISHER)()
+    return _publishers[settings.PUBNUB_PUBLISHER]
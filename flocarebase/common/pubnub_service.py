@@ -1,5 +1,12 @@
-from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from flocarebase.constants import PUBNUB_OUTBOX_BATCH_SIZE, PUBNUB_OUTBOX_MAX_ATTEMPTS, PUBNUB_OUTBOX_RETRY_SECONDS, \
+    PUBNUB_OUTBOX_RETENTION_DAYS, PUBNUB_MERGEABLE_ACTIONS
+from flocarebase.common.publishers import get_publisher
+from flocarebase.models import PubnubOutboxMessage
 
+import datetime
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,7 +18,108 @@ class PubnubService:
 
     @staticmethod
     def publish(channel, message):
-        settings.PUBNUB.publish().channel(channel).message(message).async(my_publish_callback)
+        # Queued in the caller's transaction, and published by the drain_pubnub_outbox command once it commits
+        PubnubOutboxMessage.objects.create(channel=channel, message=json.dumps(message))
+
+    @staticmethod
+    def publish_now(channel, message, publisher=None):
+        # Raises if the message could not be published
+        (publisher or get_publisher()).publish(channel, message)
+
+    @staticmethod
+    def is_mergeable(message):
+        return message.get('actionType') in PUBNUB_MERGEABLE_ACTIONS and \
+            set(message.keys()) <= {'actionType', 'patientID', 'patientIDs'}
+
+    @staticmethod
+    def coalesce(outbox_messages):
+        """
+        Returns the (channel, message, outbox messages) to publish for the outbox messages. A message repeating the
+        last one published to its channel is dropped, and consecutive mergeable messages of an action to a channel are
+        published as one message, with the IDs of all their patients in patientIDs. Only the last message of a channel
+        is compared, so that an action undone and redone in between is published again
+        """
+        coalesced = list()
+        last_on_channel = dict()
+        for outbox_message in outbox_messages:
+            channel = outbox_message.channel
+            message = json.loads(outbox_message.message)
+            last = last_on_channel.get(channel)
+            if last and last[1] == message:
+                last[2].append(outbox_message)
+                continue
+
+            if last and PubnubService.is_mergeable(message) and PubnubService.is_mergeable(last[1]) and \
+                    last[1]['actionType'] == message['actionType']:
+                patient_ids = last[1].setdefault('patientIDs', [last[1]['patientID']])
+                if message['patientID'] not in patient_ids:
+                    patient_ids.append(message['patientID'])
+                last[2].append(outbox_message)
+                continue
+
+            last = (channel, message, [outbox_message])
+            coalesced.append(last)
+            last_on_channel[channel] = last
+        return coalesced
+
+    @staticmethod
+    def get_retry_at(channels):
+        """
+        Returns the time of the next attempt of the earliest message waiting for a retry, of each of the channels
+        """
+        waiting = PubnubOutboxMessage.objects.filter(channel__in=channels, published_at=None,
+                                                     attempts__lt=PUBNUB_OUTBOX_MAX_ATTEMPTS,
+                                                     next_attempt_at__gt=timezone.now())
+        retry_at = dict()
+        for channel, next_attempt_at in waiting.order_by('id').values_list('channel', 'next_attempt_at'):
+            retry_at.setdefault(channel, next_attempt_at)
+        return retry_at
+
+    @staticmethod
+    def defer(outbox_messages, next_attempt_at):
+        if outbox_messages:
+            PubnubOutboxMessage.objects.filter(id__in=[outbox_message.id for outbox_message in outbox_messages])\
+                .update(next_attempt_at=next_attempt_at)
+
+    @staticmethod
+    def drain_outbox(batch_size=PUBNUB_OUTBOX_BATCH_SIZE, publisher=None):
+        """
+        Publishes the oldest pending messages of the outbox, coalesced. Failed messages are retried later with
+        exponential backoff, up to PUBNUB_OUTBOX_MAX_ATTEMPTS times. The messages of a channel are published in order:
+        the ones after a failed message, or after one waiting for a retry, are deferred to its retry. Returns the
+        number of messages attempted or deferred
+        """
+        with transaction.atomic():
+            # Locked rows are skipped, so that multiple workers can drain the outbox
+            pending = list(PubnubOutboxMessage.objects.select_for_update(skip_locked=True)
+                           .filter(published_at=None, attempts__lt=PUBNUB_OUTBOX_MAX_ATTEMPTS,
+                                   next_attempt_at__lte=timezone.now())
+                           .order_by('id')[:batch_size])
+            retry_at = PubnubService.get_retry_at({outbox_message.channel for outbox_message in pending})
+            published_ids = list()
+            for channel, message, outbox_messages in PubnubService.coalesce(pending):
+                if channel in retry_at:
+                    PubnubService.defer(outbox_messages, retry_at[channel])
+                    continue
+                try:
+                    PubnubService.publish_now(channel, message, publisher)
+                    published_ids.extend([outbox_message.id for outbox_message in outbox_messages])
+                except Exception as e:
+                    logger.error('Error in publishing message to channel %s: %s' % (channel, str(e)))
+                    for outbox_message in outbox_messages:
+                        outbox_message.attempts += 1
+                        outbox_message.next_attempt_at = timezone.now() + datetime.timedelta(
+                            seconds=PUBNUB_OUTBOX_RETRY_SECONDS * 2 ** (outbox_message.attempts - 1))
+                        outbox_message.last_error = str(e)
+                        outbox_message.save(update_fields=['attempts', 'next_attempt_at', 'last_error'])
+                    retry_at[channel] = max(outbox_message.next_attempt_at for outbox_message in outbox_messages)
+            PubnubOutboxMessage.objects.filter(id__in=published_ids).update(published_at=timezone.now())
+        return len(pending)
+
+    @staticmethod
+    def prune_outbox():
+        published_before = timezone.now() - datetime.timedelta(days=PUBNUB_OUTBOX_RETENTION_DAYS)
+        return PubnubOutboxMessage.objects.filter(published_at__lt=published_before).delete()
 
     @staticmethod
     def get_organization_channel(organization):
@@ -23,14 +131,3 @@ class PubnubService:
             'actionType': 'USER_UPDATE',
             'userID': str(user.uuid)
         }
-
-
-def my_publish_callback(envelope, status):
-    # Check whether request successfully completed or not
-    if not status.is_error():
-        logger.info("# Message successfully published to specified channel.")
-    else:
-        logger.error("# NOT Message successfully published to specified channel.")
-        # Handle message publish error. Check 'category' property to find out possible issue
-        # because of which request did fail.
-        # Request can be resent using: [status retry];
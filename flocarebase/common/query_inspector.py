@@ -0,0 +1,66 @@
+"""
+Records the SQL run on the connection, and finds the statements repeated with different parameters, the telltale of
+N+1 queries: one query per row of a list instead of one query for the whole list
+"""
+from collections import Counter
+from django.db import connection
+
+import re
+
+# The threshold for repeated statements in the query budgets of the tests
+REPEATED_QUERY_THRESHOLD = 3
+
+IN_LIST_RE = re.compile(r'\bIN \(%s(?:\s*,\s*%s)*\)')
+VALUES_LIST_RE = re.compile(r'\bVALUES \(%s(?:\s*,\s*%s)*\)(?:\s*,\s*\(%s(?:\s*,\s*%s)*\))*')
+NUMBER_RE = re.compile(r'\b\d+\b')
+WHITESPACE_RE = re.compile(r'\s+')
+TRANSACTION_RE = re.compile(r'^(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT|BEGIN|COMMIT|ROLLBACK)\b')
+
+
+def get_statement_shape(sql):
+    """
+    The statement with its literals and the lengths of its IN and VALUES lists erased, so that the same query run for
+    different rows has the same shape
+    """
+    shape = IN_LIST_RE.sub('IN (...)', sql)
+    shape = VALUES_LIST_RE.sub('VALUES (...)', shape)
+    shape = NUMBER_RE.sub('?', shape)
+    return WHITESPACE_RE.sub(' ', shape).strip()
+
+
+def find_repeated_statements(statements, threshold=REPEATED_QUERY_THRESHOLD):
+    """
+    Returns (shape, count) of the statements run more than threshold times, most repeated first. Transaction control
+    statements are left out, as every atomic block runs them
+    """
+    shapes = Counter(get_statement_shape(sql) for sql in statements if not TRANSACTION_RE.match(sql.lstrip()))
+    return [(shape, count) for shape, count in shapes.most_common() if count > threshold]
+
+
+class QueryRecorder(object):
+    """
+    Context manager recording the statements run on the connection. Works with DEBUG off, unlike connection.queries
+
+        with QueryRecorder() as recorder:
+            ...
+        recorder.statements
+    """
+    def __init__(self, using=connection):
+        self.connection = using
+        self.statements = list()
+        self.wrapper = None
+
+    def __call__(self, execute, sql, params, many, context):
+        self.statements.append(sql)
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self.wrapper = self.connection.execute_wrapper(self)
+        self.wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wrapper.__exit__(*exc_info)
+
+    def find_repeated_statements(self, threshold=REPEATED_QUERY_THRESHOLD):
+        return find_repeated_statements(self.statements, threshold)
@@ -0,0 +1,15 @@
+"""
+Name search for the admin autocomplete. Every word of the query has to be the start of the first or the last name.
+istartswith compiles to UPPER(column::text) LIKE 'WORD%', which the UPPER(...) text_pattern_ops indexes created by
+the name search migrations serve
+"""
+from django.db.models import Q
+
+
+def filter_by_name(queryset, query, first_name_field='first_name', last_name_field='last_name'):
+    if not query:
+        return queryset
+    for word in query.split():
+        queryset = queryset.filter(Q(**{first_name_field + '__istartswith': word}) |
+                                   Q(**{last_name_field + '__istartswith': word}))
+    return queryset
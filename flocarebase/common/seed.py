@@ -0,0 +1,29 @@
+"""
+Organizations and users with random names, for the tests and the benchmark commands
+"""
+from django.contrib.auth.models import User
+from user_auth.models import Organization, UserOrganizationAccess, UserProfile
+
+import random
+
+
+def create_organization():
+    return Organization.objects.create(name='org' + str(random.randint(0, 10000)), type='org', contact_no='234343')
+
+
+def create_user(organization, first_name=None, last_name=None):
+    tag = str(random.randint(0, 10000))
+    user = User.objects.create_user(
+        first_name=first_name or ('firstName_' + tag),
+        last_name=last_name or ('lastName_' + tag),
+        username='username_' + tag,
+        password='password_'+tag,
+        email='email_'+tag
+    )
+    user_profile = UserProfile.objects.create(user=user, title='', contact_no='phone_' + tag)
+    UserOrganizationAccess.objects.create(user=user_profile, organization=organization, user_role='user_role')
+    return user_profile
+
+
+def make_user_admin(user_profile):
+    UserOrganizationAccess.objects.filter(user=user_profile).update(is_admin=True)
@@ -0,0 +1,43 @@
+"""
+Streaming JSON array responses. The rows are read from the DB with a server side cursor and serialized a chunk at a
+time, so that the memory taken by a response is bounded by the chunk size instead of the number of rows, and the
+client gets the first bytes before the last rows are read. The body is the same as rendering the whole list at once
+"""
+from django.db.models.query import QuerySet
+from django.http import StreamingHttpResponse
+from flocarebase.constants import STREAMING_CHUNK_SIZE
+from rest_framework.settings import api_settings
+
+import itertools
+
+
+def iterate_in_chunks(rows, chunk_size=None):
+    chunk_size = chunk_size or STREAMING_CHUNK_SIZE
+    # prefetch_related is ignored by QuerySet.iterator, so relations are fetched per chunk by the serialize callables
+    rows = rows.iterator(chunk_size=chunk_size) if isinstance(rows, QuerySet) else iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def stream_json_array(rows, serialize, chunk_size=None):
+    """
+    Yields the JSON array of the serialized rows. serialize(chunk) returns the serialized data of a list of rows
+    """
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+    yield b'['
+    separator = b''
+    for chunk in iterate_in_chunks(rows, chunk_size):
+        # Strips the brackets of the rendered chunk
+        yield separator + renderer.render(serialize(chunk))[1:-1]
+        separator = b','
+    yield b']'
+
+
+def streaming_json_response(rows, serialize, chunk_size=None):
+    """
+    Errors raised while the response is sent cannot change its status, they cut the response short
+    """
+    return StreamingHttpResponse(stream_json_array(rows, serialize, chunk_size), content_type='application/json')
@@ -1,9 +1,14 @@
+from contextlib import contextmanager
+from django.db import transaction
 from django.test import TestCase, Client
+from django.urls import URLResolver, resolve
+from flocarebase.common.query_inspector import QueryRecorder, REPEATED_QUERY_THRESHOLD
+from flocarebase.common.seed import create_organization, create_user, make_user_admin
 from rest_framework.authtoken.models import Token
 from unittest.mock import patch
 from user_auth.models import *
 
-import random
+import json
 
 
 # To be used for unit test cases
@@ -27,6 +32,18 @@ class BaseTestCase(TestCase):
         self.addCleanup(patcher.stop)
         return class_mock
 
+    """
+    Fails if the block runs more than `budget` queries, or the same statement more than `threshold` times
+    Eg: with self.assertQueryBudget(5): self.client.get(url)
+    """
+    @contextmanager
+    def assertQueryBudget(self, budget, threshold=REPEATED_QUERY_THRESHOLD):
+        with QueryRecorder() as recorder:
+            yield recorder
+        repeated = recorder.find_repeated_statements(threshold)
+        self.assertListEqual(repeated, [], 'Statements run more than %d times, N+1 queries?' % threshold)
+        self.assertLessEqual(len(recorder.statements), budget, '\n'.join(recorder.statements))
+
 
 # TO be used for integration tests
 class UserRequestTestCase(BaseTestCase):
@@ -43,25 +60,70 @@ class UserRequestTestCase(BaseTestCase):
     def get_base_headers(self):
         return {"HTTP_AUTHORIZATION": self.authorization_header}
 
+    def request(self, method, path, data=None):
+        if method == 'get':
+            return self.client.get(path, data or {}, **self.get_base_headers())
+        return getattr(self.client, method)(path, json.dumps(data or {}), 'application/json', **self.get_base_headers())
 
-def create_organization():
-    return Organization.objects.create(name='org' + str(random.randint(0, 10000)), type='org', contact_no='234343')
-
+    """
+    Makes every request of the QueryBudgets, and fails if any of them fails (or returns another status than the
+    expected one), runs more queries than its budget, or repeats a statement more than it may. Every request runs in a
+    savepoint that is rolled back, so that they all see the same data. Reports all the requests over budget at once
+    """
+    def assertQueryBudgets(self, budgets):
+        failures = list()
+        for budget in budgets:
+            savepoint = transaction.savepoint()
+            try:
+                with QueryRecorder() as recorder:
+                    response = self.request(budget.method, budget.path, budget.data)
+                    if response.streaming:
+                        # The queries of a streamed response run while its body is read
+                        b''.join(response.streaming_content)
+            finally:
+                transaction.savepoint_rollback(savepoint)
+            repeated = recorder.find_repeated_statements(budget.repeats)
+            succeeded = response.status_code == budget.status if budget.status else response.status_code < 400
+            if not succeeded:
+                failures.append('%s returned %d' % (budget, response.status_code))
+            elif repeated:
+                failures.append('%s repeats %s' % (budget, repeated))
+            elif len(recorder.statements) > budget.queries:
+                failures.append('%s ran %d queries, over its budget of %d' % (
+                    budget, len(recorder.statements), budget.queries))
+        self.assertListEqual(failures, [])
 
-def create_user(organization, first_name=None, last_name=None):
-    tag = str(random.randint(0, 10000))
-    user = User.objects.create_user(
-        first_name=first_name or ('firstName_' + tag),
-        last_name=last_name or ('lastName_' + tag),
-        username='username_' + tag,
-        password='password_'+tag,
-        email='email_'+tag
-    )
-    user_profile = UserProfile.objects.create(user=user, title='', contact_no='phone_' + tag)
-    print('creating user org access for in create user : ' + str(user_profile.uuid))
-    UserOrganizationAccess.objects.create(user=user_profile, organization=organization, user_role='user_role')
-    return user_profile
+    """
+    Fails if a url pattern of the urlconf module is not matched by any of the QueryBudgets
+    """
+    def assertRoutesCovered(self, urlconf, budgets):
+        callbacks = {resolve(budget.path).func for budget in budgets}
+        missing = [str(pattern.pattern) for pattern in get_url_patterns(urlconf.urlpatterns)
+                   if pattern.callback not in callbacks]
+        self.assertListEqual(missing, [], 'Routes without a query budget')
 
 
-def make_user_admin(user_profile):
-    UserOrganizationAccess.objects.filter(user=user_profile).update(is_admin=True)
+class QueryBudget(object):
+    """
+    A request with the most queries it may take, and the most times it may repeat a statement. A request that
+    legitimately repeats a statement once per row passes a higher repeats, along-with the reason
+    """
+    def __init__(self, method, path, data=None, queries=0, repeats=REPEATED_QUERY_THRESHOLD, status=None):
+        self.method = method
+        self.path = path
+        self.data = data
+        self.queries = queries
+        self.repeats = repeats
+        # Any successful status when None
+        self.status = status
+
+    def __str__(self):
+        return '%s %s' % (self.method.upper(), self.path)
+
+
+def get_url_patterns(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from get_url_patterns(pattern.url_patterns)
+        else:
+            yield pattern
@@ -0,0 +1,121 @@
+"""
+Read only serializers of the values_list() rows of a queryset. For the large read endpoints, where instantiating a
+model and running the DRF fields for every row takes most of the CPU time. A ValuesSerializer declares the same JSON
+keys as the DRF serializer it stands in for, and is compiled once into the lookups to read and the conversion of a
+row tuple to a dict:
+
+    class PlaceValuesSerializer(ValuesSerializer):
+        fields = (
+            ('placeID', Value('uuid', str)),
+            ('name', Value('name')),
+            ('address', Nested('address', ADDRESS_FIELDS)),
+        )
+
+    PlaceValuesSerializer.serialize(Place.objects.filter(...))
+
+Keep it in step with the DRF serializer, the parity tests compare the two
+"""
+
+
+class Value(object):
+    """
+    The value of a lookup, passed through convert unless it is None
+    """
+    def __init__(self, lookup, convert=None):
+        self.lookup = lookup
+        self.convert = convert
+
+
+class Computed(object):
+    """
+    compute(*values) of the values of several lookups, like a SerializerMethodField
+    """
+    def __init__(self, lookups, compute):
+        self.lookups = tuple(lookups)
+        self.compute = compute
+
+
+class Nested(object):
+    """
+    A nested object, whose lookups are relative to prefix. None when the lookup of its primary key is None, like a
+    nested DRF serializer of a missing relation
+    """
+    def __init__(self, prefix, fields, pk='uuid'):
+        self.prefix = prefix
+        self.fields = tuple(fields)
+        self.pk = pk
+
+
+def compile_fields(fields, lookups, prefix=''):
+    """
+    Returns build(row), the dict of a row tuple, adding the lookups it reads to lookups
+    """
+    def index_of(lookup):
+        lookup = prefix + lookup
+        if lookup not in lookups:
+            lookups.append(lookup)
+        return lookups.index(lookup)
+
+    values = list()
+    computed = list()
+    nested = list()
+    for key, field in fields:
+        if isinstance(field, Value):
+            values.append((key, index_of(field.lookup), field.convert))
+        elif isinstance(field, Computed):
+            computed.append((key, tuple(index_of(lookup) for lookup in field.lookups), field.compute))
+        elif isinstance(field, Nested):
+            build = compile_fields(field.fields, lookups, prefix + field.prefix + '__')
+            nested.append((key, index_of(field.prefix + '__' + field.pk), build))
+        else:
+            raise TypeError('Unknown field %s: %r' % (key, field))
+    keys = [key for key, _ in fields]
+
+    def build(row):
+        data = dict.fromkeys(keys)
+        for key, index, convert in values:
+            value = row[index]
+            data[key] = value if value is None or convert is None else convert(value)
+        for key, indexes, compute in computed:
+            data[key] = compute(*[row[index] for index in indexes])
+        for key, index, build_nested in nested:
+            if row[index] is not None:
+                data[key] = build_nested(row)
+        return data
+    return build
+
+
+class ValuesSerializer(object):
+    # (key, Value | Computed | Nested) in the order of the JSON keys
+    fields = ()
+
+    _compiled = None
+
+    @classmethod
+    def compile(cls):
+        # Not inherited, every subclass compiles its own fields
+        if cls.__dict__.get('_compiled') is None:
+            lookups = list()
+            build = compile_fields(cls.fields, lookups)
+            cls._compiled = (tuple(lookups), build)
+        return cls._compiled
+
+    @classmethod
+    def get_rows(cls, queryset):
+        """
+        The values_list() queryset of the row tuples, which can be iterated in chunks
+        """
+        lookups, _ = cls.compile()
+        return queryset.values_list(*lookups)
+
+    @classmethod
+    def serialize_rows(cls, rows):
+        """
+        The data of the row tuples of get_rows
+        """
+        _, build = cls.compile()
+        return [build(row) for row in rows]
+
+    @classmethod
+    def serialize(cls, queryset):
+        return cls.serialize_rows(cls.get_rows(queryset))
@@ -1 +1,17 @@
 ANON_USER = 'Anonymous'
+
+# PubNub outbox
+PUBNUB_OUTBOX_BATCH_SIZE = 100
+PUBNUB_OUTBOX_MAX_ATTEMPTS = 10
+# Doubles with every failed attempt
+PUBNUB_OUTBOX_RETRY_SECONDS = 5
+PUBNUB_OUTBOX_RETENTION_DAYS = 1
+# Consecutive messages of these actions to the same channel are merged into one, with all the patientIDs
+PUBNUB_MERGEABLE_ACTIONS = ('UPDATE', 'UNASSIGN')
+
+# Cursor pagination of the list endpoints
+CURSOR_PAGE_SIZE = 50
+MAX_CURSOR_PAGE_SIZE = 500
+
+# Rows read from the DB and serialized at a time by the streaming responses
+STREAMING_CHUNK_SIZE = 500
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from flocarebase.common.pubnub_service import PubnubService
+from flocarebase.constants import PUBNUB_OUTBOX_BATCH_SIZE
+
+import time
+
+# Published messages are pruned about once in this many idle polls
+PRUNE_EVERY_POLLS = 600
+
+
+class Command(BaseCommand):
+    help = 'Publishes the messages queued in the PubNub outbox. Runs until stopped, unless --once is passed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Publish the pending messages and exit')
+        parser.add_argument('--batch-size', type=int, default=PUBNUB_OUTBOX_BATCH_SIZE,
+                            help='Number of messages to publish per transaction')
+        parser.add_argument('--interval', type=float, default=1, help='Seconds to wait when the outbox is empty')
+
+    def handle(self, *args, **options):
+        idle_polls = 0
+        while True:
+            attempted = PubnubService.drain_outbox(options['batch_size'])
+            if attempted:
+                self.stdout.write('Attempted %d messages' % attempted)
+                continue
+            if idle_polls % PRUNE_EVERY_POLLS == 0:
+                PubnubService.prune_outbox()
+            if options['once']:
+                return
+            idle_polls += 1
+            time.sleep(options['interval'])
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import time
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class SinkRequestHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        self.server.received += 1
+        if self.server.verbose:
+            self.server.stdout.write(body.decode('utf-8'))
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Runs a local HTTP server accepting the messages of the HttpSinkPublisher, standing in for PubNub'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--delay-ms', type=float, default=0, help='Latency to add to every publish')
+
+    def handle(self, *args, **options):
+        server = ThreadingHTTPServer(('127.0.0.1', options['port']), SinkRequestHandler)
+        server.delay = options['delay_ms'] / 1000.0
+        server.received = 0
+        server.verbose = options['verbosity'] > 1
+        server.stdout = self.stdout
+        self.stdout.write('Accepting messages on http://127.0.0.1:%d/' % options['port'])
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write('Received %d messages' % server.received)
@@ -1,8 +1,9 @@
 from threading import local
 from django.db import connection
-from time import time
-from operator import add
-import functools
+from django.middleware.gzip import GZipMiddleware
+from flocarebase.common import metrics
+from random import random
+from time import perf_counter
 import logging
 from django.conf import settings
 
@@ -24,39 +25,86 @@ class UserInformationMiddleware(object):
         return response
 
 
+class QueryStats(object):
+    """
+    Execute wrapper counting the queries run on a connection, and the time spent in them
+    """
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.duration += perf_counter() - start
+
+
+def get_route(request):
+    """
+    Name of the url pattern the request resolved to, or of its view when the pattern has none. Bounded, unlike the
+    paths, so it can be used as a metric label
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    if match.url_name:
+        return match.view_name
+    return '%s.%s' % (match.func.__module__, match.func.__name__)
+
+
 class DBStatsMiddleWare(object):
+    """
+    Records the latency, DB queries and DB time of a sample of the requests (settings.DB_STATS_SAMPLE_RATE), by route.
+    The queries are counted on the connection itself, so this works with DEBUG off. See flocarebase.common.metrics
+    """
 
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        response = self.get_response(request)
-        return response
-
-    def process_view(self, request, view_func, view_args, view_kwargs):
-        # TODO Should add something to disable it in production if needed - VERIFY THIS
-        if not settings.DEBUG:
-            return None
-
-        n_db_queries = len(connection.queries)
-        start = time()
-        response = view_func(request, *view_args, **view_kwargs)
-        total_time = time() - start
-
-        db_queries = len(connection.queries) - n_db_queries
-        if db_queries:
-            db_time = functools.reduce(add, [float(q['time']) for q in connection.queries[n_db_queries:]])
+        if random() >= settings.DB_STATS_SAMPLE_RATE:
+            return self.get_response(request)
+
+        stats = QueryStats()
+        start = perf_counter()
+        with connection.execute_wrapper(stats):
+            response = self.get_response(request)
+        if response.streaming:
+            # The rows of a streaming response are read while it is sent
+            response.streaming_content = self.record_streaming(request, response.streaming_content, stats, start)
         else:
-            db_time = 0.0
-        python_time = total_time - db_time
-
-        time_metrics = {
-            'total_time': str(round(total_time, 7)),
-            'python_time': str(round(python_time, 7)) + ' ' + str(round(100.0*python_time/total_time, 1)) + '%',
-            'db_time': str(round(db_time, 7)) + ' ' + str(round(100.0*db_time/total_time, 1)) + '%',
-            'db_queries': db_queries,
-        }
-
-        logger.debug(time_metrics)
-
+            self.record(request, stats, start)
         return response
+
+    def record_streaming(self, request, content, stats, start):
+        try:
+            with connection.execute_wrapper(stats):
+                yield from content
+        finally:
+            self.record(request, stats, start)
+
+    def record(self, request, stats, start):
+        total_time = perf_counter() - start
+        labels = {'route': get_route(request), 'method': request.method}
+        metrics.REQUEST_DURATION.observe(total_time, **labels)
+        metrics.REQUEST_DB_QUERIES.observe(stats.queries, **labels)
+        metrics.REQUEST_DB_DURATION.observe(stats.duration, **labels)
+        logger.debug('%s %s: total_time %.7f, db_time %.7f, db_queries %d' % (
+            labels['method'], labels['route'], total_time, stats.duration, stats.queries))
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Gzips the responses of at least settings.GZIP_MIN_LENGTH bytes, and the streaming ones, for the clients accepting
+    it. Off unless settings.GZIP_RESPONSES
+    """
+
+    def process_response(self, request, response):
+        if not settings.GZIP_RESPONSES:
+            return response
+        if not response.streaming and len(response.content) < settings.GZIP_MIN_LENGTH:
+            return response
+        return super().process_response(request, response)
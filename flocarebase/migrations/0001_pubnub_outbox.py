@@ -0,0 +1,32 @@
+# Generated by Django 2.0.6 on 2026-10-18 16:14
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PubnubOutboxMessage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(max_length=255)),
+                ('message', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('published_at', models.DateTimeField(null=True)),
+                ('last_error', models.TextField(null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pubnuboutboxmessage',
+            index=models.Index(fields=['published_at', 'next_attempt_at'], name='flocarebase_publish_3a4b19_idx'),
+        ),
+    ]
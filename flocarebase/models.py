@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Value, When
+from django.db.models.functions import Cast
 from flocarebase.middleware import get_current_request
 import logging
 from flocarebase.constants import ANON_USER
@@ -18,10 +20,42 @@ def get_current_user():
         return None
 
 
-# Todo: Queryset delete currently doesn't take into account CASCADING deletes. Implement this.
 class BaseQuerySet(models.QuerySet):
     def soft_delete(self):
-        return super(BaseQuerySet, self).update(deleted_at=timezone.now())
+        """
+        Soft deletes the rows, along-with their dependents named in soft_delete_cascade of the model.
+        Issues one UPDATE per table, with the rows to delete selected by subqueries
+        """
+        with transaction.atomic(using=self.db):
+            self.soft_delete_dependents()
+            current_user = get_current_user()
+            # updated_at is bumped as well, so that delta syncs pick up the deletion
+            now = timezone.now()
+            return super(BaseQuerySet, self).update(deleted_at=now, updated_at=now,
+                                                    updated_by=getattr(current_user, 'username', ANON_USER))
+
+    def soft_delete_dependents(self):
+        # Dependents are deleted first, as the subqueries selecting them only see the rows not deleted yet
+        for name in self.model.soft_delete_cascade:
+            field = self.model._meta.get_field(name)
+            if field.auto_created and not field.concrete:
+                # Reverse relation, eg: the episodes of a patient
+                foreign_key = field.field
+                dependents = field.related_model.objects.filter(
+                    **{foreign_key.name + '__in': self.values(foreign_key.target_field.attname)})
+            else:
+                # Forward relation, eg: the address of a patient
+                dependents = field.related_model.objects.filter(
+                    **{field.target_field.attname + '__in': self.values(field.attname)})
+            dependents.soft_delete()
+
+    def touch(self):
+        """
+        Marks the rows changed with one UPDATE of updated_at, without loading or saving them
+        """
+        current_user = get_current_user()
+        return super(BaseQuerySet, self).update(updated_at=timezone.now(),
+                                                updated_by=getattr(current_user, 'username', ANON_USER))
 
 
 class BaseModelManager(models.Manager):
@@ -32,13 +66,39 @@ class BaseModelManager(models.Manager):
             object.updated_by = getattr(current_user, 'username', ANON_USER)
         return super(BaseModelManager, self).bulk_create(objects, batch_size)
 
+    def bulk_update(self, objects, fields, batch_size=None):
+        """
+        Updates the given fields of the objects with one UPDATE ... CASE query per batch, like Django 2.2's bulk_update.
+        save() is not called on the objects
+        """
+        objects = list(objects)
+        if not objects:
+            return
+        current_user = get_current_user()
+        now = timezone.now()
+        for object in objects:
+            object.updated_by = getattr(current_user, 'username', ANON_USER)
+            object.updated_at = now
+        fields = [self.model._meta.get_field(name) for name in set(fields) | {'updated_by', 'updated_at'}]
+        batch_size = batch_size or len(objects)
+        with transaction.atomic(using=self.db):
+            for start in range(0, len(objects), batch_size):
+                batch = objects[start:start + batch_size]
+                updates = dict()
+                for field in fields:
+                    # The CASE is cast, as Postgres otherwise types the branches from their (text) parameters
+                    updates[field.attname] = Cast(Case(*[When(pk=object.pk, then=Value(getattr(object, field.attname),
+                                                                                       output_field=field))
+                                                         for object in batch], output_field=field), output_field=field)
+                self.filter(pk__in=[object.pk for object in batch]).update(**updates)
+
     def get_queryset(self):
-        return BaseQuerySet(self.model).filter(deleted_at=None)
+        return BaseQuerySet(self.model, using=self._db).filter(deleted_at=None)
 
 
 class AllObjectsManager(models.Manager):
     def get_queryset(self):
-        return super().get_queryset()
+        return BaseQuerySet(self.model, using=self._db)
 
 
 class BaseModel(models.Model):
@@ -46,6 +106,9 @@ class BaseModel(models.Model):
     objects = BaseModelManager()
     all_objects = AllObjectsManager()
 
+    # Names of the relations whose objects are soft deleted along-with this object
+    soft_delete_cascade = ()
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     deleted_at = models.DateTimeField(null=True, default=None)
@@ -74,5 +137,28 @@ class BaseModel(models.Model):
         super(BaseModel, self).save(*args, **kwargs)
 
     def soft_delete(self):
-        self.deleted_at = timezone.now()
-        return self.save()
+        with transaction.atomic():
+            type(self).all_objects.filter(pk=self.pk).soft_delete_dependents()
+            self.deleted_at = timezone.now()
+            return self.save()
+
+
+class PubnubOutboxMessage(models.Model):
+    """
+    A PubNub message waiting to be published. Written in the transaction of the change it notifies about, so it is
+    only published, by the drain_pubnub_outbox command, if that change commits
+    """
+    channel = models.CharField(max_length=255)
+    # JSON encoded
+    message = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    published_at = models.DateTimeField(null=True)
+    last_error = models.TextField(null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['published_at', 'next_attempt_at'])]
+
+    def __str__(self):
+        return self.channel + '--' + self.message
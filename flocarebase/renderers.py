@@ -0,0 +1,75 @@
+"""
+JSON renderer and parser backed by orjson, for the REST framework. They fall back to the stdlib ones of the REST
+framework when orjson is not installed, or for the payloads orjson cannot handle.
+
+With settings.JSON_RENDERER_COMPAT on, the rendered bytes are the same as the ones of rest_framework's JSONRenderer:
+dates, times, UUIDs and Decimals are encoded by its encoder, and the floats orjson writes differently (exponents, and
+the ones below 1e-4) are rendered by the stdlib instead. Out of range floats are written as null where the
+JSONRenderer fails. Off, orjson encodes the datetimes and UUIDs itself
+"""
+from django.conf import settings
+from io import BytesIO
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# The floats orjson writes differently from the stdlib: with an exponent, 1e16 for 1e+16, or below 1e-4 without one,
+# 0.00001 for 1e-05. Strings looking like them only cost a fallback
+FLOAT_EXPONENT_RE = re.compile(rb'e-?\d+(?:[,\]}]|$)')
+SMALL_FLOAT = b'0.0000'
+LINE_SEPARATOR = '\u2028'.encode('utf-8')
+PARAGRAPH_SEPARATOR = '\u2029'.encode('utf-8')
+
+encode_default = encoders.JSONEncoder().default
+
+
+def get_dumps_option():
+    if settings.JSON_RENDERER_COMPAT:
+        return orjson.OPT_PASSTHROUGH_DATETIME
+    return orjson.OPT_SERIALIZE_UUID | orjson.OPT_UTC_Z
+
+
+class FastJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact or not self.strict or \
+                self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=encode_default, option=get_dumps_option())
+        except orjson.JSONEncodeError:
+            # Integers over 64 bits, lone surrogates, keys that are not strings
+            return super().render(data, accepted_media_type, renderer_context)
+        if settings.JSON_RENDERER_COMPAT and (SMALL_FLOAT in ret or FLOAT_EXPONENT_RE.search(ret)):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escaped like the JSONRenderer does, so that the JSON is a strict javascript subset
+        if LINE_SEPARATOR in ret:
+            ret = ret.replace(LINE_SEPARATOR, b'\\u2028')
+        if PARAGRAPH_SEPARATOR in ret:
+            ret = ret.replace(PARAGRAPH_SEPARATOR, b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or not self.strict or encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+
+        content = stream.read()
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            # Parsed again by the stdlib, which reports the error, or accepts what orjson does not, like integers over
+            # 64 bits
+            return super().parse(BytesIO(content), media_type, parser_context)
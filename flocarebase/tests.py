@@ -1,3 +1,431 @@
-from django.test import TestCase
+from collections import OrderedDict
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from flocarebase.common import metrics, test_helpers
+from django.utils import timezone
+from flocarebase.common.pagination import paginate_by_cursor
+from flocarebase.common.publishers import InMemoryPublisher
+from flocarebase.common.pubnub_service import PubnubService
+from flocarebase.common.query_inspector import QueryRecorder, get_statement_shape
+from flocarebase.common.streaming import stream_json_array
+from flocarebase.constants import PUBNUB_OUTBOX_MAX_ATTEMPTS
+from flocarebase.exceptions import InvalidPayloadError
+from flocarebase.models import PubnubOutboxMessage
+from flocarebase.renderers import FastJSONParser, FastJSONRenderer, orjson
+from io import BytesIO, StringIO
+from phi.tests.utils import utils
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from unittest import skipIf
+from unittest.mock import patch
+from user_auth.models import Organization
 
-# Create your tests here.
+import datetime
+import decimal
+import gzip
+import json
+import uuid
+
+
+@override_settings(PUBNUB_PUBLISHER='flocarebase.common.publishers.InMemoryPublisher')
+class TestPubnubOutbox(TestCase):
+
+    def setUp(self):
+        InMemoryPublisher.clear()
+
+    def test_publish_is_rolled_back_with_the_transaction(self):
+        "Messages published in a transaction that rolls back are never sent"
+        try:
+            with transaction.atomic():
+                PubnubService.publish('channel', {'actionType': 'UPDATE'})
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertFalse(PubnubOutboxMessage.objects.exists())
+
+    def test_drain_publishes_in_order(self):
+        "Pending messages are published oldest first, and marked published"
+        PubnubService.publish('channel_1', {'actionType': 'ASSIGN'})
+        PubnubService.publish('channel_2', {'actionType': 'UNASSIGN'})
+        self.assertEqual(PubnubService.drain_outbox(), 2)
+
+        self.assertListEqual(InMemoryPublisher.messages, [('channel_1', {'actionType': 'ASSIGN'}),
+                                                          ('channel_2', {'actionType': 'UNASSIGN'})])
+        self.assertFalse(PubnubOutboxMessage.objects.filter(published_at=None).exists())
+        self.assertEqual(PubnubService.drain_outbox(), 0)
+
+    def test_drain_retries_failures_with_backoff(self):
+        "Failed messages are retried after a backoff, and given up after the maximum number of attempts"
+        PubnubService.publish('channel', {'actionType': 'UPDATE'})
+        with patch.object(InMemoryPublisher, 'publish', side_effect=Exception('PubNub is down')):
+            self.assertEqual(PubnubService.drain_outbox(), 1)
+
+        outbox_message = PubnubOutboxMessage.objects.get()
+        self.assertEqual(outbox_message.attempts, 1)
+        self.assertEqual(outbox_message.last_error, 'PubNub is down')
+        self.assertGreater(outbox_message.next_attempt_at, timezone.now())
+        self.assertEqual(PubnubService.drain_outbox(), 0)
+
+        PubnubOutboxMessage.objects.update(next_attempt_at=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual(PubnubService.drain_outbox(), 1)
+        self.assertIsNotNone(PubnubOutboxMessage.objects.get().published_at)
+
+        PubnubService.publish('channel', {'actionType': 'UPDATE'})
+        PubnubOutboxMessage.objects.filter(published_at=None).update(attempts=PUBNUB_OUTBOX_MAX_ATTEMPTS)
+        self.assertEqual(PubnubService.drain_outbox(), 0)
+
+    def test_drain_keeps_the_order_of_a_channel_after_a_failure(self):
+        "The messages after a failed one are deferred to its retry, so that a channel is published in order"
+        publish = InMemoryPublisher.publish
+        failures = [Exception('PubNub is down')]
+
+        def publish_failing_once(publisher, channel, message):
+            if failures:
+                raise failures.pop()
+            publish(publisher, channel, message)
+
+        PubnubService.publish('user_1', {'actionType': 'ASSIGN', 'patientID': 'patient_1'})
+        PubnubService.publish('user_1', {'actionType': 'UNASSIGN', 'patientID': 'patient_1'})
+        PubnubService.publish('user_2', {'actionType': 'UPDATE', 'patientID': 'patient_1'})
+        with patch.object(InMemoryPublisher, 'publish', publish_failing_once):
+            self.assertEqual(PubnubService.drain_outbox(), 3)
+            self.assertListEqual(InMemoryPublisher.messages, [
+                ('user_2', {'actionType': 'UPDATE', 'patientID': 'patient_1'})])
+
+            # Also deferred, behind the message waiting for its retry
+            PubnubService.publish('user_1', {'actionType': 'ASSIGN', 'patientID': 'patient_2'})
+            self.assertEqual(PubnubService.drain_outbox(), 1)
+            self.assertEqual(PubnubService.drain_outbox(), 0)
+
+            PubnubOutboxMessage.objects.filter(published_at=None).update(
+                next_attempt_at=timezone.now() - datetime.timedelta(seconds=1))
+            self.assertEqual(PubnubService.drain_outbox(), 3)
+        self.assertListEqual(InMemoryPublisher.messages, [
+            ('user_2', {'actionType': 'UPDATE', 'patientID': 'patient_1'}),
+            ('user_1', {'actionType': 'ASSIGN', 'patientID': 'patient_1'}),
+            ('user_1', {'actionType': 'UNASSIGN', 'patientID': 'patient_1'}),
+            ('user_1', {'actionType': 'ASSIGN', 'patientID': 'patient_2'}),
+        ])
+        self.assertListEqual(list(PubnubOutboxMessage.objects.order_by('id').values_list('attempts', flat=True)),
+                             [1, 0, 0, 0])
+
+    def test_drain_command_publishes_and_prunes(self):
+        "The drain command publishes the pending messages and prunes the old published ones"
+        PubnubService.publish('channel', {'actionType': 'UPDATE'})
+        PubnubOutboxMessage.objects.create(channel='channel', message='{}',
+                                           published_at=timezone.now() - datetime.timedelta(days=2))
+        call_command('drain_pubnub_outbox', '--once', '--batch-size', '1', stdout=StringIO())
+
+        self.assertListEqual(InMemoryPublisher.messages, [('channel', {'actionType': 'UPDATE'})])
+        self.assertEqual(PubnubOutboxMessage.objects.count(), 1)
+        self.assertIsNotNone(PubnubOutboxMessage.objects.get().published_at)
+
+    def test_drain_coalesces_messages_per_channel(self):
+        "Duplicate messages are published once, and consecutive updates of a channel as one message"
+        PubnubService.publish('user_1', {'actionType': 'UPDATE', 'patientID': 'patient_1'})
+        PubnubService.publish('episode_1', {'actionType': 'USER_ASSIGNED', 'userID': 'user_1'})
+        PubnubService.publish('user_1', {'actionType': 'UPDATE', 'patientID': 'patient_2'})
+        PubnubService.publish('user_1', {'actionType': 'UPDATE', 'patientID': 'patient_1'})
+        PubnubService.publish('episode_1', {'actionType': 'USER_ASSIGNED', 'userID': 'user_1'})
+        PubnubService.publish('user_1', {'actionType': 'ASSIGN', 'patientID': 'patient_3'})
+        PubnubService.publish('user_1', {'actionType': 'UPDATE', 'patientID': 'patient_3'})
+        self.assertEqual(PubnubService.drain_outbox(), 7)
+
+        self.assertListEqual(InMemoryPublisher.messages, [
+            ('user_1', {'actionType': 'UPDATE', 'patientID': 'patient_1', 'patientIDs': ['patient_1', 'patient_2']}),
+            ('episode_1', {'actionType': 'USER_ASSIGNED', 'userID': 'user_1'}),
+            ('user_1', {'actionType': 'ASSIGN', 'patientID': 'patient_3'}),
+            ('user_1', {'actionType': 'UPDATE', 'patientID': 'patient_3'}),
+        ])
+        self.assertFalse(PubnubOutboxMessage.objects.filter(published_at=None).exists())
+
+    def test_drain_publishes_a_message_repeated_after_another(self):
+        "A message repeated after another one on its channel is published again, so that the last one wins"
+        PubnubService.publish('user_1', {'actionType': 'ASSIGN', 'patientID': 'patient_1'})
+        PubnubService.publish('user_1', {'actionType': 'UNASSIGN', 'patientID': 'patient_1'})
+        PubnubService.publish('user_1', {'actionType': 'ASSIGN', 'patientID': 'patient_1'})
+        self.assertEqual(PubnubService.drain_outbox(), 3)
+
+        self.assertListEqual(InMemoryPublisher.messages, [
+            ('user_1', {'actionType': 'ASSIGN', 'patientID': 'patient_1'}),
+            ('user_1', {'actionType': 'UNASSIGN', 'patientID': 'patient_1'}),
+            ('user_1', {'actionType': 'ASSIGN', 'patientID': 'patient_1'}),
+        ])
+
+
+class TestCursorPagination(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Duplicate and missing sort values, to check the ties and the NULLs
+        for contact_no in ['3', None, '1', '2', None, '1', '3']:
+            Organization.objects.create(name='org', type='org', contact_no=contact_no)
+
+    def get_all_pages(self, sort_field, size):
+        pages = list()
+        query_params = {'cursor': '', 'size': size}
+        while True:
+            objects, next_cursor = paginate_by_cursor(Organization.objects.all(), sort_field, query_params)
+            pages.append(objects)
+            if not next_cursor:
+                return pages
+            query_params = {'cursor': next_cursor, 'size': size}
+
+    def test_pages_match_the_full_ordering(self):
+        "Should return every row once, in the order of the sort field and the primary key"
+        for sort_field in ('contact_no', '-contact_no', 'name'):
+            pk_order = '-pk' if sort_field.startswith('-') else 'pk'
+            expected = list(Organization.objects.order_by(sort_field, pk_order))
+            for size in (1, 2, 3, 7):
+                pages = self.get_all_pages(sort_field, size)
+                self.assertListEqual([obj for page in pages for obj in page], expected)
+                self.assertTrue(all(len(page) <= size for page in pages))
+
+    def test_pages_rows_of_the_same_millisecond(self):
+        "Should not skip the rows created in the same millisecond as the last row of a page"
+        created_at = timezone.now().replace(microsecond=123000)
+        for index, organization in enumerate(Organization.objects.order_by('pk')):
+            Organization.objects.filter(pk=organization.pk).update(
+                created_at=created_at + datetime.timedelta(microseconds=index * 100))
+        expected = list(Organization.objects.order_by('-created_at', '-pk'))
+        pages = self.get_all_pages('-created_at', 2)
+        self.assertListEqual([obj for page in pages for obj in page], expected)
+
+    def test_rejects_invalid_cursors(self):
+        "Should raise InvalidPayloadError for a malformed cursor, or one created for another sort order"
+        objects, next_cursor = paginate_by_cursor(Organization.objects.all(), 'name', {'cursor': '', 'size': 2})
+        with self.assertRaises(InvalidPayloadError):
+            paginate_by_cursor(Organization.objects.all(), 'contact_no', {'cursor': next_cursor})
+        with self.assertRaises(InvalidPayloadError):
+            paginate_by_cursor(Organization.objects.all(), 'name', {'cursor': 'not-a-cursor'})
+
+
+class TestDBStatsMiddleware(test_helpers.UserRequestTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.initObjects()
+
+    def setUp(self):
+        metrics.reset_metrics()
+        self.addCleanup(metrics.reset_metrics)
+
+    @override_settings(DEBUG=False, DB_STATS_SAMPLE_RATE=1.0)
+    def test_records_queries_by_route(self):
+        "Should record the queries of a sampled request under its route, with DEBUG off"
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('place-list'), **self.get_base_headers())
+        self.assertEqual(response.status_code, 200)
+
+        count, queries = metrics.REQUEST_DB_QUERIES.get_series(route='place-list', method='GET')
+        self.assertEqual(count, 1)
+        self.assertEqual(queries, len(captured.captured_queries))
+        self.assertEqual(metrics.REQUEST_DURATION.get_series(route='place-list', method='GET')[0], 1)
+
+    @override_settings(DEBUG=False, DB_STATS_SAMPLE_RATE=1.0, STREAMING_RESPONSES=True)
+    def test_records_queries_of_streaming_responses(self):
+        "Should record the queries run while a streaming response is sent"
+        route = 'phi.views.visit_views.GetMyVisits'
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get('/phi/v1.0/get-visits-for-user/', **self.get_base_headers())
+            self.assertTrue(response.streaming)
+            self.assertIsNone(metrics.REQUEST_DB_QUERIES.get_series(route=route, method='GET'))
+            b''.join(response.streaming_content)
+
+        count, queries = metrics.REQUEST_DB_QUERIES.get_series(route=route, method='GET')
+        self.assertEqual(count, 1)
+        self.assertEqual(queries, len(captured.captured_queries))
+
+    @override_settings(DB_STATS_SAMPLE_RATE=0.0)
+    def test_skips_requests_not_sampled(self):
+        "Should not record the requests that are not sampled"
+        self.client.get(reverse('place-list'), **self.get_base_headers())
+        self.assertIsNone(metrics.REQUEST_DB_QUERIES.get_series(route='place-list', method='GET'))
+
+    @override_settings(DB_STATS_SAMPLE_RATE=1.0, METRICS_TOKEN='secret')
+    def test_metrics_endpoint(self):
+        "Should export the histograms in the Prometheus text format to callers with the metrics token"
+        self.client.get(reverse('place-list'), **self.get_base_headers())
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode('utf-8')
+        self.assertIn('# TYPE flocare_request_db_queries histogram', content)
+        self.assertIn('flocare_request_db_queries_count{route="place-list",method="GET"} 1', content)
+        self.assertIn('flocare_request_duration_seconds_bucket{route="place-list",method="GET",le="+Inf"} 1', content)
+
+    @override_settings(DEBUG=False, METRICS_TOKEN='')
+    def test_metrics_endpoint_denied_without_token(self):
+        "Should deny the metrics to everyone when no metrics token is set, outside DEBUG"
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+
+class TestQueryInspector(TestCase):
+
+    def test_statement_shape_ignores_parameters(self):
+        "Should give the same shape to a statement run with different numbers of parameters"
+        self.assertEqual(get_statement_shape('SELECT * FROM t WHERE a = %s AND id IN (%s, %s,\n %s) LIMIT 21'),
+                         get_statement_shape('SELECT * FROM t WHERE a = %s AND id IN (%s) LIMIT 1'))
+        self.assertEqual(get_statement_shape('INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)'),
+                         get_statement_shape('INSERT INTO t (a, b) VALUES (%s, %s)'))
+        self.assertNotEqual(get_statement_shape('SELECT * FROM t WHERE a = %s'),
+                            get_statement_shape('SELECT * FROM t WHERE b = %s'))
+
+    def test_finds_a_query_per_row(self):
+        "Should flag the statements run once per row, and not the ones run once"
+        organizations = [Organization.objects.create(name='org_%d' % index) for index in range(5)]
+        with QueryRecorder() as recorder:
+            list(Organization.objects.all())
+            for organization in organizations:
+                Organization.objects.get(pk=organization.pk)
+        repeated = recorder.find_repeated_statements()
+        self.assertEqual(len(recorder.statements), 6)
+        self.assertEqual(len(repeated), 1)
+        self.assertEqual(repeated[0][1], 5)
+
+
+class TestStreamJSONArray(TestCase):
+
+    def stream(self, rows, chunk_size):
+        return b''.join(stream_json_array(rows, lambda chunk: [{'name': row.name} for row in chunk], chunk_size))
+
+    def test_streams_a_chunk_at_a_time(self):
+        "Should stream the same JSON array as rendering the whole list, whatever the chunk size"
+        for index in range(5):
+            Organization.objects.create(name='org_%d' % index)
+        organizations = Organization.objects.order_by('name')
+        expected = [{'name': 'org_%d' % index} for index in range(5)]
+        for chunk_size in (1, 2, 5, 10):
+            self.assertEqual(json.loads(self.stream(organizations, chunk_size).decode('utf-8')), expected)
+
+    def test_streams_an_empty_list(self):
+        "Should stream an empty JSON array when there are no rows"
+        self.assertEqual(self.stream(Organization.objects.none(), 2), b'[]')
+        self.assertEqual(self.stream([], 2), b'[]')
+
+
+class TestFastJSON(test_helpers.UserRequestTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.initObjects()
+
+    def get_payload(self):
+        now = timezone.now()
+        return OrderedDict([
+            ('uuid', uuid.uuid4()),
+            ('datetime', now),
+            ('naive', datetime.datetime(2018, 10, 19, 10, 30)),
+            ('date', now.date()),
+            ('time', datetime.time(10, 30, 15, 250)),
+            ('isoformat', now.isoformat()),
+            ('decimal', decimal.Decimal('12.50')),
+            ('floats', [0.0, -0.0, 12.9, 77.5, 1 / 3, 1e15, 1e16, 1e-4, 1e-5, -1.5e-7, 1e-10, -2.5e-300]),
+            ('integers', [0, -1, 2 ** 63 - 1]),
+            ('strings', ['', 'plain', 'é \U0001f600', '\u2028\u2029', '"\\/\n\t\x00\x7f']),
+            ('nested', {'empty': {}, 'list': [], 'none': None, 'flags': (True, False)}),
+        ])
+
+    def test_renders_the_bytes_of_the_json_renderer(self):
+        "Should render the same bytes as the JSONRenderer"
+        payloads = [self.get_payload(), [self.get_payload()], {'big': 2 ** 70}, {1: 'key'}, 1e16, 'text', []]
+        for payload in payloads:
+            self.assertEqual(FastJSONRenderer().render(payload), JSONRenderer().render(payload))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+        self.assertEqual(FastJSONRenderer().render([1], 'application/json; indent=4'),
+                         JSONRenderer().render([1], 'application/json; indent=4'))
+
+    @override_settings(STREAMING_RESPONSES=False)
+    def test_renders_the_bytes_of_the_responses(self):
+        "Should render the same bytes as the JSONRenderer for the sync endpoints"
+        for patient in utils.create_patients_in_bulk(self.organization, 3, self.user_profile):
+            utils.create_visit(self.user_profile, self.organization, episode=utils.get_active_episode(patient))
+        utils.create_place(self.organization)
+        for path in ('/phi/v1.0/get-patients-for-sync/', '/phi/v1.0/get-visits-for-user/',
+                     '/phi/v1.0/get-places-for-sync/', '/phi/v1.0/places/'):
+            response = self.client.get(path, **self.get_base_headers())
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(FastJSONRenderer().render(response.data), response.content)
+
+    @skipIf(orjson is None, 'orjson is not installed')
+    def test_renders_with_orjson(self):
+        "Should render the payloads of the app with orjson, without falling back to the JSONRenderer"
+        payload = [self.get_payload() for _ in range(3)]
+        for row in payload:
+            row['floats'] = [12.9, 0.5]
+        with patch.object(JSONRenderer, 'render') as render:
+            FastJSONRenderer().render(payload)
+        render.assert_not_called()
+
+    @skipIf(orjson is None, 'orjson is not installed')
+    @override_settings(JSON_RENDERER_COMPAT=False)
+    def test_renders_natively_without_compat(self):
+        "Should let orjson encode the datetimes and UUIDs when not in compat mode"
+        payload = self.get_payload()
+        self.assertEqual(json.loads(FastJSONRenderer().render(payload).decode('utf-8')),
+                         json.loads(JSONRenderer().render(payload).decode('utf-8')))
+
+    def test_parses_like_the_json_parser(self):
+        "Should parse what the JSONParser does, and reject what it rejects"
+        content = JSONRenderer().render(self.get_payload())
+        for body in (content, b'{"big": 1180591620717411303424}', b'["\\ud800"]'):
+            self.assertEqual(FastJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+        for body in (b'{"a": 1', b'[NaN]', b''):
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(BytesIO(body))
+
+    def test_views_accept_the_parser(self):
+        "Should parse the payloads of the API when configured as the parser"
+        with override_settings(REST_FRAMEWORK={
+                'DEFAULT_AUTHENTICATION_CLASSES': ('user_auth.authentication.TokenAuthentication',),
+                'DEFAULT_PARSER_CLASSES': ('flocarebase.renderers.FastJSONParser',),
+                'DEFAULT_RENDERER_CLASSES': ('flocarebase.renderers.FastJSONRenderer',)}):
+            response = self.client.post('/users/v1.0/get-user-for-id/', json.dumps({}),
+                                        content_type='application/json', **self.get_base_headers())
+        self.assertEqual(response.status_code, 200)
+
+
+class TestCompressionMiddleware(test_helpers.UserRequestTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.initObjects()
+        for index in range(5):
+            utils.create_place(cls.organization, name='place_%d' % index)
+
+    def get(self, path='/phi/v1.0/get-places-for-sync/', **headers):
+        return self.client.get(path, HTTP_ACCEPT_ENCODING='gzip, deflate', **dict(self.get_base_headers(), **headers))
+
+    @override_settings(GZIP_RESPONSES=True, GZIP_MIN_LENGTH=200)
+    def test_compresses_large_responses(self):
+        "Should gzip the responses above the size threshold, weakening their ETag"
+        with override_settings(GZIP_RESPONSES=False):
+            plain = self.get()
+        response = self.get()
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    @override_settings(GZIP_RESPONSES=True, GZIP_MIN_LENGTH=200, STREAMING_RESPONSES=True)
+    def test_compresses_streaming_responses(self):
+        "Should gzip the streaming responses, whatever their size"
+        response = self.get('/phi/v1.0/get-visits-for-user/')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b'[]')
+
+    @override_settings(GZIP_RESPONSES=True, GZIP_MIN_LENGTH=100000)
+    def test_skips_small_responses(self):
+        "Should not gzip the responses below the size threshold"
+        self.assertNotIn('Content-Encoding', self.get())
+
+    def test_off_by_default(self):
+        "Should not gzip anything unless enabled"
+        self.assertNotIn('Content-Encoding', self.get())
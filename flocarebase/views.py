@@ -1,3 +1,19 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+from flocarebase.common.metrics import render_metrics
 
-# Create your views here.
+
+@require_GET
+def metrics(request):
+    """
+    Metrics of this worker process, in the Prometheus text format. Open without a METRICS_TOKEN in DEBUG only
+    """
+    if settings.METRICS_TOKEN:
+        authorization = request.META.get('HTTP_AUTHORIZATION', '')
+        if not constant_time_compare(authorization, 'Bearer ' + settings.METRICS_TOKEN):
+            return HttpResponse(status=403)
+    elif not settings.DEBUG:
+        return HttpResponse(status=403)
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -15,3 +15,15 @@ total_miles_buffer_allowed = 1
 MILES_COMMENTS_DEFAULT_TEXT = 'OdometerStart: %s, OdometerEnd: %s'
 
 PHI_ADMIN = '#phiadmin'
+
+# Attribute on Patient objects holding the prefetched active episodes
+ACTIVE_EPISODES_ATTR = 'active_episodes'
+
+# Delta sync: query param carrying the client's watermark and the response header carrying the new one
+SYNC_WATERMARK_PARAM = 'since'
+SYNC_WATERMARK_HEADER = 'X-Sync-Watermark'
+# Rows saved by transactions that commit after a sync has read the table carry an updated_at older than the
+# watermark handed out by that sync. Re-sending rows updated shortly before the watermark covers those.
+SYNC_WATERMARK_OVERLAP_SECONDS = 60
+# Part of the ETag of every full sync. Bump it when the payload of a sync changes for the same rows
+SYNC_ETAG_VERSION = 1
@@ -0,0 +1,17 @@
+from django.db.models import Prefetch
+from phi import models
+
+
+class EpisodeDataService:
+
+    @staticmethod
+    def with_care_team(queryset):
+        # Loads everything EpisodeWithCareTeamResponseSerializer reads, so serializing does not query per episode
+        return queryset.select_related('soc_clinician__user', 'attending_physician__user', 'primary_physician')\
+            .prefetch_related(Prefetch('user_accesses', queryset=models.UserEpisodeAccess.objects.all()))
+
+    @staticmethod
+    def get_accessible_episode_ids(user_profile, episode_ids):
+        return set(models.UserEpisodeAccess.objects.filter(user=user_profile)
+                   .filter(episode_id__in=episode_ids, episode__is_active=True, episode__deleted_at=None)
+                   .values_list('episode_id', flat=True))
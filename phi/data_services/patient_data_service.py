@@ -0,0 +1,37 @@
+from collections import defaultdict
+from django.db.models import Prefetch
+from phi import models
+from phi.constants import ACTIVE_EPISODES_ATTR
+from phi.data_services.episode_data_service import EpisodeDataService
+
+
+class PatientDataService:
+
+    @staticmethod
+    def get_active_episode_prefetch():
+        queryset = models.Episode.objects.filter(is_active=True)
+        return Prefetch('episodes', queryset=queryset, to_attr=ACTIVE_EPISODES_ATTR)
+
+    @staticmethod
+    def get_active_episode_with_care_team_prefetch():
+        # Deleted patients are synced as well, so their soft deleted episodes are included
+        queryset = EpisodeDataService.with_care_team(models.Episode.all_objects.filter(is_active=True))
+        return Prefetch('episodes', queryset=queryset, to_attr=ACTIVE_EPISODES_ATTR)
+
+    @staticmethod
+    def get_patients_for_org(organization):
+        patient_ids = models.OrganizationPatientsMapping.objects.filter(organization=organization).values('patient_id')
+        return models.Patient.objects.filter(uuid__in=patient_ids)
+
+    @staticmethod
+    def get_care_team_ids(organization, patient_ids):
+        """
+        Maps each patient to the users with access to any of its episodes in the organization, in one query
+        """
+        care_team_ids = defaultdict(list)
+        accesses = models.UserEpisodeAccess.objects\
+            .filter(organization=organization, episode__patient_id__in=patient_ids, episode__deleted_at=None)\
+            .values_list('episode__patient_id', 'user_id').distinct().order_by('episode__patient_id', 'user_id')
+        for patient_id, user_id in accesses:
+            care_team_ids[patient_id].append(user_id)
+        return care_team_ids
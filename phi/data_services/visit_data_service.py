@@ -1,13 +1,37 @@
+from backend import errors
+from django.db import transaction
+from phi import models
 from phi.exceptions.InvalidDataForSerializerException import InvalidDataForSerializerException
 from phi.serializers.serializers import VisitMilesSerializer, VisitSerializer
 from phi.migration_helpers import MigrationHelpers
 
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
 
 class VisitDataService:
 
     def __init__(self):
         pass
 
+    def add_visits(self, user_profile, organization, visits):
+        """
+        Inserts the visits and their miles with one bulk insert per table.
+        visits is a list of (visit validated data, visit miles validated data) pairs
+        """
+        visit_objects = list()
+        visit_miles_objects = list()
+        for visit_data, visit_miles_data in visits:
+            visit = models.Visit(user=user_profile, organization=organization, **visit_data)
+            visit_objects.append(visit)
+            visit_miles_objects.append(models.VisitMiles(visit=visit, **visit_miles_data))
+        with transaction.atomic():
+            models.Visit.objects.bulk_create(visit_objects)
+            models.VisitMiles.objects.bulk_create(visit_miles_objects)
+        return visit_objects
+
     def update_visit(self, user_profile, visit, data):
         serializer = VisitSerializer(instance=visit, data=data)
         visit_miles = data.get('visitMiles', {})
@@ -18,4 +42,100 @@ class VisitDataService:
         if not visit_miles_serialised_object.is_valid():
             raise InvalidDataForSerializerException(visit_miles_serialised_object.errors)
         serializer.save(user=user_profile)
-        visit_miles_serialised_object.save()
\ No newline at end of file
+        visit_miles_serialised_object.save()
+
+    def update_visits(self, user_profile, visits):
+        """
+        Updates the visits of the user, and their miles, with one bulk update per table.
+        visits is a list of update-visit payloads. Returns the updated visit IDs, and a list of failures with the
+        ID and error of every visit that was not updated
+        """
+        # (payload, visit ID) of the payloads with a valid visitID
+        requested = list()
+        failure = list()
+        for data in visits:
+            if not isinstance(data, dict):
+                logger.error('Invalid visit passed: %s' % str(data))
+                failure.append({'id': None, 'error': errors.DATA_INVALID})
+                continue
+            try:
+                requested.append((data, uuid.UUID(str(data['visitID']))))
+            except (KeyError, TypeError, ValueError) as e:
+                logger.error('Invalid visitID passed: %s' % str(e))
+                failure.append({'id': data.get('visitID'), 'error': errors.DATA_INVALID})
+
+        # Visit should belong to that user
+        existing = models.Visit.objects.select_related('visit_miles').filter(user=user_profile)\
+            .in_bulk({visit_id for _, visit_id in requested})
+
+        valid = list()
+        for data, visit_id in requested:
+            visit = existing.get(visit_id)
+            if not visit:
+                logger.error('Visit with id : %s does not exist' % str(data['visitID']))
+                failure.append({'id': data['visitID'], 'error': errors.VISIT_NOT_EXIST})
+                continue
+            try:
+                visit_miles = visit.visit_miles
+            except models.VisitMiles.DoesNotExist:
+                visit_miles = None
+            serializer = VisitSerializer(instance=visit, data=data)
+            visit_miles_data = data.get('visitMiles', {})
+            MigrationHelpers.handle_miles_migration(visit_miles_data)
+            visit_miles_serializer = VisitMilesSerializer(instance=visit_miles, data=visit_miles_data)
+            is_valid = serializer.is_valid()
+            is_valid = visit_miles_serializer.is_valid() and is_valid
+            if not is_valid:
+                logger.error('Invalid data for visit: %s, %s, %s' % (str(data['visitID']), str(serializer.errors),
+                                                                     str(visit_miles_serializer.errors)))
+                failure.append({'id': data['visitID'], 'error': errors.DATA_INVALID})
+                continue
+            valid.append((data['visitID'], visit, visit_miles, serializer.validated_data,
+                          visit_miles_serializer.validated_data))
+
+        # A missing episode or place would fail the bulk update of the whole batch, so those visits fail up front
+        episode_ids = {visit_data['episode_id'] for _, _, _, visit_data, _ in valid if visit_data.get('episode_id')}
+        place_ids = {visit_data['place_id'] for _, _, _, visit_data, _ in valid if visit_data.get('place_id')}
+        if episode_ids:
+            episode_ids = set(models.Episode.all_objects.filter(uuid__in=episode_ids).values_list('uuid', flat=True))
+        if place_ids:
+            place_ids = set(models.Place.all_objects.filter(uuid__in=place_ids).values_list('uuid', flat=True))
+
+        # Keyed by visit ID, so that a visit sent twice is written once, with its last payload
+        updated_visits = dict()
+        updated_visit_miles = dict()
+        new_visit_miles = dict()
+        visit_fields = set()
+        visit_miles_fields = set()
+        for visit_id, visit, visit_miles, visit_data, visit_miles_data in valid:
+            if visit_data.get('episode_id') and visit_data['episode_id'] not in episode_ids:
+                logger.error('Episode does not exist for visit: %s' % str(visit_id))
+                failure.append({'id': visit_id, 'error': errors.DATA_INVALID})
+                continue
+            if visit_data.get('place_id') and visit_data['place_id'] not in place_ids:
+                logger.error('Place does not exist for visit: %s' % str(visit_id))
+                failure.append({'id': visit_id, 'error': errors.PLACE_NOT_EXIST})
+                continue
+
+            # The visit stays with its user
+            for attr, value in visit_data.items():
+                if attr not in ('id', 'user_id'):
+                    setattr(visit, attr, value)
+                    visit_fields.add(attr)
+            updated_visits[visit.id] = visit
+            if visit_miles:
+                for attr, value in visit_miles_data.items():
+                    setattr(visit_miles, attr, value)
+                    visit_miles_fields.add(attr)
+                updated_visit_miles[visit.id] = visit_miles
+            else:
+                new_visit_miles[visit.id] = models.VisitMiles(visit=visit, **visit_miles_data)
+
+        with transaction.atomic():
+            models.Visit.objects.bulk_update(updated_visits.values(), visit_fields)
+            models.VisitMiles.objects.bulk_update(updated_visit_miles.values(), visit_miles_fields)
+            models.VisitMiles.objects.bulk_create(list(new_visit_miles.values()))
+            updated_ids = list(updated_visits.keys())
+            if updated_ids:
+                models.Visit.touch_reports(updated_ids)
+        return updated_ids, failure
@@ -0,0 +1,152 @@
+"""
+Replays admin actions through the API and drains the PubNub outbox after each one, reporting how many messages every
+action fans out to and how long publishing them takes. Everything runs in a transaction that is rolled back at the end
+"""
+from collections import OrderedDict
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.utils.module_loading import import_string
+from flocarebase.common.pubnub_service import PubnubService
+from flocarebase.common.seed import create_organization, create_user, make_user_admin
+from phi.management.seed import create_patient, get_active_episode
+from phi.models import Episode, Physician, UserEpisodeAccess
+from rest_framework.authtoken.models import Token
+
+import json
+import math
+import time
+
+BACKENDS = {
+    'memory': 'flocarebase.common.publishers.InMemoryPublisher',
+    'http': 'flocarebase.common.publishers.HttpSinkPublisher',
+}
+
+
+class TimedPublisher:
+    """
+    Wraps a publisher, recording the latency of every publish
+    """
+    def __init__(self, publisher):
+        self.publisher = publisher
+        self.latencies = list()
+
+    def publish(self, channel, message):
+        start = time.perf_counter()
+        self.publisher.publish(channel, message)
+        self.latencies.append(time.perf_counter() - start)
+
+
+class Rollback(Exception):
+    pass
+
+
+def percentile(values, percent):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[max(0, int(math.ceil(percent / 100.0 * len(values))) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the PubNub notifications published for common admin actions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', choices=sorted(BACKENDS), default='memory',
+                            help='http publishes to the run_pubnub_sink command')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--care-team-size', type=int, default=5)
+        parser.add_argument('--physician-patients', type=int, default=20,
+                            help='Number of patients of the physician that gets updated')
+        parser.add_argument('--max-messages-per-request', type=float, default=None,
+                            help='Fail if any action publishes more messages per request than this, on average')
+
+    def handle(self, *args, **options):
+        publisher = TimedPublisher(import_string(BACKENDS[options['backend']])())
+        try:
+            with transaction.atomic():
+                # Messages queued before the run are not attributed to any action
+                while PubnubService.drain_outbox(publisher=import_string(BACKENDS['memory'])()):
+                    pass
+                results = self.run_actions(publisher, options)
+                raise Rollback()
+        except Rollback:
+            pass
+
+        self.report(results)
+        limit = options['max_messages_per_request']
+        if limit is not None:
+            exceeding = [name for name, result in results.items()
+                         if len(result['publishes']) / float(options['iterations']) > limit]
+            if exceeding:
+                raise CommandError('More than %s messages per request for: %s' % (limit, ', '.join(exceeding)))
+
+    def seed(self, options):
+        self.organization = create_organization()
+        admin = create_user(self.organization)
+        make_user_admin(admin)
+        self.token = Token.objects.create(user=admin.user)
+        self.care_team = [str(create_user(self.organization).uuid) for _ in range(options['care_team_size'] + 1)]
+        self.physician = Physician.objects.create(npi='1234567890', first_name='first', last_name='last',
+                                                  organization=self.organization)
+
+        # Patients of the physician, each with the whole care team
+        episodes = list()
+        for _ in range(options['physician_patients']):
+            episodes.append(get_active_episode(create_patient(self.organization)))
+        Episode.objects.filter(pk__in=[episode.pk for episode in episodes]).update(primary_physician=self.physician)
+        UserEpisodeAccess.objects.bulk_create([
+            UserEpisodeAccess(episode=episode, user_id=user_id, organization=self.organization, user_role='CareGiver')
+            for episode in episodes for user_id in self.care_team[:-1]])
+        self.reassigned_patient = episodes[0].patient_id if episodes else create_patient(self.organization).uuid
+
+    def get_requests(self, iteration):
+        team = self.care_team[:-1]
+        if iteration % 2:
+            # Swap a member of the care team
+            team = team[1:] + self.care_team[-1:]
+        address = {'streetAddress': 'street', 'zip': '560001', 'city': 'city', 'state': 'state', 'country': 'country',
+                   'latitude': 12.9, 'longitude': 77.5}
+        return OrderedDict([
+            ('create patient', ('post', '/phi/v1.0/patients/', {
+                'patient': {'firstName': 'first_%d' % iteration, 'lastName': 'last', 'primaryContact': '1234567890',
+                            'address': dict(address)},
+                'users': self.care_team[:-1],
+                'physicianId': str(self.physician.uuid),
+            })),
+            ('reassign care team', ('put', '/phi/v1.0/patients/%s/' % self.reassigned_patient, {'users': team})),
+            ('update physician', ('put', '/phi/v1.0/physicians/%s/' % self.physician.uuid, {
+                'npi': '1234567890', 'firstName': 'first', 'lastName': 'last', 'phone2': str(iteration),
+            })),
+            ('create place', ('post', '/phi/v1.0/places/', {'name': 'place_%d' % iteration, 'address': dict(address)})),
+        ])
+
+    def run_actions(self, publisher, options):
+        self.seed(options)
+        client = Client()
+        headers = {'HTTP_AUTHORIZATION': 'Token ' + self.token.key}
+        results = OrderedDict()
+        for iteration in range(options['iterations']):
+            for name, (method, url, payload) in self.get_requests(iteration).items():
+                result = results.setdefault(name, {'requests': list(), 'end_to_end': list(), 'publishes': list()})
+                published = len(publisher.latencies)
+                start = time.perf_counter()
+                response = getattr(client, method)(url, json.dumps(payload), 'application/json', **headers)
+                result['requests'].append(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    raise CommandError('%s failed with %d: %s' % (name, response.status_code, response.content))
+                while PubnubService.drain_outbox(publisher=publisher):
+                    pass
+                result['end_to_end'].append(time.perf_counter() - start)
+                result['publishes'].extend(publisher.latencies[published:])
+        return results
+
+    def report(self, results):
+        row = '{:<20} {:>10} {:>12} {:>12} {:>12} {:>12} {:>12} {:>12}'
+        self.stdout.write(row.format('action', 'msgs/req', 'publish p50', 'publish p99', 'request p50',
+                                     'request p99', 'e2e p50', 'e2e p99'))
+        for name, result in results.items():
+            timings = [percentile(result[key], percent) * 1000
+                       for key in ('publishes', 'requests', 'end_to_end') for percent in (50, 99)]
+            self.stdout.write(row.format(name, '%.1f' % (len(result['publishes']) / float(len(result['requests']))),
+                                         *['%.2fms' % timing for timing in timings]))
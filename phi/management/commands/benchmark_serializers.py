@@ -0,0 +1,110 @@
+"""
+Times the DRF serializers of the large read endpoints against their fast path in phi.serializers.values_serializers,
+on a seeded dataset. Everything runs in a transaction that is rolled back at the end
+"""
+from collections import OrderedDict
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from flocarebase.common.seed import create_organization, create_user
+from phi import models
+from phi.management.seed import create_patients_in_bulk, get_active_episode
+from phi.serializers import response_serializers, values_serializers
+from user_auth.models import Address
+
+import time
+import uuid
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the DRF serializers of the large read endpoints against the values() fast path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Rows of each kind in the seeded dataset')
+        parser.add_argument('--repeat', type=int, default=3, help='The best of this many runs is reported')
+        parser.add_argument('--min-speedup', type=float, default=None,
+                            help='Fail if the fast path of any endpoint is less than this many times faster')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.seed(options['rows'])
+                results = self.run_cases(options['repeat'])
+                raise Rollback()
+        except Rollback:
+            pass
+
+        self.report(results)
+        limit = options['min_speedup']
+        if limit is not None:
+            slow = [name for name, (drf, fast) in results.items() if drf / fast < limit]
+            if slow:
+                raise CommandError('Less than %sx faster for: %s' % (limit, ', '.join(slow)))
+
+    def seed(self, rows):
+        self.organization = create_organization()
+        self.user_profile = create_user(self.organization)
+        episodes = [get_active_episode(patient) for patient in
+                    create_patients_in_bulk(self.organization, rows, self.user_profile)]
+
+        addresses = [Address(street_address='street_%d' % index, zip='560001', city='city', latitude=12.9,
+                             longitude=77.5) for index in range(rows)]
+        Address.objects.bulk_create(addresses)
+        places = [models.Place(name='place_%d' % index, contact_number='123', address=address,
+                               organization=self.organization) for index, address in enumerate(addresses)]
+        models.Place.objects.bulk_create(places)
+
+        # Half of the visits are to patients, the others to places
+        visits = [models.Visit(id=uuid.uuid4(), user=self.user_profile, organization=self.organization,
+                               episode=episodes[index] if index % 2 else None,
+                               place=None if index % 2 else places[index], midnight_epoch=1539907200000)
+                  for index in range(rows)]
+        models.Visit.objects.bulk_create(visits)
+        models.VisitMiles.objects.bulk_create([
+            models.VisitMiles(visit=visit, odometer_start=1, odometer_end=11, computed_miles=10, extra_miles=0)
+            for visit in visits])
+
+    def get_cases(self):
+        visits = models.Visit.objects.filter(organization=self.organization)
+        return OrderedDict([
+            ('get-visits-for-user', (
+                response_serializers.VisitResponseSerializer, values_serializers.VisitValuesSerializer,
+                visits.filter(user=self.user_profile).select_related('visit_miles', 'report_item__report'))),
+            ('get-visits-for-org', (
+                response_serializers.VisitForOrgResponseSerializer, values_serializers.VisitForOrgValuesSerializer,
+                visits.select_related('episode__patient__address', 'place__address'))),
+            ('get-patients-for-org', (
+                response_serializers.PatientsForOrgSerializer, values_serializers.PatientsForOrgValuesSerializer,
+                models.OrganizationPatientsMapping.objects.filter(organization=self.organization)
+                .select_related('patient__address'))),
+            ('get-places-for-sync', (
+                response_serializers.PlaceHistoryResponseSerializer, values_serializers.PlaceHistoryValuesSerializer,
+                models.Place.all_objects.filter(organization=self.organization).select_related('address'))),
+        ])
+
+    def time(self, serialize, repeat):
+        timings = list()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            serialize()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    def run_cases(self, repeat):
+        results = OrderedDict()
+        for name, (serializer_class, values_serializer_class, queryset) in self.get_cases().items():
+            # Both read the rows from the DB, a fresh queryset every run
+            drf = self.time(lambda: serializer_class(queryset.all(), many=True).data, repeat)
+            fast = self.time(lambda: values_serializer_class.serialize(queryset.all()), repeat)
+            results[name] = (drf, fast)
+        return results
+
+    def report(self, results):
+        row = '{:<22} {:>12} {:>12} {:>10}'
+        self.stdout.write(row.format('endpoint', 'drf', 'values', 'speedup'))
+        for name, (drf, fast) in results.items():
+            self.stdout.write(row.format(name, '%.1fms' % (drf * 1000), '%.1fms' % (fast * 1000),
+                                         '%.1fx' % (drf / fast)))
@@ -0,0 +1,45 @@
+"""
+Patients with an active episode each, for the tests and the benchmark commands
+"""
+from phi.models import Patient, Episode, OrganizationPatientsMapping, UserEpisodeAccess
+from user_auth.models import Address
+
+import random
+
+
+def create_patient(organization, first_name=None, last_name=None):
+    tag = str(random.randint(0, 10000))
+    address = Address.objects.create(street_address='street_' + tag, zip='560001', city='city', state='state',
+                                     country='country', latitude=12.9, longitude=77.5)
+    patient = Patient.objects.create(first_name=first_name or ('firstName_' + tag),
+                                     last_name=last_name or ('lastName_' + tag), title='', address=address,
+                                     primary_contact='phone_' + tag)
+    OrganizationPatientsMapping.objects.create(organization=organization, patient=patient)
+    Episode.objects.create(patient=patient, is_active=True)
+    return patient
+
+
+def get_active_episode(patient):
+    return Episode.objects.get(patient=patient, is_active=True)
+
+
+def create_patients_in_bulk(organization, count, user_profile=None):
+    """
+    Creates `count` patients with an active episode each, assigning them to user_profile if passed.
+    Uses bulk inserts so that large datasets stay cheap to set up.
+    """
+    addresses = [Address(street_address='street_' + str(index), city='city') for index in range(count)]
+    Address.objects.bulk_create(addresses)
+    patients = [Patient(first_name='firstName_' + str(index), last_name='lastName_' + str(index), title='',
+                        address=address, primary_contact='phone_' + str(index))
+                for index, address in enumerate(addresses)]
+    Patient.objects.bulk_create(patients)
+    OrganizationPatientsMapping.objects.bulk_create(
+        [OrganizationPatientsMapping(organization=organization, patient=patient) for patient in patients])
+    episodes = [Episode(patient=patient, is_active=True) for patient in patients]
+    Episode.objects.bulk_create(episodes)
+    if user_profile:
+        UserEpisodeAccess.objects.bulk_create(
+            [UserEpisodeAccess(episode=episode, user=user_profile, organization=organization, user_role='CareGiver')
+             for episode in episodes])
+    return patients
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+# Partial indexes for the hot filters of the views. Every query through BaseModelManager adds
+# `deleted_at IS NULL`, so the indexes only cover the rows that have not been soft deleted.
+# Django 2.0 cannot declare partial indexes on the models, hence the raw SQL.
+ACTIVE_ROWS = 'deleted_at IS NULL'
+
+PARTIAL_INDEXES = [
+    ('phi_visit_user_active_idx', 'phi_visit', 'user_id', ACTIVE_ROWS),
+    ('phi_visit_org_epoch_active_idx', 'phi_visit', 'organization_id, midnight_epoch', ACTIVE_ROWS),
+    ('phi_uea_user_active_idx', 'phi_userepisodeaccess', 'user_id', ACTIVE_ROWS),
+    ('phi_uea_episode_org_active_idx', 'phi_userepisodeaccess', 'episode_id, organization_id', ACTIVE_ROWS),
+    # Episodes are looked up with is_active=True, so the flag goes into the predicate instead of the key
+    ('phi_episode_patient_active_idx', 'phi_episode', 'patient_id', 'is_active AND ' + ACTIVE_ROWS),
+    ('phi_opm_org_active_idx', 'phi_organizationpatientsmapping', 'organization_id', ACTIVE_ROWS),
+]
+
+
+def create_index_operation(name, table, columns, condition):
+    return migrations.RunSQL(
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS %s ON %s (%s) WHERE %s' % (name, table, columns, condition),
+        'DROP INDEX CONCURRENTLY IF EXISTS %s' % name,
+    )
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction. Building the indexes concurrently keeps the
+    # tables writable while the migration runs on a live database.
+    atomic = False
+
+    dependencies = [
+        ('phi', '0037_auto_20181019_0514'),
+    ]
+
+    operations = [create_index_operation(*index) for index in PARTIAL_INDEXES]
@@ -0,0 +1,44 @@
+from django.db import migrations, models
+
+# Values that are not integral numbers cannot be meaningful epochs, and are left NULL
+BACKFILL_SQL = """
+    UPDATE phi_visit SET midnight_epoch_int = CAST(CAST(TRIM(midnight_epoch) AS NUMERIC) AS BIGINT)
+    WHERE midnight_epoch ~ '^\\s*-?[0-9]{1,18}(\\.0*)?\\s*$'
+"""
+
+REVERSE_BACKFILL_SQL = """
+    UPDATE phi_visit SET midnight_epoch = CAST(midnight_epoch_int AS VARCHAR(20))
+    WHERE midnight_epoch_int IS NOT NULL
+"""
+
+# Dropping the varchar column drops the index created on it in 0038. Recreate it when migrating backwards.
+REVERSE_INDEX_SQL = """
+    CREATE INDEX IF NOT EXISTS phi_visit_org_epoch_active_idx ON phi_visit (organization_id, midnight_epoch)
+    WHERE deleted_at IS NULL
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phi', '0038_soft_delete_partial_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visit',
+            name='midnight_epoch_int',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, REVERSE_BACKFILL_SQL),
+        migrations.RunSQL(migrations.RunSQL.noop, REVERSE_INDEX_SQL),
+        migrations.RemoveField(
+            model_name='visit',
+            name='midnight_epoch',
+        ),
+        migrations.RenameField(
+            model_name='visit',
+            old_name='midnight_epoch_int',
+            new_name='midnight_epoch',
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # See 0038_soft_delete_partial_indexes for why these are created concurrently, outside a transaction
+    atomic = False
+
+    dependencies = [
+        ('phi', '0039_visit_midnight_epoch_bigint'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS phi_visit_org_epoch_active_idx '
+            'ON phi_visit (organization_id, midnight_epoch) WHERE deleted_at IS NULL',
+            'DROP INDEX CONCURRENTLY IF EXISTS phi_visit_org_epoch_active_idx',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS phi_visit_user_epoch_active_idx '
+            'ON phi_visit (user_id, midnight_epoch) WHERE deleted_at IS NULL',
+            'DROP INDEX CONCURRENTLY IF EXISTS phi_visit_user_epoch_active_idx',
+        ),
+    ]
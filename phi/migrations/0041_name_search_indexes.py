@@ -0,0 +1,29 @@
+from django.db import migrations
+
+# Indexes for the name search of flocarebase.common.search. The expression has to match the SQL of istartswith,
+# UPPER("column"::text), and text_pattern_ops lets LIKE 'PREFIX%' use the index whatever the collation of the database
+NAME_INDEXES = [
+    ('phi_patient_first_name_search_idx', 'phi_patient', 'first_name'),
+    ('phi_patient_last_name_search_idx', 'phi_patient', 'last_name'),
+    ('phi_physician_first_name_search_idx', 'phi_physician', 'first_name'),
+    ('phi_physician_last_name_search_idx', 'phi_physician', 'last_name'),
+]
+
+
+def create_index_operation(name, table, column):
+    return migrations.RunSQL(
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS %s ON %s (UPPER(%s::text) text_pattern_ops) WHERE deleted_at IS NULL'
+        % (name, table, column),
+        'DROP INDEX CONCURRENTLY IF EXISTS %s' % name,
+    )
+
+
+class Migration(migrations.Migration):
+    # See 0038_soft_delete_partial_indexes for why these are created concurrently, outside a transaction
+    atomic = False
+
+    dependencies = [
+        ('phi', '0040_visit_midnight_epoch_indexes'),
+    ]
+
+    operations = [create_index_operation(*index) for index in NAME_INDEXES]
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # See 0038_soft_delete_partial_indexes for why these are created concurrently, outside a transaction
+    atomic = False
+
+    dependencies = [
+        ('phi', '0041_name_search_indexes'),
+    ]
+
+    operations = [
+        # get-assigned-patient-ids reads the episodes of the live accesses of a user from this index
+        migrations.RunSQL(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS phi_uea_user_episode_active_idx '
+            'ON phi_userepisodeaccess (user_id, episode_id) WHERE deleted_at IS NULL',
+            'DROP INDEX CONCURRENTLY IF EXISTS phi_uea_user_episode_active_idx',
+        ),
+        # Superseded by the index above, which serves the lookups by user, and by user and episode, as well
+        migrations.RunSQL(
+            'DROP INDEX CONCURRENTLY IF EXISTS phi_uea_user_active_idx',
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS phi_uea_user_active_idx '
+            'ON phi_userepisodeaccess (user_id) WHERE deleted_at IS NULL',
+        ),
+    ]
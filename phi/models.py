@@ -45,6 +45,8 @@ class Patient(BaseModel):
 
     organizations = models.ManyToManyField(user_models.Organization, through='OrganizationPatientsMapping')
 
+    soft_delete_cascade = ('address', 'episodes', 'organization_mappings')
+
     def __str__(self):
         patient_identifier = self.first_name
         if self.last_name:
@@ -53,13 +55,6 @@ class Patient(BaseModel):
             patient_identifier += (' ' + str(self.dob))
         return patient_identifier
 
-    def soft_delete(self):
-        with transaction.atomic():
-            self.address.soft_delete()
-            [episode.soft_delete() for episode in self.episodes.all()]
-            [mapping.soft_delete() for mapping in self.organization_mappings.all()]
-            super().soft_delete()
-
 
 # class Place(BaseModel):
 #     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -144,17 +139,14 @@ class Episode(BaseModel):
     attending_physician = models.ForeignKey(user_models.UserProfile, on_delete=models.CASCADE, related_name='attending_episodes', null=True)      # noqa
     primary_physician = models.ForeignKey(Physician, on_delete=models.CASCADE, related_name='primary_episodes', null=True)          # noqa
 
+    soft_delete_cascade = ('user_accesses',)
+
     def __str__(self):
         episode = str(self.patient)
         if self.soc_date:
             episode += (' ' + str(self.soc_date))
         return episode
 
-    def soft_delete(self):
-        with transaction.atomic():
-            [access.soft_delete() for access in self.user_accesses.all()]
-            super().soft_delete()
-
 
 class Place(BaseModel):
     uuid = models.UUIDField(unique=True, primary_key=True, default=uuid.uuid4, editable=False)
@@ -163,10 +155,7 @@ class Place(BaseModel):
     organization = models.ForeignKey(user_models.Organization, on_delete=models.CASCADE, related_name='places')
     address = models.OneToOneField(user_models.Address, related_name='address', on_delete=models.CASCADE)
 
-    def soft_delete(self):
-        with transaction.atomic():
-            self.address.soft_delete()
-            super().soft_delete()
+    soft_delete_cascade = ('address',)
 
 
 class Visit(BaseModel):
@@ -179,21 +168,25 @@ class Visit(BaseModel):
     # This is reduntant info, otherwise can be obtained using UserEpisodeAccess Model
     organization = models.ForeignKey(user_models.Organization, related_name='visits', on_delete=models.CASCADE, null=True)
 
-    midnight_epoch = models.CharField(max_length=20, null=True)
+    # Epoch (in ms) of the midnight of the day of the visit
+    midnight_epoch = models.BigIntegerField(null=True)
     planned_start_time = models.DateTimeField(null=True)
 
     is_done = models.BooleanField(default=False)
     time_of_completion = models.DateTimeField(null=True)
     is_deleted = models.NullBooleanField(default=False, null=True)
 
+    soft_delete_cascade = ('visit_miles', 'report_item')
+
     def save(self, *args, **kwargs):
         with transaction.atomic():
             super().save(*args, **kwargs)
-            try:
-                self.report_item.save()
-                self.report_item.report.save()
-            except ReportItem.DoesNotExist:
-                pass
+            Visit.touch_reports([self.pk])
+
+    @staticmethod
+    def touch_reports(visit_ids):
+        # A report changes with its visits. Report items hold no data of their own, so they are not touched
+        Report.objects.filter(report_items__visit_id__in=visit_ids).touch()
 
     def __str__(self):
         if self.episode:
@@ -211,18 +204,6 @@ class Visit(BaseModel):
             visit += ('-' + str(self.planned_start_time))
         return visit
 
-    def soft_delete(self):
-        with transaction.atomic():
-            try:
-                self.visit_miles.soft_delete()
-                try:
-                    self.report_item.soft_delete()
-                except ReportItem.DoesNotExist:
-                    pass
-            except VisitMiles.DoesNotExist as e:
-                print(e)
-            super().soft_delete()
-
 
 class VisitMiles(BaseModel):
     uuid = models.UUIDField(unique=True, primary_key=True, default=uuid.uuid4, editable=False)
@@ -237,10 +218,8 @@ class VisitMiles(BaseModel):
     def save(self, *args, **kwargs):
         with transaction.atomic():
             super().save(*args, **kwargs)
-            try:
-                self.visit.save()
-            except Visit.DoesNotExist:
-                pass
+            Visit.objects.filter(pk=self.visit_id).touch()
+            Visit.touch_reports([self.visit_id])
 
     def __str__(self):
         return str(self.visit) + '--' + str(self.computed_miles) + '--' + str(self.extra_miles)
@@ -282,14 +261,11 @@ class Report(BaseModel):
     uuid = models.UUIDField(unique=True, primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(user_models.UserProfile, on_delete=models.CASCADE, related_name='reports')
 
+    soft_delete_cascade = ('report_items',)
+
     def __str__(self):
         return str(self.uuid) + str(self.user)
 
-    def soft_delete(self):
-        with transaction.atomic():
-            [item.soft_delete() for item in self.report_items.all()]
-            super().soft_delete()
-
 
 class ReportItem(BaseModel):
     uuid = models.UUIDField(unique=True, primary_key=True, default=uuid.uuid4, editable=False)
@@ -3,11 +3,27 @@ from user_auth.serializers.serializers import AddressSerializer
 from user_auth.serializers.serializers import AddressIDWithLatLngSerializer
 from user_auth.serializers.response_serializers import UserProfileResponseSerializer
 from phi import models
+from phi.constants import ACTIVE_EPISODES_ATTR
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def get_active_episode(patient, manager='objects'):
+    """
+    Returns the active episode of the patient.
+    Reads the episodes prefetched by PatientDataService if present, else queries them using the given manager.
+    """
+    active_episodes = getattr(patient, ACTIVE_EPISODES_ATTR, None)
+    if active_episodes is None:
+        return patient.episodes(manager=manager).get(is_active=True)
+    if not active_episodes:
+        raise models.Episode.DoesNotExist('No active episode for patient: %s' % str(patient.uuid))
+    if len(active_episodes) > 1:
+        raise models.Episode.MultipleObjectsReturned('Multiple active episodes for patient: %s' % str(patient.uuid))
+    return active_episodes[0]
+
+
 class PatientListSerializer(serializers.ModelSerializer):
     patients = serializers.ListField(child=serializers.UUIDField())
 
@@ -44,7 +60,7 @@ class PatientSerializer(serializers.ModelSerializer):
             return obj.last_name
 
     def get_episodeID(self, obj):
-        return obj.episodes.get(is_active=True).uuid
+        return get_active_episode(obj).uuid
 
 
 class PatientWithAddressSerializer(serializers.ModelSerializer):
@@ -146,7 +162,7 @@ class EpisodeWithCareTeamResponseSerializer(EpisodeResponseSerializer):
     careTeam = serializers.SerializerMethodField(required=False)
 
     def get_careTeam(self, obj):
-        return obj.user_accesses.all().values_list('user__uuid', flat=True)
+        return [access.user_id for access in obj.user_accesses.all()]
 
     class Meta:
         model = models.Episode
@@ -356,7 +372,7 @@ class PatientWithOldIdsSerializer(serializers.ModelSerializer):
             return obj.last_name
 
     def get_episodeID(self, obj):
-        return obj.episodes.get(is_active=True).uuid
+        return get_active_episode(obj).uuid
 
 
 # Todo: Temporary Serializer to support migrating apps from 0.2.0 to Next Version
@@ -475,7 +491,7 @@ class AssignedPatientsHistorySerializer(serializers.ModelSerializer):
     def get_episode(self, obj):
         try:
             # Todo: IMP: If the episode is marked 'is_active=False' on Patient Deletion, this will start failing.
-            return EpisodeWithCareTeamResponseSerializer(obj.episodes(manager='all_objects').select_related('primary_physician').get(is_active=True)).data
+            return EpisodeWithCareTeamResponseSerializer(get_active_episode(obj, manager='all_objects')).data
         except Exception as e:
             logger.error(str(e))
             return None
@@ -161,7 +161,7 @@ class VisitSerializer(serializers.ModelSerializer):
             if obj:
                 ms = int(obj)
                 datetime.datetime.fromtimestamp(ms/1000.0)
-                return obj
+                return ms
         except Exception as e:
             logger.error('Error in parsing midnightEpochOfVisit: %s' % str(e))
             raise serializers.ValidationError('midnightEpochOfVisit format is not correct')
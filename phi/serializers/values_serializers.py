@@ -0,0 +1,111 @@
+"""
+Fast path serializers of the large read endpoints, see flocarebase.common.values_serializer. Each one gives the same
+data as the response serializer it is named after
+"""
+from flocarebase.common.values_serializer import Computed, Nested, Value, ValuesSerializer
+from rest_framework import serializers
+from user_auth.serializers.values_serializers import ADDRESS_FIELDS, ADDRESS_ID_WITH_LAT_LNG_FIELDS
+
+import datetime
+
+to_datetime_representation = serializers.DateTimeField().to_representation
+
+
+def get_name(first_name, last_name):
+    if first_name and last_name:
+        return '{} {}'.format(first_name, last_name)
+    elif first_name:
+        return first_name
+    else:
+        return last_name
+
+
+def get_midnight_epoch_of_visit(midnight_epoch):
+    return int(midnight_epoch) if midnight_epoch else None
+
+
+# PatientWithAddressSerializer
+PATIENT_WITH_ADDRESS_FIELDS = (
+    ('patientID', Value('uuid', str)),
+    ('name', Computed(('first_name', 'last_name'), get_name)),
+    ('firstName', Value('first_name')),
+    ('lastName', Value('last_name')),
+    ('address', Nested('address', ADDRESS_ID_WITH_LAT_LNG_FIELDS)),
+)
+
+# VisitMilesResponseSerializer
+VISIT_MILES_FIELDS = (
+    ('odometerStart', Value('odometer_start', float)),
+    ('odometerEnd', Value('odometer_end', float)),
+    ('computedMiles', Value('computed_miles', float)),
+    ('extraMiles', Value('extra_miles', float)),
+    ('milesComments', Value('miles_comments')),
+)
+
+
+class VisitValuesSerializer(ValuesSerializer):
+    """
+    VisitResponseSerializer
+    """
+    fields = (
+        ('visitID', Value('id', str)),
+        ('userID', Value('user_id', str)),
+        ('episodeID', Value('episode_id', str)),
+        ('placeID', Value('place_id', str)),
+        ('timeOfCompletion', Value('time_of_completion', to_datetime_representation)),
+        ('isDone', Value('is_done', bool)),
+        ('isDeleted', Value('is_deleted', bool)),
+        ('midnightEpochOfVisit', Computed(('midnight_epoch',), get_midnight_epoch_of_visit)),
+        ('plannedStartTime', Value('planned_start_time', datetime.datetime.isoformat)),
+        ('visitMiles', Nested('visit_miles', VISIT_MILES_FIELDS)),
+        ('reportID', Value('report_item__report_id', str)),
+    )
+
+
+class VisitForOrgValuesSerializer(ValuesSerializer):
+    """
+    VisitForOrgResponseSerializer
+    """
+    fields = (
+        ('visitID', Value('id', str)),
+        ('userID', Value('user_id', str)),
+        ('episode', Nested('episode', (
+            ('episodeID', Value('uuid', str)),
+            ('patient', Nested('patient', PATIENT_WITH_ADDRESS_FIELDS)),
+        ))),
+        ('place', Nested('place', (
+            ('placeID', Value('uuid', str)),
+            ('name', Value('name')),
+            ('address', Nested('address', ADDRESS_ID_WITH_LAT_LNG_FIELDS)),
+        ))),
+        ('timeOfCompletion', Value('time_of_completion', to_datetime_representation)),
+        ('midnightEpoch', Value('midnight_epoch', str)),
+        ('isDone', Value('is_done', bool)),
+        ('isDeleted', Value('is_deleted', bool)),
+        ('plannedStartTime', Value('planned_start_time', datetime.datetime.isoformat)),
+    )
+
+
+class PatientsForOrgValuesSerializer(ValuesSerializer):
+    """
+    PatientsForOrgSerializer, of OrganizationPatientsMapping rows
+    """
+    fields = (
+        ('patientID', Value('patient__uuid', str)),
+        ('firstName', Value('patient__first_name')),
+        ('lastName', Value('patient__last_name')),
+        ('address', Nested('patient__address', ADDRESS_FIELDS)),
+    )
+
+
+class PlaceHistoryValuesSerializer(ValuesSerializer):
+    """
+    PlaceHistoryResponseSerializer
+    """
+    fields = (
+        ('placeID', Value('uuid', str)),
+        ('contactNumber', Value('contact_number')),
+        ('name', Value('name')),
+        ('address', Nested('address', ADDRESS_FIELDS)),
+        ('inactive', Computed(('deleted_at',), bool)),
+    )
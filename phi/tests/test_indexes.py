@@ -0,0 +1,164 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+from flocarebase.common.search import filter_by_name
+from flocarebase.common.test_helpers import create_organization, create_user
+from phi import models
+from phi.tests.utils import utils
+from unittest import skipUnless
+
+import uuid
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Partial indexes are created on postgres only')
+class TestSoftDeletePartialIndexes(TestCase):
+    """
+    Seeds a dataset large enough for the planner to prefer an index, and checks the plans of the hot queries
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organizations = [create_organization() for _ in range(10)]
+        cls.organization = cls.organizations[0]
+        cls.user_profile = create_user(cls.organization)
+        cls.other_user_profiles = [create_user(organization) for organization in cls.organizations[1:]]
+
+        for organization, user_profile in zip(cls.organizations[1:], cls.other_user_profiles):
+            utils.create_patients_in_bulk(organization, 200, user_profile)
+        utils.create_patients_in_bulk(cls.organization, 20, cls.user_profile)
+
+        # Past episodes of the patients of the other users, with their accesses revoked, as reassignments leave behind
+        past_accesses = list()
+        for patient_id, user_id, organization_id in models.UserEpisodeAccess.objects.exclude(user=cls.user_profile)\
+                .values_list('episode__patient_id', 'user_id', 'organization_id'):
+            for _ in range(3):
+                episode = models.Episode(patient_id=patient_id, is_active=False)
+                past_accesses.append(models.UserEpisodeAccess(episode=episode, user_id=user_id,
+                                                              organization_id=organization_id, user_role='CareGiver',
+                                                              deleted_at=timezone.now()))
+        models.Episode.objects.bulk_create([access.episode for access in past_accesses])
+        models.UserEpisodeAccess.objects.bulk_create(past_accesses)
+
+        visits = list()
+        for index in range(5000):
+            organization = cls.organizations[index % len(cls.organizations)]
+            user_profile = cls.user_profile if organization == cls.organization else \
+                cls.other_user_profiles[index % len(cls.other_user_profiles)]
+            visits.append(models.Visit(id=uuid.uuid4(), user=user_profile, organization=organization,
+                                       midnight_epoch=1530000000000 + (index % 365) * 86400000))
+        models.Visit.objects.bulk_create(visits)
+
+        with connection.cursor() as cursor:
+            for table in ('phi_visit', 'phi_userepisodeaccess', 'phi_episode', 'phi_organizationpatientsmapping'):
+                cursor.execute('ANALYZE %s' % table)
+
+    def get_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + sql, params)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = self.get_plan(queryset)
+        self.assertIn(index_name, plan, plan)
+        self.assertNotIn('Seq Scan', plan, plan)
+
+    def test_visits_for_org_uses_index(self):
+        "get-visits-for-org filters visits by organization and midnight epoch range"
+        visits = models.Visit.objects.filter(organization=self.organization)\
+            .filter(midnight_epoch__range=(1530000000000, 1532592000000))
+        self.assertUsesIndex(visits, 'phi_visit_org_epoch_active_idx')
+
+    def test_visits_for_user_uses_index(self):
+        "get-visits-for-user filters visits by user"
+        self.assertUsesIndex(models.Visit.objects.filter(user=self.user_profile), 'phi_visit_user_active_idx')
+
+    def test_visits_for_user_in_range_uses_index(self):
+        "Visits of a user are looked up by midnight epoch range"
+        visits = models.Visit.objects.filter(user=self.user_profile)\
+            .filter(midnight_epoch__range=(1530000000000, 1532592000000))
+        self.assertUsesIndex(visits, 'phi_visit_user_epoch_active_idx')
+
+    def test_assigned_patient_ids_uses_index(self):
+        "get-assigned-patient-ids reads the episodes of the accesses of a user from one index, joined by primary key"
+        patient_ids = models.UserEpisodeAccess.objects.filter(user=self.user_profile)\
+            .values_list('episode__patient_id', flat=True)
+        self.assertUsesIndex(patient_ids, 'phi_uea_user_episode_active_idx')
+
+    def test_accesses_of_user_use_index(self):
+        "The accesses of a user are looked up by user, and by user and episode"
+        accesses = models.UserEpisodeAccess.objects.filter(user=self.user_profile)
+        episode_id = accesses.values_list('episode_id', flat=True).first()
+        self.assertUsesIndex(accesses, 'phi_uea_user_episode_active_idx')
+        self.assertUsesIndex(accesses.filter(organization=self.organization, episode_id=episode_id),
+                             'phi_uea_user_episode_active_idx')
+        accessible_ids = accesses\
+            .filter(episode_id__in=[episode_id], episode__is_active=True, episode__deleted_at=None)\
+            .values_list('episode_id', flat=True)
+        self.assertUsesIndex(accessible_ids, 'phi_uea_user_episode_active_idx')
+
+    def test_care_team_uses_index(self):
+        "Care team lookups filter episode accesses by episode and organization"
+        episode = models.Episode.objects.filter(patient__organization_mappings__organization=self.organization).first()
+        accesses = models.UserEpisodeAccess.objects.filter(episode=episode, organization=self.organization)
+        self.assertUsesIndex(accesses, 'phi_uea_episode_org_active_idx')
+
+    def test_active_episode_uses_index(self):
+        "The active episode of a patient is looked up by patient and is_active"
+        patient = models.Patient.objects.first()
+        episodes = models.Episode.objects.filter(patient=patient, is_active=True)
+        self.assertUsesIndex(episodes, 'phi_episode_patient_active_idx')
+
+    def test_patients_for_org_uses_index(self):
+        "get-patients-for-org filters patient mappings by organization"
+        mappings = models.OrganizationPatientsMapping.objects.filter(organization=self.organization)
+        self.assertUsesIndex(mappings, 'phi_opm_org_active_idx')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Name search indexes are created on postgres only')
+class TestNameSearchIndexes(TestCase):
+    """
+    Checks that the name search of the admin autocomplete is served by the UPPER(name) prefix indexes
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = create_organization()
+        utils.create_patients_in_bulk(cls.organization, 5000)
+        models.Physician.objects.bulk_create([
+            models.Physician(npi=str(index), first_name='first_%d' % index, last_name='last_%d' % index,
+                             organization=cls.organization) for index in range(5000)])
+        User.objects.bulk_create([
+            User(username='user_%d' % index, first_name='first_%d' % index, last_name='last_%d' % index)
+            for index in range(5000)])
+        with connection.cursor() as cursor:
+            for table in ('phi_patient', 'phi_physician', 'auth_user'):
+                cursor.execute('ANALYZE %s' % table)
+
+    def get_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + sql, params)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def assertUsesIndexes(self, queryset, *index_names):
+        plan = self.get_plan(queryset)
+        for index_name in index_names:
+            self.assertIn(index_name, plan, plan)
+        self.assertNotIn('Seq Scan', plan, plan)
+
+    def test_patient_search_uses_indexes(self):
+        "Patients are searched by the prefixes of their first and last names"
+        patients = filter_by_name(models.Patient.objects.all(), 'firstname_123')
+        self.assertUsesIndexes(patients, 'phi_patient_first_name_search_idx', 'phi_patient_last_name_search_idx')
+
+    def test_physician_search_uses_indexes(self):
+        "Physicians are searched by the prefixes of their first and last names"
+        physicians = filter_by_name(models.Physician.objects.all(), 'last_4321 first_4321')
+        self.assertUsesIndexes(physicians, 'phi_physician_first_name_search_idx', 'phi_physician_last_name_search_idx')
+
+    def test_staff_search_uses_indexes(self):
+        "Staff are searched by the prefixes of the names of their users"
+        users = filter_by_name(User.objects.all(), 'First_99')
+        self.assertUsesIndexes(users, 'user_auth_user_first_name_search_idx', 'user_auth_user_last_name_search_idx')
@@ -0,0 +1,109 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from flocarebase.common.test_helpers import create_organization, create_user
+from phi import models
+from phi.tests.utils import utils
+
+
+class TestVisitTouches(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = create_organization()
+        cls.user_profile = create_user(cls.organization)
+        cls.place = utils.create_place(cls.organization)
+
+    def setUp(self):
+        self.visit = utils.create_visit(self.user_profile, self.organization, place=self.place)
+        self.report = models.Report.objects.create(user=self.user_profile)
+        models.ReportItem.objects.create(report=self.report, visit=self.visit)
+        utils.age_rows(models.Visit, models.VisitMiles, models.Report)
+
+    def get_writes(self, context):
+        return [query['sql'] for query in context.captured_queries
+                if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+
+    def test_saving_visit_miles_touches_visit_and_report(self):
+        "Saving the miles of a visit marks the visit and its report changed, without loading them"
+        visit_miles = models.VisitMiles.objects.get(visit=self.visit)
+        visit_miles.extra_miles = 4
+        with CaptureQueriesContext(connection) as context:
+            visit_miles.save()
+
+        writes = self.get_writes(context)
+        self.assertEqual(len(writes), 3, writes)
+        self.assertTrue(all(sql.startswith('UPDATE') for sql in writes), writes)
+        self.assertGreater(models.Visit.objects.get(pk=self.visit.pk).updated_at, self.visit.updated_at)
+        self.assertGreater(models.Report.objects.get(pk=self.report.pk).updated_at, self.report.updated_at)
+
+    def test_saving_visit_touches_report(self):
+        "Saving a visit marks its report changed, without loading it"
+        visit = models.Visit.objects.get(pk=self.visit.pk)
+        visit.is_done = True
+        with CaptureQueriesContext(connection) as context:
+            visit.save()
+
+        writes = self.get_writes(context)
+        self.assertEqual(len(writes), 2, writes)
+        self.assertTrue(all(sql.startswith('UPDATE') for sql in writes), writes)
+        self.assertGreater(models.Report.objects.get(pk=self.report.pk).updated_at, self.report.updated_at)
+
+
+class TestSoftDeleteCascade(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = create_organization()
+        cls.user_profile = create_user(cls.organization)
+        cls.place = utils.create_place(cls.organization)
+
+    def create_reported_visits(self, count):
+        visits = [utils.create_visit(self.user_profile, self.organization, place=self.place) for _ in range(count)]
+        report = models.Report.objects.create(user=self.user_profile)
+        for visit in visits:
+            models.ReportItem.objects.create(report=report, visit=visit)
+        return visits
+
+    def test_queryset_soft_delete_cascades_in_one_update_per_table(self):
+        "Soft deleting visits retires their miles and report items with one UPDATE per table"
+        query_counts = list()
+        for count in [1, 50]:
+            visit_ids = [visit.id for visit in self.create_reported_visits(count)]
+            with CaptureQueriesContext(connection) as context:
+                models.Visit.objects.filter(id__in=visit_ids).soft_delete()
+            query_counts.append(len([query for query in context.captured_queries
+                                     if query['sql'].startswith('UPDATE')]))
+
+            self.assertFalse(models.Visit.objects.filter(id__in=visit_ids).exists())
+            self.assertFalse(models.VisitMiles.objects.filter(visit_id__in=visit_ids).exists())
+            self.assertFalse(models.ReportItem.objects.filter(visit_id__in=visit_ids).exists())
+            self.assertEqual(models.VisitMiles.all_objects.filter(visit_id__in=visit_ids).count(), count)
+        self.assertListEqual(query_counts, [3, 3])
+
+    def test_patient_soft_delete_cascades(self):
+        "Soft deleting a patient retires its address, episodes, their accesses and the organization mappings"
+        patient = utils.create_patient(self.organization)
+        utils.assign_patient_to_user(patient, self.user_profile, self.organization)
+        patient.soft_delete()
+
+        self.assertIsNotNone(patient.deleted_at)
+        self.assertFalse(models.Patient.objects.filter(pk=patient.pk).exists())
+        self.assertIsNotNone(type(patient.address).all_objects.get(pk=patient.address_id).deleted_at)
+        self.assertFalse(models.Episode.objects.filter(patient=patient).exists())
+        self.assertFalse(models.UserEpisodeAccess.objects.filter(episode__patient=patient).exists())
+        self.assertFalse(models.OrganizationPatientsMapping.objects.filter(patient=patient).exists())
+
+    def test_user_profile_soft_delete_cascades(self):
+        "Soft deleting a user retires the user's organization accesses, visits with their miles, and reports"
+        user_profile = create_user(self.organization)
+        visit = utils.create_visit(user_profile, self.organization, place=self.place)
+        report = models.Report.objects.create(user=user_profile)
+        models.ReportItem.objects.create(report=report, visit=visit)
+        user_profile.soft_delete()
+
+        self.assertFalse(user_profile.org_accesses.exists())
+        self.assertFalse(models.Visit.objects.filter(user=user_profile).exists())
+        self.assertFalse(models.VisitMiles.objects.filter(visit=visit).exists())
+        self.assertFalse(models.Report.objects.filter(user=user_profile).exists())
+        self.assertFalse(models.ReportItem.objects.filter(report=report).exists())
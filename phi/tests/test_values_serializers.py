@@ -0,0 +1,79 @@
+from django.test import TestCase
+from django.utils import timezone
+from flocarebase.common.test_helpers import create_organization, create_user
+from phi import models
+from phi.serializers import response_serializers, values_serializers
+from phi.tests.utils import utils
+from rest_framework.renderers import JSONRenderer
+
+import json
+import uuid
+
+
+class TestValuesSerializers(TestCase):
+    """
+    The fast path serializers must give the same JSON as the DRF serializers they stand in for
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = create_organization()
+        cls.user_profile = create_user(cls.organization)
+        patients = utils.create_patients_in_bulk(cls.organization, 3, cls.user_profile)
+        # Without address and with only a last name
+        homeless = models.Patient.objects.create(first_name='', last_name='last', title='', primary_contact='1')
+        models.OrganizationPatientsMapping.objects.create(organization=cls.organization, patient=homeless)
+        models.Episode.objects.create(patient=homeless, is_active=True)
+        episodes = [utils.get_active_episode(patient) for patient in patients + [homeless]]
+
+        place = utils.create_place(cls.organization)
+        deleted_place = utils.create_place(cls.organization, name='deleted')
+        deleted_place.soft_delete()
+
+        visits = [utils.create_visit(cls.user_profile, cls.organization, episode=episode) for episode in episodes]
+        visits.append(utils.create_visit(cls.user_profile, cls.organization, place=place))
+        # Without miles, not done and never planned
+        visits.append(models.Visit.objects.create(id=uuid.uuid4(), user=cls.user_profile, organization=cls.organization,
+                                                  place=place, midnight_epoch=None, is_deleted=None))
+        models.Visit.objects.filter(pk=visits[0].pk).update(
+            is_done=True, time_of_completion=timezone.now(), planned_start_time=timezone.now(), midnight_epoch=0)
+        models.VisitMiles.objects.filter(visit=visits[1]).update(miles_comments='comments', odometer_start=None)
+        report = models.Report.objects.create(user=cls.user_profile)
+        models.ReportItem.objects.create(report=report, visit=visits[2])
+
+    def assertSameData(self, values_serializer_class, serializer_class, queryset):
+        expected = serializer_class(queryset, many=True).data
+        data = values_serializer_class.serialize(queryset)
+        self.assertGreater(len(data), 1)
+        self.assertEqual(json.loads(JSONRenderer().render(data).decode('utf-8')),
+                         json.loads(JSONRenderer().render(expected).decode('utf-8')))
+
+    def test_visit(self):
+        "Should give the data of VisitResponseSerializer"
+        self.assertSameData(values_serializers.VisitValuesSerializer, response_serializers.VisitResponseSerializer,
+                            models.Visit.objects.filter(user=self.user_profile).order_by('id'))
+
+    def test_visit_for_org(self):
+        "Should give the data of VisitForOrgResponseSerializer"
+        self.assertSameData(values_serializers.VisitForOrgValuesSerializer,
+                            response_serializers.VisitForOrgResponseSerializer,
+                            models.Visit.objects.filter(organization=self.organization).order_by('id'))
+
+    def test_patients_for_org(self):
+        "Should give the data of PatientsForOrgSerializer"
+        self.assertSameData(values_serializers.PatientsForOrgValuesSerializer,
+                            response_serializers.PatientsForOrgSerializer,
+                            models.OrganizationPatientsMapping.objects.filter(organization=self.organization)
+                            .order_by('uuid'))
+
+    def test_place_history(self):
+        "Should give the data of PlaceHistoryResponseSerializer, with the deleted places inactive"
+        self.assertSameData(values_serializers.PlaceHistoryValuesSerializer,
+                            response_serializers.PlaceHistoryResponseSerializer,
+                            models.Place.all_objects.filter(organization=self.organization).order_by('uuid'))
+
+    def test_single_query(self):
+        "Should read all the rows with a single query"
+        queryset = models.Visit.objects.filter(organization=self.organization)
+        with self.assertNumQueries(1):
+            values_serializers.VisitForOrgValuesSerializer.serialize(queryset)
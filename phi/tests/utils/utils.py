@@ -0,0 +1,34 @@
+from django.utils import timezone
+from phi.management.seed import create_patient, create_patients_in_bulk, get_active_episode
+from phi.models import UserEpisodeAccess, Place, Visit, VisitMiles
+from user_auth.models import Address
+
+import datetime
+import uuid
+
+
+def assign_patient_to_user(patient, user_profile, organization):
+    return UserEpisodeAccess.objects.create(episode=get_active_episode(patient), user=user_profile,
+                                            organization=organization, user_role='CareGiver')
+
+
+def create_place(organization, name='place'):
+    address = Address.objects.create(street_address='s_a', zip='234', city='Bangalore', state='state',
+                                     country='country', latitude=23.3, longitude=34.3)
+    return Place.objects.create(name=name, contact_number='123', address=address, organization=organization)
+
+
+def create_visit(user_profile, organization, episode=None, place=None, midnight_epoch=1539907200000):
+    visit = Visit.objects.create(id=uuid.uuid4(), user=user_profile, organization=organization, episode=episode,
+                                 place=place, midnight_epoch=midnight_epoch)
+    VisitMiles.objects.create(visit=visit, odometer_start=1, odometer_end=11, computed_miles=10, extra_miles=0)
+    return visit
+
+
+def age_rows(*model_classes, days=1):
+    """
+    Moves updated_at of all the rows of the given models back, so that they are older than a fresh sync watermark
+    """
+    updated_at = timezone.now() - datetime.timedelta(days=days)
+    for model_class in model_classes:
+        model_class.all_objects.update(updated_at=updated_at)
@@ -0,0 +1,91 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from flocarebase.common.test_helpers import UserRequestTestCase, create_organization, create_user
+from phi.models import Episode
+from phi.tests.utils import utils
+from rest_framework import status
+
+import json
+import uuid
+
+
+class TestEpisodeView(UserRequestTestCase):
+
+    url = '/phi/v1.0/get-episodes-for-ids/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.initObjects()
+
+    def post_episode_ids(self, episode_ids):
+        return self.client.post(self.url, json.dumps({'episodeIDs': episode_ids}), 'application/json',
+                                **self.get_base_headers())
+
+    def test_splits_accessible_and_inaccessible_episodes(self):
+        "Should return only active episodes assigned to the user as success"
+        assigned = utils.create_patient(self.organization)
+        utils.assign_patient_to_user(assigned, self.user_profile, self.organization)
+        assigned_episode = utils.get_active_episode(assigned)
+        other_patient = utils.create_patient(self.organization)
+        utils.assign_patient_to_user(other_patient, create_user(create_organization()), self.organization)
+        other_episode = utils.get_active_episode(other_patient)
+        inactive = utils.create_patient(self.organization)
+        utils.assign_patient_to_user(inactive, self.user_profile, self.organization)
+        inactive_episode = utils.get_active_episode(inactive)
+        Episode.objects.filter(uuid=inactive_episode.uuid).update(is_active=False)
+        requested = [str(assigned_episode.uuid), str(other_episode.uuid), str(inactive_episode.uuid),
+                     str(uuid.uuid4()), 'not-a-uuid']
+
+        response = self.post_episode_ids(requested)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertListEqual([item['episodeID'] for item in response.data['success']], [str(assigned_episode.uuid)])
+        self.assertListEqual([item['id'] for item in response.data['failure']], requested[1:])
+
+    def test_fails_malformed_ids(self):
+        "Should list the IDs that are not strings, eg: objects or lists, as failures"
+        patient = utils.create_patient(self.organization)
+        utils.assign_patient_to_user(patient, self.user_profile, self.organization)
+        episode = utils.get_active_episode(patient)
+
+        response = self.post_episode_ids([str(episode.uuid), {'id': 'not-a-uuid'}, ['not-a-uuid']])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertListEqual([item['episodeID'] for item in response.data['success']], [str(episode.uuid)])
+        self.assertEqual(len(response.data['failure']), 2)
+
+    def test_serializes_clinicians_physician_and_care_team(self):
+        "Should return the nested clinicians and the care team of each episode"
+        patient = utils.create_patient(self.organization)
+        utils.assign_patient_to_user(patient, self.user_profile, self.organization)
+        teammate = create_user(self.organization)
+        utils.assign_patient_to_user(patient, teammate, self.organization)
+        episode = utils.get_active_episode(patient)
+        episode.soc_clinician = teammate
+        episode.save()
+
+        response = self.post_episode_ids([str(episode.uuid)])
+
+        serialized = response.data['success'][0]
+        self.assertEqual(serialized['socClinician']['userID'], str(teammate.uuid))
+        self.assertEqual(serialized['socClinician']['username'], teammate.user.username)
+        self.assertIsNone(serialized['attendingPhysician'])
+        self.assertSetEqual({str(user_id) for user_id in serialized['careTeam']},
+                            {str(self.user_profile.uuid), str(teammate.uuid)})
+
+    def test_query_count_does_not_grow_with_episodes(self):
+        "Should authorize and serialize 1, 50 and 500 episodes with the same number of queries"
+        clinician = create_user(self.organization)
+        query_counts = list()
+        for count in (1, 50, 500):
+            patients = utils.create_patients_in_bulk(self.organization, count, self.user_profile)
+            episodes = Episode.objects.filter(patient__in=patients)
+            episodes.update(soc_clinician=clinician, attending_physician=clinician)
+            episode_ids = [str(episode_id) for episode_id in episodes.values_list('uuid', flat=True)]
+
+            with CaptureQueriesContext(connection) as context:
+                response = self.post_episode_ids(episode_ids)
+
+            self.assertEqual(len(response.data['success']), count)
+            query_counts.append(len(context.captured_queries))
+        self.assertEqual(len(set(query_counts)), 1, 'Query counts for 1, 50, 500 episodes: %s' % str(query_counts))
@@ -0,0 +1,220 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from flocarebase.common.test_helpers import UserRequestTestCase, create_user
+from phi.constants import SYNC_WATERMARK_HEADER
+from phi.models import Patient, Episode, UserEpisodeAccess, Place, Visit
+from phi.tests.utils import utils
+from rest_framework.authtoken.models import Token
+from user_auth.models import Address
+
+import datetime
+
+
+class TestPatientsForSyncView(UserRequestTestCase):
+
+    url = '/phi/v1.0/get-patients-for-sync/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.initObjects()
+
+    def test_returns_assigned_patients_with_care_team(self):
+        "Should return assigned patients along-with their active episode and care team"
+        patient = utils.create_patient(self.organization)
+        utils.assign_patient_to_user(patient, self.user_profile, self.organization)
+        teammate = create_user(self.organization)
+        utils.assign_patient_to_user(patient, teammate, self.organization)
+        removed = utils.create_patient(self.organization)
+        utils.assign_patient_to_user(removed, self.user_profile, self.organization).soft_delete()
+
+        response = self.client.get(self.url, **self.get_base_headers())
+
+        self.assertEqual(response.status_code, 200)
+        patients = {item['patientID']: item for item in response.data}
+        self.assertSetEqual(set(patients.keys()), {str(patient.uuid), str(removed.uuid)})
+        episode = patients[str(patient.uuid)]['episode']
+        self.assertEqual(episode['episodeID'], str(utils.get_active_episode(patient).uuid))
+        self.assertSetEqual({str(user_id) for user_id in episode['careTeam']},
+                            {str(self.user_profile.uuid), str(teammate.uuid)})
+        self.assertFalse(patients[str(patient.uuid)]['inactive'])
+        self.assertTrue(patients[str(removed.uuid)]['inactive'])
+        self.assertListEqual(patients[str(removed.uuid)]['episode']['careTeam'], [])
+
+    def test_query_count_is_flat(self):
+        "Should serialize any number of patients with the same number of queries"
+        patient = utils.create_patient(self.organization)
+        utils.assign_patient_to_user(patient, self.user_profile, self.organization)
+        with CaptureQueriesContext(connection) as single:
+            self.client.get(self.url, **self.get_base_headers())
+
+        for _ in range(20):
+            patient = utils.create_patient(self.organization)
+            utils.assign_patient_to_user(patient, self.user_profile, self.organization)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(self.url, **self.get_base_headers())
+
+        self.assertEqual(len(response.data), 21)
+        self.assertEqual(len(many.captured_queries), len(single.captured_queries))
+
+    def test_full_sync_sets_watermark_header(self):
+        "Should return the full dump along-with the watermark for the next delta sync"
+        response = self.client.get(self.url, **self.get_base_headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(parse_datetime(response[SYNC_WATERMARK_HEADER]))
+
+    def test_delta_sync_returns_changes_and_tombstones(self):
+        "Should only return the patients changed after the watermark, and tombstones for the removed ones"
+        unchanged = utils.create_patient(self.organization)
+        utils.assign_patient_to_user(unchanged, self.user_profile, self.organization)
+        renamed = utils.create_patient(self.organization)
+        utils.assign_patient_to_user(renamed, self.user_profile, self.organization)
+        new_teammate = utils.create_patient(self.organization)
+        utils.assign_patient_to_user(new_teammate, self.user_profile, self.organization)
+        unassigned = utils.create_patient(self.organization)
+        unassigned_access = utils.assign_patient_to_user(unassigned, self.user_profile, self.organization)
+        deleted = utils.create_patient(self.organization)
+        utils.assign_patient_to_user(deleted, self.user_profile, self.organization)
+        utils.age_rows(Address, Patient, Episode, UserEpisodeAccess)
+        since = (timezone.now() - datetime.timedelta(hours=1)).isoformat()
+
+        renamed.first_name = 'renamed'
+        renamed.save()
+        utils.assign_patient_to_user(new_teammate, create_user(self.organization), self.organization)
+        unassigned_access.soft_delete()
+        deleted.soft_delete()
+        response = self.client.get(self.url, {'since': since}, **self.get_base_headers())
+
+        self.assertEqual(response.status_code, 200)
+        changed = {item['patientID']: item for item in response.data['changed']}
+        self.assertSetEqual(set(changed.keys()), {str(renamed.uuid), str(new_teammate.uuid)})
+        self.assertEqual(changed[str(renamed.uuid)]['firstName'], 'renamed')
+        self.assertEqual(len(changed[str(new_teammate.uuid)]['episode']['careTeam']), 2)
+        self.assertSetEqual(set(response.data['deleted']), {str(unassigned.uuid), str(deleted.uuid)})
+        self.assertEqual(response.data['watermark'], response[SYNC_WATERMARK_HEADER])
+
+    def test_delta_sync_rejects_invalid_watermark(self):
+        "Should return 400 for a watermark that is not a timestamp"
+        response = self.client.get(self.url, {'since': 'yesterday-ish'}, **self.get_base_headers())
+        self.assertEqual(response.status_code, 400)
+
+
+class TestPlacesForSyncView(UserRequestTestCase):
+
+    url = '/phi/v1.0/get-places-for-sync/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.initObjects()
+
+    def test_delta_sync_returns_changes_and_tombstones(self):
+        "Should only return the places changed after the watermark, and tombstones for the deleted ones"
+        utils.create_place(self.organization, 'unchanged')
+        renamed = utils.create_place(self.organization, 'renamed')
+        moved = utils.create_place(self.organization, 'moved')
+        deleted = utils.create_place(self.organization, 'deleted')
+        utils.age_rows(Address, Place)
+        since = (timezone.now() - datetime.timedelta(hours=1)).isoformat()
+
+        renamed.name = 'new name'
+        renamed.save()
+        moved.address.city = 'new city'
+        moved.address.save()
+        deleted.soft_delete()
+        response = self.client.get(self.url, {'since': since}, **self.get_base_headers())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertSetEqual({item['placeID'] for item in response.data['changed']}, {str(renamed.uuid), str(moved.uuid)})
+        self.assertListEqual(response.data['deleted'], [str(deleted.uuid)])
+
+    def test_full_sync_returns_all_places(self):
+        "Should return every place, including deleted ones, without a watermark"
+        utils.create_place(self.organization).soft_delete()
+        utils.create_place(self.organization)
+        response = self.client.get(self.url, **self.get_base_headers())
+        self.assertEqual(len(response.data), 2)
+        self.assertIn(SYNC_WATERMARK_HEADER, response)
+
+
+class TestConditionalSync(UserRequestTestCase):
+    """
+    The full syncs carry an ETag, and answer 304 without a body to the clients that already have it
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.initObjects()
+        cls.patient = utils.create_patient(cls.organization)
+        cls.access = utils.assign_patient_to_user(cls.patient, cls.user_profile, cls.organization)
+        cls.place = utils.create_place(cls.organization)
+        cls.visit = utils.create_visit(cls.user_profile, cls.organization, place=cls.place)
+
+    def get(self, path, etag=None, **params):
+        headers = self.get_base_headers()
+        if etag:
+            headers['HTTP_IF_NONE_MATCH'] = etag
+        return self.client.get(path, params, **headers)
+
+    def assertChangesETag(self, path, change):
+        etag = self.get(path)['ETag']
+        self.assertEqual(self.get(path, etag).status_code, 304)
+        change()
+        response = self.get(path, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_not_modified(self):
+        "Should answer 304 with the new watermark to a client having the current full sync"
+        for path in ('/phi/v1.0/get-patients-for-sync/', '/phi/v1.0/get-places-for-sync/',
+                     '/phi/v1.0/get-visits-for-user/'):
+            response = self.get(path)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response['ETag'].startswith('"'))
+
+            not_modified = self.get(path, response['ETag'])
+            self.assertEqual(not_modified.status_code, 304)
+            self.assertEqual(not_modified.content, b'')
+            self.assertEqual(not_modified['ETag'], response['ETag'])
+            self.assertGreater(not_modified[SYNC_WATERMARK_HEADER], response[SYNC_WATERMARK_HEADER])
+
+    def test_etag_is_per_user(self):
+        "Should give other users a different ETag for the same rows"
+        etag = self.get('/phi/v1.0/get-places-for-sync/')['ETag']
+        teammate = create_user(self.organization)
+        self.user_profile, self.authorization_header = teammate, 'Token ' + Token.objects.create(user=teammate.user).key
+        self.assertNotEqual(self.get('/phi/v1.0/get-places-for-sync/')['ETag'], etag)
+
+    def test_patient_changes(self):
+        "Should change the ETag of the patients along-with their addresses, accesses and care teams"
+        path = '/phi/v1.0/get-patients-for-sync/'
+        self.assertChangesETag(path, lambda: self.patient.address.save())
+        self.assertChangesETag(path, lambda: utils.assign_patient_to_user(
+            self.patient, create_user(self.organization), self.organization))
+        self.assertChangesETag(path, lambda: UserEpisodeAccess.objects.filter(pk=self.access.pk).soft_delete())
+
+    def test_place_changes(self):
+        "Should change the ETag of the places along-with their addresses, new places and deleted ones"
+        path = '/phi/v1.0/get-places-for-sync/'
+        self.assertChangesETag(path, lambda: self.place.address.save())
+        self.assertChangesETag(path, lambda: utils.create_place(self.organization))
+        self.assertChangesETag(path, lambda: Place.objects.filter(pk=self.place.pk).delete())
+
+    def test_visit_changes(self):
+        "Should change the ETag of the visits along-with their miles"
+        path = '/phi/v1.0/get-visits-for-user/'
+        self.assertChangesETag(path, lambda: self.visit.visit_miles.save())
+        self.assertChangesETag(path, lambda: Visit.objects.filter(pk=self.visit.pk).soft_delete())
+
+    def test_late_commits(self):
+        "Should change the ETag for rows saved with an updated_at older than the latest one"
+        path = '/phi/v1.0/get-places-for-sync/'
+        latest = utils.create_place(self.organization)
+        self.assertChangesETag(path, lambda: Place.objects.filter(pk=self.place.pk).update(
+            updated_at=latest.updated_at - datetime.timedelta(seconds=1)))
+
+    def test_delta_sync_has_no_etag(self):
+        "Should not set an ETag on delta syncs"
+        response = self.get('/phi/v1.0/get-places-for-sync/', since=timezone.now().isoformat())
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
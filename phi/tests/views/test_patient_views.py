@@ -0,0 +1,195 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from flocarebase.common.test_helpers import UserRequestTestCase, create_organization, create_user, make_user_admin
+from phi.models import Episode, UserEpisodeAccess
+from phi.tests.utils import utils
+from phi.views import AccessiblePatientsDetailView
+from unittest.mock import MagicMock
+
+import json
+import uuid
+
+
+class TestAccessiblePatientsDetailView(UserRequestTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.initObjects()
+
+    def get_results(self, patient_ids):
+        request = MagicMock(name='request', user=self.user_profile.user, data={'patientIDs': patient_ids})
+        return AccessiblePatientsDetailView().get_results(request)
+
+    def test_splits_accessible_and_inaccessible_patients(self):
+        "Should return only the patients with an active episode assigned to the user as success"
+        assigned = utils.create_patient(self.organization)
+        utils.assign_patient_to_user(assigned, self.user_profile, self.organization)
+        unassigned = utils.create_patient(self.organization)
+        other_user = create_user(create_organization())
+        other_patient = utils.create_patient(self.organization)
+        utils.assign_patient_to_user(other_patient, other_user, self.organization)
+        deleted = utils.create_patient(self.organization)
+        utils.assign_patient_to_user(deleted, self.user_profile, self.organization)
+        deleted.soft_delete()
+        missing_id = str(uuid.uuid4())
+
+        requested = [str(assigned.uuid), str(unassigned.uuid), str(other_patient.uuid), str(deleted.uuid),
+                     missing_id, 'not-a-uuid']
+        success_ids, failure_ids = self.get_results(requested)
+
+        self.assertListEqual(success_ids, [str(assigned.uuid)])
+        self.assertListEqual(failure_ids, requested[1:])
+
+    def test_ignores_inactive_episodes(self):
+        "Should fail a patient whose only assigned episode is inactive"
+        patient = utils.create_patient(self.organization)
+        utils.assign_patient_to_user(patient, self.user_profile, self.organization)
+        Episode.objects.filter(patient=patient).update(is_active=False)
+
+        success_ids, failure_ids = self.get_results([str(patient.uuid)])
+
+        self.assertListEqual(success_ids, [])
+        self.assertListEqual(failure_ids, [str(patient.uuid)])
+
+    def test_access_check_query_count_is_flat(self):
+        "Should resolve any number of patient IDs with the same number of queries"
+        patients = [utils.create_patient(self.organization) for _ in range(20)]
+        for patient in patients:
+            utils.assign_patient_to_user(patient, self.user_profile, self.organization)
+
+        with CaptureQueriesContext(connection) as single:
+            self.get_results([str(patients[0].uuid)])
+        with CaptureQueriesContext(connection) as many:
+            success_ids, failure_ids = self.get_results([str(patient.uuid) for patient in patients])
+
+        self.assertEqual(len(success_ids), len(patients))
+        self.assertEqual(len(many.captured_queries), len(single.captured_queries))
+
+    def test_post_returns_success_and_failure(self):
+        "Should serialize accessible patients and mark the rest as access denied"
+        patient = utils.create_patient(self.organization)
+        utils.assign_patient_to_user(patient, self.user_profile, self.organization)
+        missing_id = str(uuid.uuid4())
+        payload = {'patientIDs': [str(patient.uuid), missing_id]}
+        url = '/phi/v1.0/get-patients-for-ids/'
+        response = self.client.post(url, json.dumps(payload), 'application/json', **self.get_base_headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual([item['patientID'] for item in response.data['success']], [str(patient.uuid)])
+        self.assertListEqual([item['id'] for item in response.data['failure']], [missing_id])
+
+    def test_post_fails_malformed_ids(self):
+        "Should list the IDs that are not strings, eg: objects or lists, as failures"
+        patient = utils.create_patient(self.organization)
+        utils.assign_patient_to_user(patient, self.user_profile, self.organization)
+        payload = {'patientIDs': [str(patient.uuid), {'id': 'not-a-uuid'}, ['not-a-uuid']]}
+        url = '/phi/v1.0/get-patients-for-ids/'
+        response = self.client.post(url, json.dumps(payload), 'application/json', **self.get_base_headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual([item['patientID'] for item in response.data['success']], [str(patient.uuid)])
+        self.assertEqual(len(response.data['failure']), 2)
+
+    def test_post_query_count_is_flat(self):
+        "Should serialize any number of patients with the same number of queries"
+        patients = [utils.create_patient(self.organization) for _ in range(20)]
+        for patient in patients:
+            utils.assign_patient_to_user(patient, self.user_profile, self.organization)
+        url = '/phi/v1.0/get-patients-for-ids/'
+
+        with CaptureQueriesContext(connection) as single:
+            self.client.post(url, json.dumps({'patientIDs': [str(patients[0].uuid)]}), 'application/json',
+                             **self.get_base_headers())
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.post(url, json.dumps({'patientIDs': [str(patient.uuid) for patient in patients]}),
+                                        'application/json', **self.get_base_headers())
+
+        self.assertEqual(len(response.data['success']), len(patients))
+        episode_ids = {str(utils.get_active_episode(patient).uuid) for patient in patients}
+        self.assertSetEqual({str(item['episodeID']) for item in response.data['success']}, episode_ids)
+        self.assertEqual(len(many.captured_queries), len(single.captured_queries))
+
+
+class TestAccessiblePatientViewSetUpdate(UserRequestTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.initObjects()
+        make_user_admin(cls.user_profile)
+
+    def test_update_care_team_only(self):
+        "Should replace the care team when no patient fields are passed"
+        patient = utils.create_patient(self.organization)
+        old_user, new_user = create_user(self.organization), create_user(self.organization)
+        utils.assign_patient_to_user(patient, old_user, self.organization)
+
+        response = self.client.put('/phi/v1.0/patients/' + str(patient.uuid) + '/',
+                                   json.dumps({'users': [str(new_user.uuid)]}), 'application/json',
+                                   **self.get_base_headers())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(list(UserEpisodeAccess.objects.filter(episode__patient=patient)
+                                  .values_list('user_id', flat=True)), [new_user.uuid])
+
+
+class TestAccessiblePatientViewSetList(UserRequestTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.initObjects()
+        make_user_admin(cls.user_profile)
+        cls.clinician = create_user(cls.organization)
+        utils.create_patients_in_bulk(cls.organization, 12, cls.clinician)
+        cls.patient = utils.create_patient(cls.organization, first_name='Jane', last_name='Doe')
+        utils.assign_patient_to_user(cls.patient, cls.user_profile, cls.organization)
+        utils.assign_patient_to_user(cls.patient, cls.clinician, cls.organization)
+        utils.create_patient(cls.organization, first_name='Jane', last_name='Smith')
+        utils.create_patient(create_organization())
+
+    def get_patients(self, **params):
+        return self.client.get('/phi/v1.0/patients/', params, **self.get_base_headers())
+
+    def test_pages_through_org_patients(self):
+        "Should return the pages of the org's patients without overlaps, and the total count"
+        seen = list()
+        for page in range(1, 4):
+            response = self.get_patients(perPage=5, page=page, sort='firstName')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['content-range'], '14')
+            seen.extend(item['patient']['id'] for item in response.data)
+        self.assertEqual(len(seen), 14)
+        self.assertEqual(len(set(seen)), 14)
+
+    def test_returns_care_team_ids(self):
+        "Should return the users with access to each patient"
+        response = self.get_patients(perPage=20, page=1, query='Jane Doe')
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['patient']['id'], str(self.patient.uuid))
+        self.assertSetEqual(set(response.data[0]['userIds']), {str(self.user_profile.uuid), str(self.clinician.uuid)})
+
+    def test_search_matches_every_word(self):
+        "Should only return patients matching all the words of the query"
+        response = self.get_patients(perPage=20, page=1, query='Jane Smith')
+        self.assertListEqual([item['patient']['lastName'] for item in response.data], ['Smith'])
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        "Should use the same number of queries for small and large pages"
+        with CaptureQueriesContext(connection) as small:
+            self.get_patients(perPage=2, page=1)
+        with CaptureQueriesContext(connection) as large:
+            response = self.get_patients(perPage=14, page=1)
+        self.assertEqual(len(response.data), 14)
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+
+    def test_pages_by_cursor(self):
+        "Should page through the org's patients with the next-cursor header, when a cursor is passed"
+        seen = list()
+        params = {'cursor': '', 'size': 5, 'sort': 'firstName', 'order': 'DESC'}
+        while True:
+            response = self.get_patients(**params)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.has_header('content-range'))
+            seen.extend(item['patient']['firstName'] for item in response.data)
+            if not response.has_header('next-cursor'):
+                break
+            params['cursor'] = response['next-cursor']
+        self.assertEqual(len(seen), 14)
+        self.assertListEqual(seen, sorted(seen, reverse=True))
@@ -0,0 +1,45 @@
+from django.test import override_settings
+from flocarebase.common.publishers import InMemoryPublisher
+from flocarebase.common.pubnub_service import PubnubService
+from flocarebase.common.test_helpers import UserRequestTestCase, create_user, make_user_admin
+from phi.models import Episode, Physician
+from phi.tests.utils import utils
+
+import json
+
+
+class TestPhysiciansViewSet(UserRequestTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.initObjects()
+        make_user_admin(cls.user_profile)
+        cls.physician = Physician.objects.create(npi='1234567890', first_name='first', last_name='last',
+                                                 organization=cls.organization)
+
+    def test_update_notifies_care_team_once_per_user(self):
+        "Should send every user on the care team of the physician's patients one update for all their patients"
+        clinicians = [create_user(self.organization) for _ in range(2)]
+        patients = [utils.create_patient(self.organization) for _ in range(3)]
+        Episode.objects.filter(patient__in=patients).update(primary_physician=self.physician)
+        for patient in patients:
+            for clinician in clinicians:
+                utils.assign_patient_to_user(patient, clinician, self.organization)
+        utils.assign_patient_to_user(utils.create_patient(self.organization), clinicians[0], self.organization)
+
+        url = '/phi/v1.0/physicians/' + str(self.physician.uuid) + '/'
+        response = self.client.put(url, json.dumps({'npi': '1234567890', 'firstName': 'first', 'lastName': 'last',
+                                                    'phone2': '12345'}),
+                                   'application/json', **self.get_base_headers())
+        self.assertEqual(response.status_code, 200)
+
+        InMemoryPublisher.clear()
+        with override_settings(PUBNUB_PUBLISHER='flocarebase.common.publishers.InMemoryPublisher'):
+            self.assertEqual(PubnubService.drain_outbox(), 6)
+        patient_ids = sorted(str(patient.uuid) for patient in patients)
+        published = dict(InMemoryPublisher.messages)
+        self.assertEqual(len(InMemoryPublisher.messages), 2)
+        for clinician in clinicians:
+            message = published[str(clinician.uuid) + '_assignedPatients']
+            self.assertEqual(message['actionType'], 'UPDATE')
+            self.assertListEqual(message['patientIDs'], patient_ids)
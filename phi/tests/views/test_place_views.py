@@ -1,8 +1,8 @@
 from flocarebase.common.test_helpers import UserRequestTestCase, create_organization, make_user_admin
+from flocarebase.models import PubnubOutboxMessage
 from backend import errors
 from phi.models import *
 from rest_framework import status
-from unittest.mock import patch
 from user_auth.models import *
 
 import json
@@ -14,6 +14,11 @@ class TestPlacesViewSet(UserRequestTestCase):
     def setUpTestData(cls):
         cls.initObjects()
 
+    def assertQueued(self, channel, message):
+        outbox_message = PubnubOutboxMessage.objects.get()
+        self.assertEqual(outbox_message.channel, channel)
+        self.assertDictEqual(json.loads(outbox_message.message), message)
+
     def test_create_checks_admin_permissions(self):
         "Should return 400 if user is not admin"
         new_place_name = 'place 2'
@@ -35,8 +40,7 @@ class TestPlacesViewSet(UserRequestTestCase):
         response = self.client.post(url, json.dumps(payload), "application/json", **self.get_base_headers())
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
-    @patch('django.conf.settings.PUBNUB')
-    def test_creates_place_and_address(self, settings_mock):
+    def test_creates_place_and_address(self):
         "Creates Place and address for correct request"
         make_user_admin(self.user_profile)
         user_org = UserOrganizationAccess.objects.get(user=self.user_profile)
@@ -63,17 +67,14 @@ class TestPlacesViewSet(UserRequestTestCase):
         addresses = Address.objects.all()
         self.assertEqual(addresses.count(), 1)
         self.validate_address_object_equal(addresses[0], payload["address"])
-        settings_mock.publish.assert_called_with()
-        channel_call_params = 'organisation_' + str(user_org.organization.uuid)
-        settings_mock.publish().channel.assert_called_with(channel_call_params)
-        message_call_params = {
+        channel = 'organisation_' + str(user_org.organization.uuid)
+        message = {
             'actionType': 'CREATE_PLACE',
             'placeID': str(places[0].uuid)
         }
-        settings_mock.publish().channel(channel_call_params).message.assert_called_with(message_call_params)
+        self.assertQueued(channel, message)
 
-    @patch('django.conf.settings.PUBNUB')
-    def test_creates_place_for_contact_number_null(self, settings_mock):
+    def test_creates_place_for_contact_number_null(self):
         "Creates place if contact number is null"
         make_user_admin(self.user_profile)
         user_org = UserOrganizationAccess.objects.get(user=self.user_profile)
@@ -100,14 +101,12 @@ class TestPlacesViewSet(UserRequestTestCase):
         addresses = Address.objects.all()
         self.assertEqual(addresses.count(), 1)
         self.validate_address_object_equal(addresses[0], payload["address"])
-        settings_mock.publish.assert_called_with()
-        channel_call_params = 'organisation_' + str(user_org.organization.uuid)
-        settings_mock.publish().channel.assert_called_with(channel_call_params)
-        message_call_params = {
+        channel = 'organisation_' + str(user_org.organization.uuid)
+        message = {
             'actionType': 'CREATE_PLACE',
             'placeID': str(places[0].uuid)
         }
-        settings_mock.publish().channel(channel_call_params).message.assert_called_with(message_call_params)
+        self.assertQueued(channel, message)
 
     def test_update_fails_if_user_is_not_admin(self):
         "Should fail if user is not admin"
@@ -153,8 +152,7 @@ class TestPlacesViewSet(UserRequestTestCase):
         }
         self.assertDictEqual(response.data, expected_response)
 
-    @patch('django.conf.settings.PUBNUB')
-    def test_update_updates_place_and_address(self, settings_mock):
+    def test_update_updates_place_and_address(self):
         "Should update place and address objects"
         make_user_admin(self.user_profile)
         user_org = UserOrganizationAccess.objects.get(user=self.user_profile)
@@ -180,14 +178,12 @@ class TestPlacesViewSet(UserRequestTestCase):
         self.assertEqual(places[0].name, payload["name"])
         self.assertEqual(places[0].contact_number, payload["contactNumber"])
         self.validate_address_object_equal(places[0].address, payload["address"])
-        settings_mock.publish.assert_called_with()
-        channel_call_params = 'organisation_' + str(user_org.organization.uuid)
-        settings_mock.publish().channel.assert_called_with(channel_call_params)
-        message_call_params = {
+        channel = 'organisation_' + str(user_org.organization.uuid)
+        message = {
             'actionType': 'UPDATE_PLACE',
             'placeID': str(places[0].uuid)
         }
-        settings_mock.publish().channel(channel_call_params).message.assert_called_with(message_call_params)
+        self.assertQueued(channel, message)
 
     def test_retrieve_place_does_not_exist(self):
         "Should return 400 if place does not exist"
@@ -238,7 +234,26 @@ class TestPlacesViewSet(UserRequestTestCase):
         }
         self.assertDictEqual(response.data, expected_response)
 
+    def test_list_pages_by_cursor(self):
+        "Should page through the places with the next-cursor header, when a cursor is passed"
+        places = [self.createPlaceAndAddress() for _ in range(5)]
+        url = '/phi/v1.0/places/'
+        seen = list()
+        params = {'cursor': '', 'size': 2, 'sort': 'name', 'order': 'DESC'}
+        while True:
+            response = self.client.get(url, params, **self.get_base_headers())
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(place['placeID'] for place in response.data)
+            if not response.has_header('next-cursor'):
+                break
+            params['cursor'] = response['next-cursor']
+        self.assertListEqual(seen, sorted((str(place.uuid) for place in places), reverse=True))
 
+    def test_list_rejects_invalid_cursor(self):
+        "Should return 400 for a malformed cursor"
+        response = self.client.get('/phi/v1.0/places/', {'cursor': 'bla'}, **self.get_base_headers())
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], errors.DATA_INVALID)
 
     def createPlaceAndAddress(self):
         address = Address.objects.create(street_address="s_a", zip='234', city='Bangalore', state='state',
@@ -0,0 +1,175 @@
+from django.test import override_settings
+from flocarebase.common.test_helpers import QueryBudget, UserRequestTestCase, create_user, make_user_admin
+from phi import urls
+from phi.models import Episode, Physician, Report, ReportItem, UserEpisodeAccess
+from phi.tests.utils import utils
+from unittest.mock import patch
+
+import uuid
+
+# Rows of each kind in the seeded dataset. Above REPEATED_QUERY_THRESHOLD, so that a query per row shows up
+ROWS = 5
+
+
+class TestPhiQueryBudgets(UserRequestTestCase):
+    """
+    The most queries every route of phi.urls may take on the seeded dataset. Raise a budget only along-with a change
+    that needs more queries, never to make an N+1 pass
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.initObjects()
+        make_user_admin(cls.user_profile)
+        cls.care_team = [create_user(cls.organization) for _ in range(ROWS)]
+        cls.physician = Physician.objects.create(npi='1234567890', first_name='first', last_name='last',
+                                                 organization=cls.organization)
+        cls.patients = utils.create_patients_in_bulk(cls.organization, ROWS, cls.user_profile)
+        cls.episodes = list(Episode.objects.filter(patient__in=cls.patients).order_by('patient__first_name'))
+        Episode.objects.filter(pk__in=[episode.pk for episode in cls.episodes]).update(primary_physician=cls.physician)
+        UserEpisodeAccess.objects.bulk_create([
+            UserEpisodeAccess(episode=episode, user=user, organization=cls.organization, user_role='CareGiver')
+            for episode in cls.episodes for user in cls.care_team])
+        cls.places = [utils.create_place(cls.organization, name='place_%d' % index) for index in range(ROWS)]
+
+        cls.visits = [utils.create_visit(cls.user_profile, cls.organization, episode=episode)
+                      for episode in cls.episodes]
+        cls.visits += [utils.create_visit(cls.user_profile, cls.organization, place=place) for place in cls.places]
+        cls.reports = [Report.objects.create(user=cls.user_profile) for _ in range(ROWS)]
+        # The first report has a visit of every patient, the others one place visit each
+        ReportItem.objects.bulk_create([ReportItem(report=cls.reports[0], visit=visit) for visit in cls.visits[:ROWS]])
+        ReportItem.objects.bulk_create([ReportItem(report=report, visit=visit)
+                                        for report, visit in zip(cls.reports, cls.visits[ROWS:])])
+        # Reported through create-report-for-visits
+        cls.unreported_visits = [utils.create_visit(cls.user_profile, cls.organization, place=place)
+                                 for place in cls.places]
+
+        # Assigned through add-patient-to-user
+        cls.unassigned_patient = utils.create_patient(cls.organization)
+
+    def get_visit_payload(self, visit_id=None):
+        return {
+            'visitID': str(visit_id or uuid.uuid4()),
+            'episodeID': str(self.episodes[0].uuid),
+            'placeID': None,
+            'midnightEpochOfVisit': '1539907200000',
+            'isDone': True,
+            'visitMiles': {'odometerStart': 1, 'odometerEnd': 11, 'extraMiles': 2},
+        }
+
+    def get_patient_payload(self):
+        return {
+            'patient': {'firstName': 'first', 'lastName': 'last', 'primaryContact': '1234567890',
+                        'address': {'streetAddress': 'street', 'zip': '560001', 'city': 'city', 'state': 'state',
+                                    'country': 'country', 'latitude': 12.9, 'longitude': 77.5}},
+            'users': [str(user.uuid) for user in self.care_team],
+            'physicianId': str(self.physician.uuid),
+        }
+
+    def get_budgets(self):
+        patient = '/phi/v1.0/patients/%s/' % self.patients[0].uuid
+        physician = '/phi/v1.0/physicians/%s/' % self.physician.uuid
+        place = '/phi/v1.0/places/%s/' % self.places[0].uuid
+        patient_ids = [str(patient.uuid) for patient in self.patients]
+        visit_ids = [str(visit.id) for visit in self.visits]
+        address = {'streetAddress': 'street', 'zipCode': '560001', 'city': 'city', 'state': 'state',
+                   'country': 'country', 'latitude': 12.9, 'longitude': 77.5}
+        report_items = [{'reportItemId': str(uuid.uuid4()), 'visitID': str(visit.id)}
+                        for visit in self.unreported_visits]
+        return [
+            QueryBudget('get', '/phi/v1.0/', queries=1),
+
+            # Patients
+            QueryBudget('get', '/phi/v1.0/patients/', queries=4),
+            QueryBudget('get', '/phi/v1.0/patients/', {'cursor': ''}, queries=4),
+            QueryBudget('get', '/phi/v1.0/patients/', {'query': 'firstName', 'page': 1, 'perPage': 10}, queries=5),
+            # Checks that every user of the care team is in the organization, and queues three notifications for
+            # each, one at a time
+            QueryBudget('post', '/phi/v1.0/patients/', self.get_patient_payload(), queries=36, repeats=3 * ROWS),
+            QueryBudget('get', patient, queries=8),
+            # Assigns and unassigns the care team, and queues two notifications per user, one user at a time
+            QueryBudget('put', patient, {'users': [str(user.uuid) for user in self.care_team[1:]]}, queries=52,
+                        repeats=2 * ROWS),
+            # Notifies the care team one user at a time
+            QueryBudget('delete', patient, queries=34, repeats=ROWS + 1),
+            QueryBudget('get', '/phi/v1.0/get-assigned-patient-ids/', queries=2),
+            QueryBudget('post', '/phi/v1.0/get-patients-for-ids/', {'patientIDs': patient_ids}, queries=4),
+            QueryBudget('post', '/phi/v1.0/get-patients-for-old-ids/', {'patientIDs': patient_ids}, queries=1),
+            QueryBudget('get', '/phi/v1.0/get-patients-for-org/', queries=3),
+            QueryBudget('post', '/phi/v1.0/add-patient-to-user/', {'patientID': str(self.unassigned_patient.uuid)},
+                        queries=10),
+            # Creates the patients one at a time, each in its own transaction
+            QueryBudget('post', '/phi/v1.0/bulk-create-patients/', [self.get_patient_payload() for _ in range(ROWS)],
+                        queries=42, repeats=ROWS),
+            # Reads the ETag of the rows and the care teams, and the active patients upfront, so that the accesses can
+            # be streamed
+            QueryBudget('get', '/phi/v1.0/get-patients-for-sync', queries=7),
+
+            # Episodes
+            QueryBudget('post', '/phi/v1.0/get-episodes-for-ids/',
+                        {'episodeIDs': [str(episode.uuid) for episode in self.episodes]}, queries=4),
+
+            # Physicians
+            QueryBudget('get', '/phi/v1.0/physicians/', queries=3),
+            QueryBudget('post', '/phi/v1.0/physicians/',
+                        {'physician': {'npi': '1234567891', 'firstName': 'first', 'lastName': 'last'}}, queries=3),
+            QueryBudget('get', physician, queries=3),
+            # Queues a notification per user and patient of the physician
+            QueryBudget('put', physician, {'npi': '1234567890', 'firstName': 'first', 'lastName': 'last',
+                                           'phone2': '1'}, queries=37, repeats=ROWS * (ROWS + 1)),
+            # Not authenticated by token, and the NPI registry is mocked
+            QueryBudget('get', '/phi/v1.0/get-physician-for-npi/', {'npi_id': '1234567890'}),
+
+            # Places
+            QueryBudget('get', '/phi/v1.0/places/', queries=3),
+            QueryBudget('post', '/phi/v1.0/places/', {'name': 'place', 'contactNumber': '123', 'address': address},
+                        queries=7),
+            QueryBudget('get', place, queries=4),
+            QueryBudget('put', place, {'name': 'place', 'contactNumber': '123', 'address': address}, queries=9),
+            QueryBudget('delete', place, queries=12),
+            QueryBudget('get', '/phi/v1.0/get-places-for-sync', queries=4),
+
+            # Reports
+            QueryBudget('get', '/phi/v1.0/reports/', {'userID': str(self.user_profile.uuid)}, queries=4),
+            QueryBudget('get', '/phi/v1.0/reports/%s/' % self.reports[0].uuid, queries=3),
+            QueryBudget('post', '/phi/v1.0/create-report-for-visits/',
+                        {'reportID': str(uuid.uuid4()), 'reportItems': report_items, 'totalMiles': 10 * ROWS},
+                        queries=8),
+            QueryBudget('get', '/phi/v1.0/get-reports-for-user/', queries=3),
+            QueryBudget('post', '/phi/v1.0/get-reports-detail-by-ids/',
+                        {'reportIDs': [str(report.uuid) for report in self.reports]}, queries=4),
+
+            # Visits
+            QueryBudget('get', '/phi/v1.0/get-visits-for-user/', queries=3),
+            QueryBudget('get', '/phi/v1.0/get-visits-for-org/', {'start': '2018-10-01', 'end': '2018-10-30'},
+                        queries=3),
+            QueryBudget('post', '/phi/v1.0/get-visits-for-ids/', {'visitIDs': visit_ids}, queries=3),
+            QueryBudget('post', '/phi/v1.0/add-visits/', {'visits': [self.get_visit_payload() for _ in range(ROWS)]},
+                        queries=10),
+            QueryBudget('put', '/phi/v1.0/update-visit-for-id/', self.get_visit_payload(self.visits[0].id),
+                        queries=13),
+            # Checks that the episodes or places of the visits exist before the bulk update
+            QueryBudget('post', '/phi/v1.0/bulk-update-visits/',
+                        {'visits': [self.get_visit_payload(visit_id) for visit_id in visit_ids]}, queries=12),
+            QueryBudget('delete', '/phi/v1.0/delete-visit-for-id/', {'visitIDs': visit_ids}, queries=14),
+
+            # Staff only, the token authenticated callers get a 404 without any query
+            QueryBudget('get', '/phi/v1.0/upload/', status=404),
+        ]
+
+    def test_query_budgets(self):
+        "Should keep every route within its query budget, without repeated statements"
+        with patch('phi.views.physician_views.requests.get') as get:
+            get.return_value.status_code = 404
+            self.assertQueryBudgets(self.get_budgets())
+
+    @override_settings(STREAMING_RESPONSES=True)
+    def test_query_budgets_when_streaming(self):
+        "Should keep every route within its query budget with the large list responses streamed"
+        with patch('phi.views.physician_views.requests.get') as get:
+            get.return_value.status_code = 404
+            self.assertQueryBudgets(self.get_budgets())
+
+    def test_budgets_cover_every_route(self):
+        "Should have a query budget for every route"
+        self.assertRoutesCovered(urls, self.get_budgets())
@@ -0,0 +1,59 @@
+from django.test import override_settings
+from flocarebase.common.test_helpers import UserRequestTestCase, make_user_admin
+from phi.constants import SYNC_WATERMARK_HEADER
+from phi.tests.utils import utils
+from unittest.mock import patch
+
+import json
+
+
+class TestStreamingViews(UserRequestTestCase):
+    """
+    The large list responses are streamed with STREAMING_RESPONSES on, a chunk of rows at a time. The streamed body
+    must be the same as the rendered one
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.initObjects()
+        make_user_admin(cls.user_profile)
+        cls.patients = utils.create_patients_in_bulk(cls.organization, 5, cls.user_profile)
+        for patient in cls.patients:
+            utils.create_visit(cls.user_profile, cls.organization, episode=utils.get_active_episode(patient))
+        cls.place = utils.create_place(cls.organization)
+        utils.create_visit(cls.user_profile, cls.organization, place=cls.place)
+
+    def assertStreamsAsRendered(self, path, data=None):
+        rendered = self.client.get(path, data or {}, **self.get_base_headers())
+        self.assertFalse(rendered.streaming)
+        # Several chunks
+        with override_settings(STREAMING_RESPONSES=True), \
+                patch('flocarebase.common.streaming.STREAMING_CHUNK_SIZE', 2):
+            streamed = self.client.get(path, data or {}, **self.get_base_headers())
+            self.assertTrue(streamed.streaming)
+            content = b''.join(streamed.streaming_content)
+
+        self.assertEqual(streamed.status_code, rendered.status_code)
+        self.assertEqual(streamed['Content-Type'], 'application/json')
+        expected = json.loads(rendered.content.decode('utf-8'))
+        self.assertEqual(json.loads(content.decode('utf-8')), expected)
+        self.assertGreater(len(expected), 2)
+        return rendered, streamed
+
+    def test_streams_visits_for_user(self):
+        "Should stream the visits of the user, along-with the sync watermark"
+        rendered, streamed = self.assertStreamsAsRendered('/phi/v1.0/get-visits-for-user/')
+        self.assertIn(SYNC_WATERMARK_HEADER, streamed)
+
+    def test_streams_visits_for_org(self):
+        "Should stream the visits of the organization"
+        self.assertStreamsAsRendered('/phi/v1.0/get-visits-for-org/', {'start': '2018-10-01', 'end': '2018-10-30'})
+
+    def test_streams_patients_for_org(self):
+        "Should stream the patients of the organization"
+        self.assertStreamsAsRendered('/phi/v1.0/get-patients-for-org/')
+
+    def test_streams_patients_for_sync(self):
+        "Should stream the assigned patients, along-with the sync watermark"
+        rendered, streamed = self.assertStreamsAsRendered('/phi/v1.0/get-patients-for-sync/')
+        self.assertIn(SYNC_WATERMARK_HEADER, streamed)
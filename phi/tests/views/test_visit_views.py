@@ -0,0 +1,310 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from backend import errors
+from flocarebase.common.test_helpers import UserRequestTestCase, make_user_admin, create_user
+from phi.constants import SYNC_WATERMARK_HEADER
+from phi.models import Episode, Place, Report, ReportItem, Visit, VisitMiles
+from phi.tests.utils import utils
+
+import datetime
+import json
+import uuid
+
+
+class TestGetMyVisits(UserRequestTestCase):
+
+    url = '/phi/v1.0/get-visits-for-user/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.initObjects()
+
+    def test_full_sync_returns_active_visits(self):
+        "Should return the user's visits along-with the watermark for the next delta sync"
+        place = utils.create_place(self.organization)
+        visit = utils.create_visit(self.user_profile, self.organization, place=place)
+        utils.create_visit(self.user_profile, self.organization, place=place).soft_delete()
+        response = self.client.get(self.url, **self.get_base_headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual([item['visitID'] for item in response.data], [str(visit.id)])
+        self.assertIn(SYNC_WATERMARK_HEADER, response)
+
+    def test_delta_sync_returns_changes_and_tombstones(self):
+        "Should only return the visits changed after the watermark, and tombstones for the deleted ones"
+        place = utils.create_place(self.organization)
+        utils.create_visit(self.user_profile, self.organization, place=place)
+        done = utils.create_visit(self.user_profile, self.organization, place=place)
+        miles_changed = utils.create_visit(self.user_profile, self.organization, place=place)
+        deleted = utils.create_visit(self.user_profile, self.organization, place=place)
+        utils.age_rows(Visit, VisitMiles)
+        since = (timezone.now() - datetime.timedelta(hours=1)).isoformat()
+
+        done.is_done = True
+        done.save()
+        VisitMiles.objects.filter(visit=miles_changed).update(extra_miles=5, updated_at=timezone.now())
+        deleted.soft_delete()
+        response = self.client.get(self.url, {'since': since}, **self.get_base_headers())
+
+        self.assertEqual(response.status_code, 200)
+        changed = {item['visitID']: item for item in response.data['changed']}
+        self.assertSetEqual(set(changed.keys()), {str(done.id), str(miles_changed.id)})
+        self.assertTrue(changed[str(done.id)]['isDone'])
+        self.assertEqual(changed[str(miles_changed.id)]['visitMiles']['extraMiles'], 5)
+        self.assertListEqual(response.data['deleted'], [str(deleted.id)])
+
+
+class TestGetVisitsByOrg(UserRequestTestCase):
+
+    url = '/phi/v1.0/get-visits-for-org/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.initObjects()
+        make_user_admin(cls.user_profile)
+
+    def test_filters_midnight_epoch_numerically(self):
+        "Should compare midnight epochs as numbers, and keep returning them as strings"
+        place = utils.create_place(self.organization)
+        in_range = utils.create_visit(self.user_profile, self.organization, place=place, midnight_epoch=1539907200000)
+        utils.create_visit(self.user_profile, self.organization, place=place, midnight_epoch=1541376000000)
+        # Sorts inside the range as a string, but lies in 1970 as a number
+        utils.create_visit(self.user_profile, self.organization, place=place, midnight_epoch=15400000000)
+        response = self.client.get(self.url, {'start': '2018-10-02', 'end': '2018-10-30'}, **self.get_base_headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual([(item['visitID'], item['midnightEpoch']) for item in response.data],
+                             [(str(in_range.id), '1539907200000')])
+
+
+class TestAddVisitsView(UserRequestTestCase):
+
+    url = '/phi/v1.0/add-visits/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.initObjects()
+        cls.patient = utils.create_patient(cls.organization)
+        cls.episode = utils.get_active_episode(cls.patient)
+
+    def get_visit_payload(self, episode_id=None, place_id=None, **kwargs):
+        visit = {
+            'visitID': str(uuid.uuid4()),
+            'episodeID': str(episode_id or self.episode.uuid) if not place_id else None,
+            'placeID': str(place_id) if place_id else None,
+            'midnightEpochOfVisit': '1539907200000',
+            'isDone': False,
+            'visitMiles': {'odometerStart': 1, 'odometerEnd': 11, 'extraMiles': 2},
+        }
+        visit.update(kwargs)
+        return visit
+
+    def add_visits(self, visits):
+        return self.client.post(self.url, json.dumps({'visits': visits}), content_type='application/json',
+                                **self.get_base_headers())
+
+    def test_adds_visits_with_miles(self):
+        "Should save every visit along-with its miles"
+        visits = [self.get_visit_payload() for _ in range(3)]
+        response = self.add_visits(visits)
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual([str(visit_id) for visit_id in response.data['success']],
+                             [visit['visitID'] for visit in visits])
+        self.assertListEqual(response.data['failure'], [])
+        saved = Visit.objects.select_related('visit_miles').filter(user=self.user_profile)
+        self.assertEqual(len(saved), 3)
+        for visit in saved:
+            self.assertEqual(visit.organization_id, self.organization.uuid)
+            self.assertEqual(visit.midnight_epoch, 1539907200000)
+            self.assertEqual(visit.visit_miles.computed_miles, 10)
+            self.assertEqual(visit.visit_miles.extra_miles, 2)
+
+    def test_reports_failure_per_visit(self):
+        "Should save the valid visits, and fail the invalid and already uploaded ones"
+        valid = self.get_visit_payload()
+        invalid = self.get_visit_payload(midnightEpochOfVisit='not-an-epoch')
+        existing = self.get_visit_payload()
+        self.assertListEqual(self.add_visits([existing]).data['failure'], [])
+        response = self.add_visits([valid, invalid, existing, valid])
+        self.assertListEqual([str(visit_id) for visit_id in response.data['success']], [valid['visitID']])
+        self.assertListEqual([visit['visitID'] for visit in response.data['failure']],
+                             [invalid['visitID'], existing['visitID'], valid['visitID']])
+        self.assertEqual(Visit.objects.filter(user=self.user_profile).count(), 2)
+
+    def test_creates_missing_episodes_and_places(self):
+        "Should create dummy episodes and places for the visits referring to unknown ones"
+        episode_id = uuid.uuid4()
+        place_id = uuid.uuid4()
+        visits = [self.get_visit_payload(episode_id=episode_id), self.get_visit_payload(episode_id=episode_id),
+                  self.get_visit_payload(place_id=place_id)]
+        response = self.add_visits(visits)
+        self.assertEqual(len(response.data['success']), 3)
+        self.assertEqual(Episode.objects.get(uuid=episode_id).patient.first_name, 'Dummy')
+        self.assertEqual(Place.objects.get(uuid=place_id).organization, self.organization)
+
+    def test_reports_failure_of_visits_rejected_by_the_db(self):
+        "Should save the other visits when the DB rejects one, without keeping the dummy place created for it"
+        place_id = uuid.uuid4()
+        valid = self.get_visit_payload()
+        # Longer than the miles comments column
+        rejected = self.get_visit_payload(place_id=place_id,
+                                          visitMiles={'odometerStart': 1, 'odometerEnd': 11, 'milesComments': 'a' * 400})
+        response = self.add_visits([valid, rejected])
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual([str(visit_id) for visit_id in response.data['success']], [valid['visitID']])
+        self.assertListEqual([visit['visitID'] for visit in response.data['failure']], [rejected['visitID']])
+        self.assertEqual(Visit.objects.filter(user=self.user_profile).count(), 1)
+        self.assertFalse(Place.all_objects.filter(uuid=place_id).exists())
+
+    def test_query_count_is_flat(self):
+        "Should take the same number of queries irrespective of the number of visits"
+        query_counts = list()
+        for count in [1, 50]:
+            visits = [self.get_visit_payload() for _ in range(count)]
+            with CaptureQueriesContext(connection) as context:
+                response = self.add_visits(visits)
+            self.assertEqual(len(response.data['success']), count)
+            query_counts.append(len(context.captured_queries))
+        self.assertEqual(len(set(query_counts)), 1, 'Query counts for 1, 50 visits: %s' % str(query_counts))
+
+
+class TestBulkUpdateVisitView(UserRequestTestCase):
+
+    url = '/phi/v1.0/bulk-update-visits/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.initObjects()
+        cls.place = utils.create_place(cls.organization)
+
+    def get_update_payload(self, visit, **kwargs):
+        payload = {
+            'visitID': str(visit.id),
+            'placeID': str(self.place.uuid),
+            'isDone': True,
+            'midnightEpochOfVisit': '1540512000000',
+            'visitMiles': {'odometerStart': 5, 'odometerEnd': 25, 'extraMiles': 3},
+        }
+        payload.update(kwargs)
+        return payload
+
+    def update_visits(self, visits):
+        return self.client.post(self.url, json.dumps({'visits': visits}), content_type='application/json',
+                                **self.get_base_headers())
+
+    def test_updates_visits_and_miles(self):
+        "Should update the visits and their miles, and mark their reports changed"
+        visits = [utils.create_visit(self.user_profile, self.organization, place=self.place) for _ in range(2)]
+        report = Report.objects.create(user=self.user_profile)
+        ReportItem.objects.create(report=report, visit=visits[0])
+        utils.age_rows(Report, ReportItem)
+        response = self.update_visits([self.get_update_payload(visits[0]),
+                                       self.get_update_payload(visits[1], isDone=False)])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertListEqual(response.data['failure'], [])
+
+        updated = Visit.objects.select_related('visit_miles').in_bulk([visit.id for visit in visits])
+        self.assertTrue(updated[visits[0].id].is_done)
+        self.assertFalse(updated[visits[1].id].is_done)
+        for visit in updated.values():
+            self.assertEqual(visit.midnight_epoch, 1540512000000)
+            self.assertEqual(visit.visit_miles.computed_miles, 20)
+            self.assertEqual(visit.visit_miles.extra_miles, 3)
+            self.assertGreater(visit.updated_at, visits[0].updated_at)
+        yesterday = timezone.now() - datetime.timedelta(hours=1)
+        self.assertGreater(Report.objects.get(pk=report.pk).updated_at, yesterday)
+
+    def test_fails_visits_of_other_users_and_invalid_payloads(self):
+        "Should only update the caller's visits with valid payloads, and report the others per visit"
+        other_user = create_user(self.organization)
+        own = utils.create_visit(self.user_profile, self.organization, place=self.place)
+        invalid = utils.create_visit(self.user_profile, self.organization, place=self.place)
+        others = utils.create_visit(other_user, self.organization, place=self.place)
+        response = self.update_visits([self.get_update_payload(own),
+                                       self.get_update_payload(invalid, midnightEpochOfVisit='not-an-epoch'),
+                                       self.get_update_payload(others),
+                                       {'visitID': 'not-a-uuid'}])
+        self.assertEqual(response.data['count'], 1)
+        self.assertListEqual(response.data['failure'], [
+            {'id': 'not-a-uuid', 'error': errors.DATA_INVALID},
+            {'id': str(invalid.id), 'error': errors.DATA_INVALID},
+            {'id': str(others.id), 'error': errors.VISIT_NOT_EXIST},
+        ])
+        self.assertTrue(Visit.objects.get(pk=own.pk).is_done)
+        self.assertFalse(Visit.objects.get(pk=invalid.pk).is_done)
+        self.assertFalse(Visit.objects.get(pk=others.pk).is_done)
+
+    def test_fails_malformed_items(self):
+        "Should update the other visits, and report the items that are not objects or have a malformed visitID"
+        visit = utils.create_visit(self.user_profile, self.organization, place=self.place)
+        response = self.update_visits([self.get_update_payload(visit), 'not-a-visit', {'visitID': {'id': 'x'}}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+        self.assertListEqual(response.data['failure'], [
+            {'id': None, 'error': errors.DATA_INVALID},
+            {'id': {'id': 'x'}, 'error': errors.DATA_INVALID},
+        ])
+        self.assertTrue(Visit.objects.get(pk=visit.pk).is_done)
+
+    def test_keeps_user_of_visit(self):
+        "Should not hand a visit to the user passed in its payload"
+        other_user = create_user(self.organization)
+        visit = utils.create_visit(self.user_profile, self.organization, place=self.place)
+        response = self.update_visits([self.get_update_payload(visit, userID=str(other_user.uuid))])
+        self.assertEqual(response.data['count'], 1)
+        visit = Visit.objects.get(pk=visit.pk)
+        self.assertTrue(visit.is_done)
+        self.assertEqual(visit.user_id, self.user_profile.uuid)
+
+    def test_fails_visits_with_missing_episode_or_place(self):
+        "Should update the other visits, and report the ones with an episode or place that does not exist"
+        visits = [utils.create_visit(self.user_profile, self.organization, place=self.place) for _ in range(3)]
+        missing_episode = str(uuid.uuid4())
+        missing_place = str(uuid.uuid4())
+        response = self.update_visits([self.get_update_payload(visits[0]),
+                                       self.get_update_payload(visits[1], placeID=None, episodeID=missing_episode),
+                                       self.get_update_payload(visits[2], placeID=missing_place)])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+        self.assertListEqual(response.data['failure'], [
+            {'id': str(visits[1].id), 'error': errors.DATA_INVALID},
+            {'id': str(visits[2].id), 'error': errors.PLACE_NOT_EXIST},
+        ])
+        self.assertTrue(Visit.objects.get(pk=visits[0].pk).is_done)
+        self.assertFalse(Visit.objects.get(pk=visits[1].pk).is_done)
+        self.assertEqual(Visit.objects.get(pk=visits[2].pk).place_id, self.place.uuid)
+
+    def test_query_count_is_flat(self):
+        "Should take the same number of queries irrespective of the number of visits"
+        query_counts = list()
+        for count in [1, 50]:
+            visits = [utils.create_visit(self.user_profile, self.organization, place=self.place) for _ in range(count)]
+            with CaptureQueriesContext(connection) as context:
+                response = self.update_visits([self.get_update_payload(visit) for visit in visits])
+            self.assertEqual(response.data['count'], count)
+            query_counts.append(len(context.captured_queries))
+        self.assertEqual(len(set(query_counts)), 1, 'Query counts for 1, 50 visits: %s' % str(query_counts))
+
+
+class TestDeleteVisitView(UserRequestTestCase):
+
+    url = '/phi/v1.0/delete-visit-for-id/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.initObjects()
+        cls.place = utils.create_place(cls.organization)
+
+    def test_deletes_own_visits_with_miles(self):
+        "Should soft delete the user's visits along-with their miles, and fail the visits of others"
+        visits = [utils.create_visit(self.user_profile, self.organization, place=self.place) for _ in range(2)]
+        others = utils.create_visit(create_user(self.organization), self.organization, place=self.place)
+        visit_ids = [str(visit.id) for visit in visits]
+        response = self.client.delete(self.url, json.dumps({'visitIDs': visit_ids + [str(others.id)]}),
+                                      content_type='application/json', **self.get_base_headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertSetEqual(set(response.data['success']), set(visit_ids))
+        self.assertListEqual(response.data['failure'], [str(others.id)])
+        self.assertFalse(Visit.objects.filter(id__in=visit_ids).exists())
+        self.assertFalse(VisitMiles.objects.filter(visit_id__in=visit_ids).exists())
+        self.assertTrue(Visit.objects.filter(pk=others.pk).exists())
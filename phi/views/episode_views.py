@@ -1,11 +1,13 @@
 from backend import errors
 from phi import models
+from phi.data_services.episode_data_service import EpisodeDataService
 from phi.serializers.response_serializers import EpisodeDetailsResponseSerializer
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 import logging
+import uuid
 
 logger = logging.getLogger(__name__)
 
@@ -21,25 +23,29 @@ class EpisodeView(APIView):
         if 'episodeIDs' in data:
             episode_list = data['episodeIDs']
 
+            requested_ids = dict()
+            for episode_id in episode_list:
+                # Keyed by the string, as the ID passed may not be hashable
+                try:
+                    requested_ids[str(episode_id)] = uuid.UUID(str(episode_id))
+                except (TypeError, ValueError) as e:
+                    logger.error('Invalid episodeID passed: %s' % str(e))
+
+            accessible_ids = EpisodeDataService.get_accessible_episode_ids(user.profile, set(requested_ids.values()))
+
             success_ids = list()
             failure_ids = list()
             for episode_id in episode_list:
-                try:
-                    episode = models.Episode.objects.filter(uuid=episode_id).get(is_active=True)
-                    access = models.UserEpisodeAccess.objects.filter(user=user.profile).filter(episode=episode)
-                    if access.exists():
-                        success_ids.append(episode_id)
-                    else:
-                        failure_ids.append(episode_id)
-                except Exception as e:
-                    logger.error(str(e))
+                if requested_ids.get(str(episode_id)) in accessible_ids:
+                    success_ids.append(episode_id)
+                else:
                     failure_ids.append(episode_id)
             return success_ids, failure_ids
         return None, None
 
     def get_objects_by_ids(self, ids):
         # These episodes exist and are active
-        episodes = models.Episode.objects.filter(uuid__in=ids)
+        episodes = EpisodeDataService.with_care_team(models.Episode.objects.filter(uuid__in=ids))
         return episodes
 
     def post(self, request):
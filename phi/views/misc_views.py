@@ -1,15 +1,22 @@
 from backend import errors
 from django.conf import settings
+from django.db.models import Q, prefetch_related_objects
 from django.http import Http404
 from django.http import JsonResponse
 from django.shortcuts import render
+from flocarebase.exceptions import InvalidPayloadError
 from phi import models
+from phi.data_services.patient_data_service import PatientDataService
 from phi.forms import UploadFileForm
 from phi.serializers.response_serializers import AssignedPatientsHistorySerializer, PlaceHistoryResponseSerializer
+from phi.serializers.values_serializers import PlaceHistoryValuesSerializer
+from phi.views.utils import parse_sync_watermark, get_sync_watermark, full_sync_response, delta_sync_response, \
+    full_sync_list_response, get_rows_state, get_sync_etag, not_modified_sync_response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from user_auth.identity import get_request_identity
 from user_auth.models import UserOrganizationAccess
 
 import logging
@@ -42,28 +49,96 @@ def upload_file(request):
 
 
 class PatientsForSyncView(APIView):
+    """
+    Returns the patients ever assigned to the user, marking the ones no longer assigned as inactive.
+    With a `since` watermark only the patients changed after it are returned, with the removed ones as tombstones.
+    """
     queryset = models.Patient.objects.all()
     serializer_class = AssignedPatientsHistorySerializer
     permission_classes = (IsAuthenticated,)
 
+    def get_changed_accesses(self, accesses, since):
+        # The care team is part of the payload, so a change in any access to the episode changes the patient
+        changed_episode_ids = models.UserEpisodeAccess.all_objects.filter(updated_at__gt=since).values('episode_id')
+        return accesses.filter(Q(episode_id__in=changed_episode_ids) |
+                               Q(episode__updated_at__gt=since) |
+                               Q(episode__primary_physician__updated_at__gt=since) |
+                               Q(episode__patient__updated_at__gt=since) |
+                               Q(episode__patient__address__updated_at__gt=since))
+
     def get(self, request):
+        try:
+            since = parse_sync_watermark(request)
+        except InvalidPayloadError as e:
+            logger.error(str(e))
+            return Response(status=status.HTTP_400_BAD_REQUEST, data={'success': False, 'error': errors.DATA_INVALID})
+        watermark = get_sync_watermark()
         accesses = models.UserEpisodeAccess.all_objects.select_related('episode__patient__address').filter(user=request.user.profile)
+        if since:
+            accesses = self.get_changed_accesses(accesses, since)
+        if not since:
+            # Changes with the rows a delta sync looks at
+            etag = get_sync_etag(request, get_rows_state(
+                accesses, 'episode', 'episode__primary_physician', 'episode__patient', 'episode__patient__address'),
+                get_rows_state(models.UserEpisodeAccess.all_objects.filter(episode_id__in=accesses.values('episode_id'))))
+            not_modified = not_modified_sync_response(request, watermark, etag)
+            if not_modified is not None:
+                return not_modified
+
+            # Read upfront, so that the accesses can be streamed
+            active_patient_ids = {str(patient_id) for patient_id in models.UserEpisodeAccess.objects
+                                  .filter(user=request.user.profile).values_list('episode__patient_id', flat=True)}
+
+            def serialize(rows):
+                patients = [access.episode.patient for access in rows]
+                prefetch_related_objects(patients, PatientDataService.get_active_episode_with_care_team_prefetch())
+                return self.serializer_class(patients, context={'active_ids': active_patient_ids}, many=True).data
+            return full_sync_list_response(watermark, accesses, serialize, etag)
+
         patients = [access.episode.patient for access in accesses]
-        active_patient_ids = [str(access.episode.patient.uuid) for access in accesses if not bool(access.deleted_at)]
-        response = self.serializer_class(patients, context={'active_ids': active_patient_ids}, many=True)
-        return Response(response.data)
+        changed_patients = dict((patient.uuid, patient) for patient in patients)
+        active_patient_ids = set(models.UserEpisodeAccess.objects.filter(user=request.user.profile)
+                                 .filter(episode__patient_id__in=changed_patients.keys())
+                                 .values_list('episode__patient_id', flat=True))
+        changed = [patient for patient in changed_patients.values()
+                   if patient.uuid in active_patient_ids and not patient.deleted_at]
+        deleted = [str(patient.uuid) for patient in changed_patients.values()
+                   if patient.uuid not in active_patient_ids or patient.deleted_at]
+        prefetch_related_objects(changed, PatientDataService.get_active_episode_with_care_team_prefetch())
+        response = self.serializer_class(changed, many=True)
+        return delta_sync_response(watermark, response.data, deleted)
 
 
 class PlacesForSyncView(APIView):
+    """
+    Returns all the places of the user's organization, marking the deleted ones as inactive.
+    With a `since` watermark only the places changed after it are returned, with the deleted ones as tombstones.
+    """
     queryset = models.Place.objects.all()
     serializer_class = PlaceHistoryResponseSerializer
+    values_serializer_class = PlaceHistoryValuesSerializer
     permission_classes = (IsAuthenticated,)
 
     def get(self, request):
         try:
-            access = UserOrganizationAccess.objects.select_related('organization').get(user=request.user.profile)
+            since = parse_sync_watermark(request)
+        except InvalidPayloadError as e:
+            logger.error(str(e))
+            return Response(status=status.HTTP_400_BAD_REQUEST, data={'success': False, 'error': errors.DATA_INVALID})
+        watermark = get_sync_watermark()
+        try:
+            access = get_request_identity(request).get_org_access()
             places = models.Place.all_objects.select_related('address').filter(organization=access.organization)
-            return Response(status=status.HTTP_200_OK, data=self.serializer_class(places, many=True).data)
+            if not since:
+                etag = get_sync_etag(request, get_rows_state(places, 'address'))
+                not_modified = not_modified_sync_response(request, watermark, etag)
+                if not_modified is not None:
+                    return not_modified
+                return full_sync_response(watermark, self.values_serializer_class.serialize(places), etag)
+            places = places.filter(Q(updated_at__gt=since) | Q(address__updated_at__gt=since))
+            changed = [place for place in places if not place.deleted_at]
+            deleted = [str(place.uuid) for place in places if place.deleted_at]
+            return delta_sync_response(watermark, self.serializer_class(changed, many=True).data, deleted)
         except Exception as e:
             logger.error(str(e))
             return Response(status=status.HTTP_401_UNAUTHORIZED, data={'success': False, 'error': errors.ACCESS_DENIED})
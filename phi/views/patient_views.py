@@ -1,23 +1,28 @@
 from backend import errors
-from django.conf import settings
 from django.core.paginator import Paginator
 from django.db import transaction
-from django.db.models import Q
+from flocarebase.common.pagination import is_cursor_request, paginate_by_cursor, set_next_cursor
+from flocarebase.common.pubnub_service import PubnubService
+from flocarebase.common.search import filter_by_name
+from flocarebase.exceptions import InvalidPayloadError
 from phi import models
 from phi.constants import query_to_db_field_map, PHI_ADMIN
+from phi.data_services.patient_data_service import PatientDataService
 from phi.serializers.response_serializers import PatientListSerializer, PatientDetailsResponseSerializer, \
     PatientDetailsWithOldIdsResponseSerializer, PatientsForOrgSerializer
+from phi.serializers.values_serializers import PatientsForOrgValuesSerializer
 from phi.serializers.serializers import OrganizationPatientMappingSerializer, EpisodeSerializer, UserEpisodeAccessSerializer, \
     PatientPlainObjectSerializer, PatientWithUsersSerializer, PatientUpdateSerializer, \
     PatientWithUsersAndPhysiciansSerializer
 from phi.exceptions.InvalidDataForSerializerException import InvalidDataForSerializerException
-from phi.views.utils import my_publish_callback
+from phi.views.utils import list_response
 from rest_framework import generics
 from rest_framework import status
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from user_auth.identity import get_request_identity
 from user_auth.models import UserOrganizationAccess
 from user_auth.serializers.serializers import AddressSerializer
 
@@ -25,6 +30,7 @@ import datetime
 import dateutil.parser
 import logging
 import traceback
+import uuid
 
 logger = logging.getLogger(__name__)
 
@@ -63,13 +69,10 @@ class AccessiblePatientViewSet(viewsets.ViewSet):
         return query, size
 
     def get_results(self, initial_query_set, query, sort_field):
-        queryset = initial_query_set
-        if query:
-            words = query.split()
-            for word in words:
-                queryset = initial_query_set.filter(Q(first_name__istartswith=word) | Q(last_name__istartswith=word))
+        queryset = filter_by_name(initial_query_set, query)
         if sort_field:
-            queryset = queryset.order_by(sort_field)
+            # Ties are broken on the primary key, so that pages don't overlap
+            queryset = queryset.order_by(sort_field, 'uuid')
         return queryset
 
     def update(self, request, pk=None):
@@ -86,7 +89,7 @@ class AccessiblePatientViewSet(viewsets.ViewSet):
             physician = data.get('physicianId', None)
 
             # Check if caller is an admin
-            user_org = UserOrganizationAccess.objects.filter(user=request.user.profile).get(is_admin=True)
+            user_org = get_request_identity(request).get_admin_org_access()
             if user_org:
                 organization = user_org.organization
 
@@ -139,10 +142,10 @@ class AccessiblePatientViewSet(viewsets.ViewSet):
                             try:
                                 models.UserEpisodeAccess.objects \
                                     .get(organization=organization, episode_id=episode_id, user_id=user_id)
-                                settings.PUBNUB.publish().channel(str(user_id) + '_assignedPatients').message({
+                                PubnubService.publish(str(user_id) + '_assignedPatients', {
                                     'actionType': 'UPDATE',
                                     'patientID': str(patient.uuid),
-                                }).async(my_publish_callback)
+                                })
                             except models.UserEpisodeAccess.DoesNotExist as e:
                                 logger.warning(str(e))
                                 try:
@@ -165,7 +168,7 @@ class AccessiblePatientViewSet(viewsets.ViewSet):
                                     logger.debug('new episode access created for userid: %s' % str(user_id))
 
                                 # SILENT NOTIFICATION
-                                settings.PUBNUB.publish().channel(str(user_id) + '_assignedPatients').message({
+                                PubnubService.publish(str(user_id) + '_assignedPatients', {
                                     'actionType': 'ASSIGN',
                                     'patientID': str(patient.uuid),
                                     'pn_apns': {
@@ -186,10 +189,10 @@ class AccessiblePatientViewSet(viewsets.ViewSet):
                                             'patientID': str(patient.uuid)
                                         }
                                     }
-                                }).async(my_publish_callback)
+                                })
 
                                 # NOISY NOTIFICATION
-                                settings.PUBNUB.publish().channel(str(user_id) + '_assignedPatients').message({
+                                PubnubService.publish(str(user_id) + '_assignedPatients', {
                                     'pn_apns': {
                                         "aps": {
                                             "alert": {
@@ -203,13 +206,13 @@ class AccessiblePatientViewSet(viewsets.ViewSet):
                                             "navigateTo": 'patient_list'
                                         }
                                     }
-                                }).async(my_publish_callback)
+                                })
 
                                 #Message the rest of careteam
-                                settings.PUBNUB.publish().channel('episode_' + str(episode_id)).message({
+                                PubnubService.publish('episode_' + str(episode_id), {
                                     'actionType': 'USER_ASSIGNED',
                                     'userID': str(user_id),
-                                }).async(my_publish_callback)
+                                })
 
                         user_access_to_delete = models.UserEpisodeAccess.objects.filter(
                             organization=organization).filter(episode_id=episode_id).exclude(user_id__in=users)
@@ -221,21 +224,21 @@ class AccessiblePatientViewSet(viewsets.ViewSet):
 
                             user_episode_access.soft_delete()
 
-                            settings.PUBNUB.publish().channel(str(user_id) + '_assignedPatients').message({
+                            PubnubService.publish(str(user_id) + '_assignedPatients', {
                                 'actionType': 'UNASSIGN',
                                 'patientID': str(patient.uuid),
-                            }).async(my_publish_callback)
+                            })
                             # Also send out User-Unassigned Msg to that episode's channel
-                            settings.PUBNUB.publish().channel('episode_' + str(episode_id)).message({
+                            PubnubService.publish('episode_' + str(episode_id), {
                                 'actionType': 'USER_UNASSIGNED',
                                 'userID': str(user_id),
-                            }).async(my_publish_callback)
+                            })
 
                             try:
                                 # Hard delete future visits for that user
                                 logger.debug('Deleting visits for this user: %s' % str(user_id))
                                 # Get midNightEpoch for today
-                                today_midnight_epoch = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp() * 1000
+                                today_midnight_epoch = int(datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp() * 1000)
                                 future_visits = models.Visit.objects.filter(episode_id=episode_id).filter(user_id=user_id).filter(is_done=False).filter(midnight_epoch__gte=today_midnight_epoch)
                                 future_visits.delete()
                                 logger.debug('%s Visits deleted successfully' % str(len(future_visits)))
@@ -245,7 +248,7 @@ class AccessiblePatientViewSet(viewsets.ViewSet):
                         AccessiblePatientViewSet.local_counter += 1
                     logger.info('%s : %s %s updated patient record %s for Organization %s' % (PHI_ADMIN, str(request.user.first_name + ' ' + request.user.last_name),
                                                     {'userID': request.user.profile.uuid, 'email': request.user.username},
-                                                    {'UUID': patient_obj.uuid}, str(user_org.organization)))
+                                                    {'UUID': patient.uuid}, str(user_org.organization)))
                     return Response({'success': True})
 
             return Response(status=status.HTTP_401_UNAUTHORIZED, data={'success': False, 'error': errors.ACCESS_DENIED})
@@ -264,7 +267,7 @@ class AccessiblePatientViewSet(viewsets.ViewSet):
         try:
             user = request.user
             # Check if user is admin of this org
-            user_org = UserOrganizationAccess.objects.filter(user=user.profile).get(is_admin=True)
+            user_org = get_request_identity(request).get_admin_org_access()
             organization = user_org.organization
             if user_org:
                 patient = models.Patient.objects.prefetch_related('episodes').get(uuid=pk)
@@ -280,11 +283,10 @@ class AccessiblePatientViewSet(viewsets.ViewSet):
                         patient.soft_delete()
 
                         for user_id in user_ids:
-                            settings.PUBNUB.publish().channel(
-                                str(user_id) + '_assignedPatients').message({
+                            PubnubService.publish(str(user_id) + '_assignedPatients', {
                                 'actionType': 'UNASSIGN',
                                 'patientID': str(patient.uuid),
-                            }).async(my_publish_callback)
+                            })
 
                     logger.info('Delete successful')
                     logger.info('%s : %s %s deleted patient record %s for Organization %s' % (PHI_ADMIN, str(user.first_name + ' ' + user.last_name),
@@ -308,7 +310,7 @@ class AccessiblePatientViewSet(viewsets.ViewSet):
         # Check if user is admin of this org
         try:
             user = request.user
-            user_org = UserOrganizationAccess.objects.filter(user=user.profile).get(is_admin=True)
+            user_org = get_request_identity(request).get_admin_org_access()
             organization = user_org.organization
             if user_org :
                 patient = models.Patient.objects.get(uuid=pk)
@@ -334,17 +336,6 @@ class AccessiblePatientViewSet(viewsets.ViewSet):
             logger.error(str(e))
             return Response(status=status.HTTP_400_BAD_REQUEST, data={'success': False, 'error': errors.UNKNOWN_ERROR})
 
-    def filter_user_ep_objects_by_episode_ids(self, user_ep_objects, episode_ids):
-        return [user_ep_object for user_ep_object in user_ep_objects if user_ep_object.episode.uuid in episode_ids]
-
-    def get_episode_ids_for_patient(self, patient):
-        return list(map(lambda episode: episode.uuid, patient.episodes.all()))
-
-    def get_user_ids_for_patient(self, patient, all_user_ep_access_objects):
-        episode_ids = self.get_episode_ids_for_patient(patient)
-        filtered_user_ep_objects = self.filter_user_ep_objects_by_episode_ids(all_user_ep_access_objects, episode_ids)
-        return list(map(lambda object: object.user.uuid, filtered_user_ep_objects))
-
     # Todo: also send the active episodeId with each patient
     def list(self, request):
         """
@@ -375,30 +366,36 @@ class AccessiblePatientViewSet(viewsets.ViewSet):
             # Check if this user is admin of the org
             # Note: (A user can be admin of only 1 org)
             try:
-                user_org = UserOrganizationAccess.objects.filter(user=user.profile).get(is_admin=True)
+                user_org = get_request_identity(request).get_admin_org_access()
                 if user_org :
                     logger.debug('User is admin: %s' % str(user))
                     query_params = request.query_params
                     query, size = self.parse_query_params(query_params)
-                    patient_ids = models.OrganizationPatientsMapping.objects.filter(organization=user_org.organization).values_list('patient_id')
-                    patients = models.Patient.objects.select_related('address').prefetch_related('episodes').filter(uuid__in=patient_ids)
-                    if per_page is not None:
-                        paginator = Paginator(self.get_results(patients, query, sort_field), per_page)
-                        patients = paginator.page(page)
-                    episode_id_list = [[episode.uuid for episode in list(patient.episodes.all())] for patient in patients]
-                    episode_id_list = [item for sublist in episode_id_list for item in sublist]
-                    user_episode_access_objects = models.UserEpisodeAccess.objects.filter(episode_id__in=episode_id_list, organization=user_org.organization)
-                    patient_list = list(map(lambda patient: {
-                        'patient': patient,
-                        'userIds': self.get_user_ids_for_patient(patient, user_episode_access_objects)
-                    }, patients))
+                    patients = PatientDataService.get_patients_for_org(user_org.organization).select_related('address')
+                    patients = self.get_results(patients, query, sort_field)
+                    cursor_request = is_cursor_request(query_params)
+                    if cursor_request:
+                        patients, next_cursor = paginate_by_cursor(patients, sort_field, query_params)
+                    elif per_page is not None:
+                        # The count and the page are both computed in the DB
+                        paginator = Paginator(patients, per_page)
+                        patients = paginator.page(page).object_list
+                    patients = list(patients)
+                    care_team_ids = PatientDataService.get_care_team_ids(user_org.organization,
+                                                                         [patient.uuid for patient in patients])
+                    patient_list = [{'patient': patient, 'userIds': care_team_ids[patient.uuid]} for patient in patients]
                     serializer = PatientWithUsersSerializer(patient_list, many=True)
                     response = Response(serializer.data)
                     # Custom header being sent as part of response and being whitelisted
-                    if per_page is not None:
+                    if cursor_request:
+                        set_next_cursor(response, next_cursor)
+                    elif per_page is not None:
                         response['content-range'] = paginator.count
                         response['Access-Control-Expose-Headers'] = "content-range"
                     return response
+            except InvalidPayloadError as e:
+                logger.error(str(e))
+                return Response(status=status.HTTP_400_BAD_REQUEST, data={'success': False, 'error': errors.DATA_INVALID})
             except Exception as e:
                 logger.error('User is not admin: %s' % str(e))
                 logger.error(traceback.format_exc())
@@ -440,7 +437,7 @@ class AccessiblePatientViewSet(viewsets.ViewSet):
         try:
             # Find this user's organization and Check if this user is the admin
             # Only admin should have write permissions
-            user_org = UserOrganizationAccess.objects.filter(user=user.profile).get(is_admin=True)
+            user_org = get_request_identity(request).get_admin_org_access()
             organization = user_org.organization
 
             # Check if the passed users belong to this organization
@@ -522,7 +519,7 @@ class AccessiblePatientViewSet(viewsets.ViewSet):
                     access_serializer.save()
                     logger.debug('UserEpisodeAccess saved successfully')
 
-                    settings.PUBNUB.publish().channel(str(user_id) + '_assignedPatients').message({
+                    PubnubService.publish(str(user_id) + '_assignedPatients', {
                         'actionType': 'ASSIGN',
                         'patientID': str(patient_obj.uuid),
                         'pn_apns': {
@@ -534,15 +531,15 @@ class AccessiblePatientViewSet(viewsets.ViewSet):
                                 "patientID": str(patient_obj.uuid)
                             }
                         }
-                    }).async(my_publish_callback)
+                    })
 
                     # Message the rest of careteam
-                    settings.PUBNUB.publish().channel('episode_' + str(episode_obj.uuid)).message({
+                    PubnubService.publish('episode_' + str(episode_obj.uuid), {
                         'actionType': 'USER_ASSIGNED',
                         'userID': str(user_id),
-                    }).async(my_publish_callback)
+                    })
 
-                    settings.PUBNUB.publish().channel(str(user_id) + '_assignedPatients').message({
+                    PubnubService.publish(str(user_id) + '_assignedPatients', {
                         'pn_apns': {
                             "aps": {
                                 "alert": {
@@ -565,7 +562,7 @@ class AccessiblePatientViewSet(viewsets.ViewSet):
                                 'patientID': str(patient_obj.uuid)
                             }
                         }
-                    }).async(my_publish_callback)
+                    })
 
                 logger.info(
                     '%s : %s %s created patient record %s for Organization %s' % (PHI_ADMIN, str(user.first_name + ' ' + user.last_name),
@@ -588,9 +585,9 @@ class AccessiblePatientListView(generics.ListAPIView):
     def get_queryset(self):
         user = self.request.user
         # Todo: Also pass Organization for filtering
-        accesses = models.UserEpisodeAccess.objects.filter(user=user.profile)
-        patient_ids = [access.episode.patient.uuid for access in accesses]
-        return patient_ids
+        # One read of the (user_id, episode_id) index of the accesses, joined to the episodes by primary key
+        return list(models.UserEpisodeAccess.objects.filter(user=user.profile)
+                    .values_list('episode__patient_id', flat=True))
 
     def list(self, request):
         queryset = self.filter_queryset(self.get_queryset())
@@ -611,25 +608,35 @@ class AccessiblePatientsDetailView(APIView):
         if 'patientIDs' in data:
             patient_list = data['patientIDs']
 
+            requested_ids = dict()
+            for patient_id in patient_list:
+                # Keyed by the string, as the ID passed may not be hashable
+                try:
+                    requested_ids[str(patient_id)] = uuid.UUID(str(patient_id))
+                except (TypeError, ValueError) as e:
+                    logger.error('Invalid patientID passed: %s' % str(e))
+
+            # Resolve every requested patient with a single join against the user's active episode accesses
+            accessible_ids = set(models.UserEpisodeAccess.objects.filter(user=user.profile)
+                                 .filter(episode__patient_id__in=set(requested_ids.values()),
+                                         episode__is_active=True, episode__deleted_at=None,
+                                         episode__patient__deleted_at=None)
+                                 .values_list('episode__patient_id', flat=True))
+
             success_ids = list()
             failure_ids = list()
             for patient_id in patient_list:
-                try:
-                    episode = models.Patient.objects.get(uuid=patient_id).episodes.get(is_active=True)
-                    access = models.UserEpisodeAccess.objects.filter(user=user.profile).filter(episode=episode)
-                    if access.exists():
-                        success_ids.append(patient_id)
-                    else:
-                        failure_ids.append(patient_id)
-                except Exception as e:
-                    logger.error(str(e))
+                if requested_ids.get(str(patient_id)) in accessible_ids:
+                    success_ids.append(patient_id)
+                else:
                     failure_ids.append(patient_id)
             return success_ids, failure_ids
         return None, None
 
     def get_objects_by_ids(self, ids):
         # These patients exist, along-with 1 active episode
-        patients = models.Patient.objects.filter(uuid__in=ids)
+        patients = models.Patient.objects.select_related('address')\
+            .prefetch_related(PatientDataService.get_active_episode_prefetch()).filter(uuid__in=ids)
         return patients
 
     def post(self, request):
@@ -675,7 +682,8 @@ class GetPatientsByOldIds(APIView):
 
     def get_objects_by_ids(self, ids):
         # These patients exist, along-with 1 active episode
-        patients = models.Patient.objects.filter(id__in=ids)
+        patients = models.Patient.objects.select_related('address')\
+            .prefetch_related(PatientDataService.get_active_episode_prefetch()).filter(id__in=ids)
         return patients
 
     def post(self, request):
@@ -694,18 +702,19 @@ class GetPatientsByOrg(APIView):
     queryset = models.OrganizationPatientsMapping.objects.all()
     permission_classes = (IsAuthenticated,)
     serializer_class = PatientsForOrgSerializer
+    values_serializer_class = PatientsForOrgValuesSerializer
 
     def get(self, request):
         user = request.user.profile
         try:
             try:
-                user_org = UserOrganizationAccess.objects.get(user=user)
+                user_org = get_request_identity(request).get_org_access()
             except Exception as e:
                 logger.error('User part of no org or multiple orgs: %s' % str(e))
                 return Response(status=status.HTTP_400_BAD_REQUEST, data={'success': False, 'error': errors.NO_OR_MULTIPLE_ORGS_FOR_USER})
-            mappings = models.OrganizationPatientsMapping.objects.filter(organization=user_org.organization).select_related('patient', 'patient__address')
-            serializer = self.serializer_class(mappings, many=True)
-            return Response(serializer.data)
+            mappings = models.OrganizationPatientsMapping.objects.filter(organization=user_org.organization)
+            return list_response(self.values_serializer_class.get_rows(mappings),
+                                 self.values_serializer_class.serialize_rows)
         except Exception as e:
             logger.error('Cannot fetch patients for org for this user: %s. Error: %s' % (str(user), str(e)))
             return Response(status=status.HTTP_400_BAD_REQUEST, data={'success': False, 'error': errors.UNKNOWN_ERROR})
@@ -734,7 +743,7 @@ class AssignPatientToUser(APIView):
             try:
                 # Find this user's organization
                 # This assumes user can only belong to 1 org
-                user_org = UserOrganizationAccess.objects.get(user=user).organization
+                user_org = get_request_identity(request).organization
             except Exception as e:
                 logger.error('User associated with no or multiple Orgs: %s' % str(e))
                 return Response(status=status.HTTP_400_BAD_REQUEST, data={'success': False, 'error': errors.NO_OR_MULTIPLE_ORGS_FOR_USER})
@@ -775,7 +784,7 @@ class AssignPatientToUser(APIView):
                 access_serializer.save()
             logger.debug('UserEpisodeAccess saved successfully')
 
-            settings.PUBNUB.publish().channel(str(user_id) + '_assignedPatients').message({
+            PubnubService.publish(str(user_id) + '_assignedPatients', {
                 'actionType': 'ASSIGN',
                 'patientID': str(patient_id),
                 'pn_apns': {
@@ -787,9 +796,9 @@ class AssignPatientToUser(APIView):
                         "patientID": str(patient_id)
                     }
                 }
-            }).async(my_publish_callback)
+            })
 
-            settings.PUBNUB.publish().channel(str(user_id) + '_assignedPatients').message({
+            PubnubService.publish(str(user_id) + '_assignedPatients', {
                 'pn_apns': {
                     "aps": {
                         "alert": {
@@ -812,13 +821,13 @@ class AssignPatientToUser(APIView):
                         'patientID': str(patient_id)
                     }
                 }
-            }).async(my_publish_callback)
+            })
 
             # Message the rest of careteam
-            settings.PUBNUB.publish().channel('episode_' + str(episode.uuid)).message({
+            PubnubService.publish('episode_' + str(episode.uuid), {
                 'actionType': 'USER_ASSIGNED',
                 'userID': str(user_id),
-            }).async(my_publish_callback)
+            })
 
             AssignPatientToUser.local_counter += 1
             return Response({'success': True, 'error': None})
@@ -839,9 +848,8 @@ class BulkCreatePatientView(APIView):
 
     def post(self, request):
         data = request.data
-        user = request.user
         try:
-            user_org = UserOrganizationAccess.objects.get(user=user.profile)
+            user_org = get_request_identity(request).get_org_access()
             organization = user_org.organization
             success_counter = 0
             for patient_item in data:
@@ -1,17 +1,19 @@
 from backend import errors
-from django.conf import settings
 from django.db import transaction
-from django.db.models import Q
 from django.http import JsonResponse
+from flocarebase.common.pagination import is_cursor_request, paginate_by_cursor, set_next_cursor
+from flocarebase.common.pubnub_service import PubnubService
+from flocarebase.common.search import filter_by_name
+from flocarebase.exceptions import InvalidPayloadError
 from phi import models
 from phi.constants import NPI_DATA_URL
 from phi.serializers.request_serializers import CreatePhysicianRequestSerializer
 from phi.serializers.response_serializers import PhysicianResponseSerializer
-from phi.views.utils import my_publish_callback
 from rest_framework import status
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from user_auth.identity import get_request_identity
 from user_auth.models import UserOrganizationAccess
 
 import logging
@@ -46,9 +48,7 @@ class PhysiciansViewSet(viewsets.ViewSet):
         return query, sort_field, size
 
     def get_results(self, initial_query_set, query, sort_field, size):
-        queryset = initial_query_set
-        if query:
-            queryset = initial_query_set.filter(Q(first_name__istartswith=query) | Q(last_name__istartswith=query))
+        queryset = filter_by_name(initial_query_set, query)
         if sort_field:
             queryset = queryset.order_by(sort_field)
         if size:
@@ -57,23 +57,30 @@ class PhysiciansViewSet(viewsets.ViewSet):
 
     def list(self, request):
         try:
-            user = request.user
-            user_org = UserOrganizationAccess.objects.get(user=user.profile, is_admin=True)
+            user_org = get_request_identity(request).get_admin_org_access()
             query_params = request.query_params
             query, sort_field, size = self.parse_query_params(query_params)
             organization_physicians = models.Physician.objects.filter(organization=user_org.organization)
-            physicians = self.get_results(organization_physicians, query, sort_field, size)
+            if not is_cursor_request(query_params):
+                physicians = self.get_results(organization_physicians, query, sort_field, size)
+                serializer = PhysicianResponseSerializer(physicians, many=True)
+                return Response(serializer.data)
+            # The page size is applied by the cursor pagination
+            physicians = self.get_results(organization_physicians, query, sort_field, None)
+            physicians, next_cursor = paginate_by_cursor(physicians, sort_field, query_params)
             serializer = PhysicianResponseSerializer(physicians, many=True)
-            return Response(serializer.data)
+            return set_next_cursor(Response(serializer.data), next_cursor)
         except UserOrganizationAccess.DoesNotExist:
             return Response(status=status.HTTP_401_UNAUTHORIZED, data={'error': errors.ACCESS_DENIED})
+        except InvalidPayloadError:
+            return Response(status=status.HTTP_400_BAD_REQUEST, data={'error': errors.DATA_INVALID})
 
     def create(self, request):
         request_serializer = CreatePhysicianRequestSerializer(data=request.data.get('physician', None))
         if not request_serializer.is_valid():
             return Response(status=status.HTTP_400_BAD_REQUEST, data=request_serializer.errors)
         try:
-            user_org = UserOrganizationAccess.objects.get(user=request.user.profile, is_admin=True)
+            user_org = get_request_identity(request).get_admin_org_access()
             request_serializer.save(organization_id=user_org.organization.uuid)
             return Response(status=status.HTTP_201_CREATED, data={})
         except UserOrganizationAccess.DoesNotExist:
@@ -81,8 +88,7 @@ class PhysiciansViewSet(viewsets.ViewSet):
 
     def retrieve(self, request, pk=None):
         try:
-            user = request.user
-            user_org = UserOrganizationAccess.objects.get(user=user.profile,is_admin=True)
+            user_org = get_request_identity(request).get_admin_org_access()
             physician = models.Physician.objects.get(uuid=pk, organization=user_org.organization)
             serializer = PhysicianResponseSerializer(physician)
             return Response(serializer.data)
@@ -93,26 +99,25 @@ class PhysiciansViewSet(viewsets.ViewSet):
 
     def update(self, request, pk=None):
         try:
-            user_org = UserOrganizationAccess.objects.get(user=request.user.profile, is_admin=True)
+            user_org = get_request_identity(request).get_admin_org_access()
             physician = models.Physician.objects.get(uuid=pk, organization=user_org.organization)
             request_serializer = CreatePhysicianRequestSerializer(instance=physician, data=request.data)
             if not request_serializer.is_valid():
                 return Response(status=status.HTTP_400_BAD_REQUEST, data=request_serializer.errors)
-            episodes = models.Episode.objects.filter(primary_physician=physician)
-            physician_patients = list(map(lambda episode: episode.patient, episodes))
+            # Users on the care team of the patients of this physician. Ordered by user, so that the updates to a
+            # user are coalesced into one message
+            users_and_patients = models.UserEpisodeAccess.objects\
+                .filter(episode__is_active=True, episode__deleted_at=None,
+                        episode__patient__episodes__primary_physician=physician,
+                        episode__patient__episodes__deleted_at=None)\
+                .values_list('user_id', 'episode__patient_id').distinct().order_by('user_id', 'episode__patient_id')
             with transaction.atomic():
                 request_serializer.save()
-                for patient in physician_patients:
-                    episode = patient.episodes.get(is_active=True)
-                    user_episode_access_list = models.UserEpisodeAccess.objects.filter(episode=episode)
-                    if user_episode_access_list.count() > 0:
-                        users_linked_to_patient = [user_episode_access.user.uuid for user_episode_access in
-                                                   user_episode_access_list]
-                        for user_uuid in users_linked_to_patient:
-                            settings.PUBNUB.publish().channel(str(user_uuid) + '_assignedPatients').message({
-                                'actionType': 'UPDATE',
-                                'patientID': str(patient.uuid),
-                            }).async(my_publish_callback)
+                for user_uuid, patient_uuid in users_and_patients:
+                    PubnubService.publish(str(user_uuid) + '_assignedPatients', {
+                        'actionType': 'UPDATE',
+                        'patientID': str(patient_uuid),
+                    })
             return Response(status=status.HTTP_200_OK, data={})
         except UserOrganizationAccess.DoesNotExist:
             return Response(status=status.HTTP_401_UNAUTHORIZED, data={'error': errors.ACCESS_DENIED})
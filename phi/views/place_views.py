@@ -1,15 +1,17 @@
 from backend import errors
-from django.conf import settings
 from django.db import transaction
+from flocarebase.common.pagination import is_cursor_request, paginate_by_cursor, set_next_cursor
+from flocarebase.common.pubnub_service import PubnubService
+from flocarebase.exceptions import InvalidPayloadError
 from phi import models
 from phi.serializers.request_serializers import CreatePlaceRequestSerializer
 from phi.serializers.response_serializers import PlaceResponseSerializer
 from phi.serializers.serializers import PlaceUpdateSerializer
-from phi.views.utils import my_publish_callback
 from rest_framework import status
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from user_auth.identity import get_request_identity
 from user_auth.models import UserOrganizationAccess
 from user_auth.serializers.serializers import AddressSerializer
 
@@ -46,17 +48,17 @@ class PlacesViewSet(viewsets.ViewSet):
             return Response(status=status.HTTP_400_BAD_REQUEST, data=request_serializer.errors)
         data = request_serializer.validated_data
         try:
-            user_org = UserOrganizationAccess.objects.get(user=request.user.profile, is_admin=True)
+            user_org = get_request_identity(request).get_admin_org_access()
             address_serializer = AddressSerializer(data=request.data['address'])
             with transaction.atomic():
                 address_serializer.is_valid()
                 address_obj = address_serializer.save()
                 place = models.Place.objects.create(name=data['name'], contact_number=data['contact_number'],
                                                     organization=user_org.organization, address=address_obj)
-                settings.PUBNUB.publish().channel('organisation_' + str(user_org.organization.uuid)).message({
+                PubnubService.publish('organisation_' + str(user_org.organization.uuid), {
                     'actionType': 'CREATE_PLACE',
                     'placeID': str(place.uuid)
-                }).async(my_publish_callback)
+                })
                 return Response(status=status.HTTP_201_CREATED, data={})
         except UserOrganizationAccess.DoesNotExist:
             return Response(status=status.HTTP_401_UNAUTHORIZED, data={'success': False, 'error': errors.ACCESS_DENIED})
@@ -66,7 +68,7 @@ class PlacesViewSet(viewsets.ViewSet):
         if not request_serializer.is_valid():
             return Response(status=status.HTTP_400_BAD_REQUEST, data=request_serializer.errors)
         try:
-            user_org = UserOrganizationAccess.objects.get(user=request.user.profile, is_admin=True)
+            user_org = get_request_identity(request).get_admin_org_access()
             place = models.Place.objects.get(uuid=pk)
             place_serializer = PlaceUpdateSerializer(instance=place, data=request.data)
             address_serializer = AddressSerializer(instance=place.address, data=request.data['address'])
@@ -75,10 +77,10 @@ class PlacesViewSet(viewsets.ViewSet):
                 place_serializer.save()
                 address_serializer.is_valid()
                 address_serializer.save()
-                settings.PUBNUB.publish().channel('organisation_' + str(user_org.organization.uuid)).message({
+                PubnubService.publish('organisation_' + str(user_org.organization.uuid), {
                     'actionType': 'UPDATE_PLACE',
                     'placeID': str(place.uuid)
-                }).async(my_publish_callback)
+                })
                 return Response(status=status.HTTP_200_OK, data={})
         except UserOrganizationAccess.DoesNotExist:
             return Response(status=status.HTTP_401_UNAUTHORIZED, data={'success': False, 'error': errors.ACCESS_DENIED})
@@ -86,9 +88,8 @@ class PlacesViewSet(viewsets.ViewSet):
             return Response(status=status.HTTP_400_BAD_REQUEST, data={'success': False, 'error': errors.PLACE_NOT_EXIST})
 
     def retrieve(self, request, pk=None):
-        user = request.user
         try:
-            user_org = UserOrganizationAccess.objects.get(user=user.profile)
+            user_org = get_request_identity(request).get_org_access()
             place = models.Place.objects.get(uuid=pk, organization=user_org.organization)
             return Response(status=status.HTTP_200_OK, data=PlaceResponseSerializer(place).data)
         except UserOrganizationAccess.DoesNotExist:
@@ -98,27 +99,34 @@ class PlacesViewSet(viewsets.ViewSet):
             return Response(status=status.HTTP_400_BAD_REQUEST, data={'success': False, 'error': errors.PLACE_NOT_EXIST})
 
     def list(self, request):
-        user = request.user
         try:
-            user_org = UserOrganizationAccess.objects.get(user=user.profile)
+            user_org = get_request_identity(request).get_org_access()
             order_field = self.get_order_by_field(request.query_params)
-            places = models.Place.objects.filter(organization=user_org.organization).order_by(order_field)
-            return Response(status=status.HTTP_200_OK, data=PlaceResponseSerializer(places, many=True).data)
+            places = models.Place.objects.filter(organization=user_org.organization).select_related('address')\
+                .order_by(order_field)
+            if not is_cursor_request(request.query_params):
+                return Response(status=status.HTTP_200_OK, data=PlaceResponseSerializer(places, many=True).data)
+            places, next_cursor = paginate_by_cursor(places, order_field, request.query_params)
+            response = Response(status=status.HTTP_200_OK, data=PlaceResponseSerializer(places, many=True).data)
+            return set_next_cursor(response, next_cursor)
         except UserOrganizationAccess.DoesNotExist:
             return Response(status=status.HTTP_401_UNAUTHORIZED, data={'success': False, 'error': errors.ACCESS_DENIED})
+        except InvalidPayloadError as e:
+            logger.error(str(e))
+            return Response(status=status.HTTP_400_BAD_REQUEST, data={'success': False, 'error': errors.DATA_INVALID})
 
     def destroy(self, request, pk=None):
         try:
-            user_org = UserOrganizationAccess.objects.get(user=request.user.profile, is_admin=True)
+            user_org = get_request_identity(request).get_admin_org_access()
             # Todo: Add prefetch_related?
             place = models.Place.objects.get(uuid=pk)
 
             with transaction.atomic():
                 place.soft_delete()
-                settings.PUBNUB.publish().channel('organisation_' + str(user_org.organization.uuid)).message({
+                PubnubService.publish('organisation_' + str(user_org.organization.uuid), {
                     'actionType': 'DELETE_PLACE',
                     'placeID': str(pk)
-                }).async(my_publish_callback)
+                })
                 return Response(status=status.HTTP_200_OK, data={})
         except UserOrganizationAccess.DoesNotExist:
             return Response(status=status.HTTP_401_UNAUTHORIZED, data={'success': False, 'error': errors.ACCESS_DENIED})
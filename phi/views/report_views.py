@@ -1,6 +1,8 @@
 from backend import errors
 from django.db import transaction
 from django.db.models import Q
+from flocarebase.common.pagination import is_cursor_request, paginate_by_cursor, set_next_cursor
+from flocarebase.exceptions import InvalidPayloadError
 from phi import models
 from phi.constants import total_miles_buffer_allowed
 from phi.exceptions.TotalMilesDidNotMatchException import TotalMilesDidNotMatchException
@@ -11,6 +13,7 @@ from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from user_auth.identity import get_request_identity
 from user_auth.models import UserOrganizationAccess
 
 import logging
@@ -59,10 +62,10 @@ class ReportsViewSet(viewsets.ViewSet):
     def retrieve(self, request, pk=None):
         # Check if user is admin of this org
         try:
-            user = request.user
-            user_org = UserOrganizationAccess.objects.filter(user=user.profile).filter(is_admin=True)
-            if user_org.exists():
-                report_items = models.ReportItem.objects.filter(report__uuid=pk)
+            if get_request_identity(request).is_admin:
+                report_items = models.ReportItem.objects.filter(report__uuid=pk).select_related(
+                    'report', 'visit__user__user', 'visit__visit_miles', 'visit__episode__patient__address',
+                    'visit__place__address')
                 serializer = ReportDetailsForWebSerializer(report_items, many=True)
                 logger.debug(str(serializer.data))
                 return Response(serializer.data)
@@ -74,22 +77,27 @@ class ReportsViewSet(viewsets.ViewSet):
 
     def list(self, request):
         try:
-            user = request.user
             try:
-                user_org = UserOrganizationAccess.objects.filter(user=user.profile).filter(is_admin=True)
-                if user_org.exists():
+                if get_request_identity(request).is_admin:
                     query_params = request.query_params
                     query, sort_field, size, user_id = self.parse_query_params(query_params)
                     # physicians = self.get_results(query, sort_field, size)
                     if not user_id:
                         return Response(status=status.HTTP_400_BAD_REQUEST, data={'success': False, 'error': errors.USER_NOT_EXIST})
 
-                    reports = models.Report.objects.filter(user__uuid=user_id).order_by('-created_at')
+                    reports = models.Report.objects.filter(user__uuid=user_id).select_related('user__user')\
+                        .prefetch_related('report_items').order_by('-created_at')
+                    if is_cursor_request(query_params):
+                        reports, next_cursor = paginate_by_cursor(reports, '-created_at', query_params)
+                        return set_next_cursor(Response(ReportSerializer(reports, many=True).data), next_cursor)
                     reports_serializer = ReportSerializer(reports, many=True)
 
                     return Response(reports_serializer.data)
                 else:
                     return Response(status=status.HTTP_401_UNAUTHORIZED, data={'success': False, 'error': errors.ACCESS_DENIED})
+            except InvalidPayloadError as e:
+                logger.error(str(e))
+                return Response(status=status.HTTP_400_BAD_REQUEST, data={'success': False, 'error': errors.DATA_INVALID})
             except Exception as e:
                 logger.error(str(e))
                 return Response(status=status.HTTP_400_BAD_REQUEST, data={'success': False, 'error': errors.UNKNOWN_ERROR})
@@ -160,7 +168,8 @@ class GetReportsForUser(APIView):
     permission_classes = (IsAuthenticated,)
 
     def get(self, request):
-        reports = models.Report.objects.filter(user=request.user.profile)
+        reports = models.Report.objects.filter(user=request.user.profile).select_related('user__user')\
+            .prefetch_related('report_items')
         reports_serializer = ReportSerializer(reports, many=True)
         return Response(status=status.HTTP_200_OK, data=reports_serializer.data)
 
@@ -1,14 +1,108 @@
-import logging
+from django.conf import settings
+from django.db.models import Count, FloatField, Func, Max, Sum
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from flocarebase.common.streaming import streaming_json_response
+from flocarebase.exceptions import InvalidPayloadError
+from phi.constants import SYNC_WATERMARK_PARAM, SYNC_WATERMARK_HEADER, SYNC_WATERMARK_OVERLAP_SECONDS, \
+    SYNC_ETAG_VERSION
+from rest_framework.response import Response
 
-logger = logging.getLogger(__name__)
+import datetime
+import dateutil.parser
+import hashlib
 
 
-def my_publish_callback(envelope, status):
-    # Check whether request successfully completed or not
-    if not status.is_error():
-        logger.info("# Message successfully published to specified channel.")
-    else:
-        logger.error("# NOT Message successfully published to specified channel.")
-        # Handle message publish error. Check 'category' property to find out possible issue
-        # because of which request did fail.
-        # Request can be resent using: [status retry];
+def parse_sync_watermark(request):
+    """
+    Returns the lower bound for the rows to be sent in a delta sync, or None if the client asked for a full sync.
+    The bound is the watermark passed by the client, moved back by SYNC_WATERMARK_OVERLAP_SECONDS.
+    """
+    since = request.query_params.get(SYNC_WATERMARK_PARAM, None)
+    if not since:
+        return None
+    try:
+        watermark = dateutil.parser.parse(since)
+    except (ValueError, OverflowError) as e:
+        raise InvalidPayloadError('Invalid sync watermark %s: %s' % (since, str(e)))
+    if timezone.is_naive(watermark):
+        watermark = timezone.make_aware(watermark, timezone.utc)
+    return watermark - datetime.timedelta(seconds=SYNC_WATERMARK_OVERLAP_SECONDS)
+
+
+def get_sync_watermark():
+    # Taken before reading the rows, so that rows saved while the response is built are sent in the next sync
+    return timezone.now()
+
+
+def list_response(rows, serialize):
+    """
+    Response with serialize(rows), the serialized data of the rows. Streamed a chunk of rows at a time when
+    settings.STREAMING_RESPONSES is on, in which case serialize is called once per chunk
+    """
+    if settings.STREAMING_RESPONSES:
+        return streaming_json_response(rows, serialize)
+    return Response(serialize(rows))
+
+
+def get_rows_state(queryset, *relations):
+    """
+    The count of the rows, with the max and the sum of updated_at of the rows and of each of their relations. Changes
+    with any row added, removed or saved, soft deletes included. The sum catches the rows saved by transactions that
+    commit late, with an updated_at older than the max
+    """
+    aggregates = {'count': Count('pk')}
+    for index, relation in enumerate(('',) + relations):
+        field = relation + '__updated_at' if relation else 'updated_at'
+        aggregates['max_%d' % index] = Max(field)
+        aggregates['sum_%d' % index] = Sum(Func(field, template='EXTRACT(EPOCH FROM %(expressions)s)',
+                                                output_field=FloatField()))
+    state = queryset.order_by().aggregate(**aggregates)
+    return tuple(state[key] for key in sorted(state))
+
+
+def get_sync_etag(request, *states):
+    """
+    Strong ETag of a full sync of the caller, from the states (get_rows_state) of the rows it is built from
+    """
+    digest = hashlib.sha1()
+    for part in (SYNC_ETAG_VERSION, request.path, request.user.pk) + states:
+        digest.update(repr(part).encode('utf-8'))
+    return '"%s"' % digest.hexdigest()
+
+
+def not_modified_sync_response(request, watermark, etag):
+    """
+    The 304 response to a full sync the client already has, going by its If-None-Match header, else None. Nothing
+    changed up to the watermark, so the client gets the new one
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        add_sync_watermark_header(response, watermark, etag)
+    return response
+
+
+def full_sync_response(watermark, data, etag=None):
+    response = Response(data)
+    add_sync_watermark_header(response, watermark, etag)
+    return response
+
+
+def full_sync_list_response(watermark, rows, serialize, etag=None):
+    response = list_response(rows, serialize)
+    add_sync_watermark_header(response, watermark, etag)
+    return response
+
+
+def delta_sync_response(watermark, changed, deleted):
+    response = Response({'watermark': watermark.isoformat(), 'changed': changed, 'deleted': deleted})
+    add_sync_watermark_header(response, watermark)
+    return response
+
+
+def add_sync_watermark_header(response, watermark, etag=None):
+    response[SYNC_WATERMARK_HEADER] = watermark.isoformat()
+    response['Access-Control-Expose-Headers'] = SYNC_WATERMARK_HEADER
+    if etag:
+        response['ETag'] = etag
+        response['Access-Control-Expose-Headers'] = '%s, ETag' % SYNC_WATERMARK_HEADER
@@ -1,17 +1,23 @@
 from backend import errors
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from flocarebase.exceptions import InvalidPayloadError
 from phi import models
 from phi.data_services.visit_data_service import VisitDataService
 from phi.exceptions.InvalidDataForSerializerException import InvalidDataForSerializerException
 from phi.migration_helpers import MigrationHelpers
 from phi.serializers.response_serializers import VisitDetailsResponseSerializer, VisitResponseSerializer, \
     VisitForOrgResponseSerializer
+from phi.serializers.values_serializers import VisitValuesSerializer, VisitForOrgValuesSerializer
 from phi.serializers.serializers import OrganizationPatientMappingSerializer, EpisodeSerializer, VisitSerializer, \
     VisitMilesSerializer
+from phi.views.utils import parse_sync_watermark, get_sync_watermark, delta_sync_response, full_sync_list_response, \
+    list_response, get_rows_state, get_sync_etag, not_modified_sync_response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from user_auth.identity import get_request_identity
 from user_auth.models import UserOrganizationAccess, Address
 
 import datetime
@@ -25,14 +31,37 @@ class GetMyVisits(APIView):
     queryset = models.Visit.objects.all()
     permission_classes = (IsAuthenticated,)
     serializer_class = VisitResponseSerializer
+    values_serializer_class = VisitValuesSerializer
+
+    def get_changed_visits(self, user, since):
+        # Miles and report items are part of the payload, so their changes change the visit
+        return models.Visit.all_objects.select_related("visit_miles", "report_item", "report_item__report")\
+            .filter(user=user)\
+            .filter(Q(updated_at__gt=since) | Q(visit_miles__updated_at__gt=since) |
+                    Q(report_item__updated_at__gt=since) | Q(report_item__report__updated_at__gt=since))
 
     def get(self, request):
         user = request.user.profile
         try:
+            since = parse_sync_watermark(request)
+        except InvalidPayloadError as e:
+            logger.error(str(e))
+            return Response(status=status.HTTP_400_BAD_REQUEST, data={'success': False, 'error': errors.DATA_INVALID})
+        watermark = get_sync_watermark()
+        try:
+            if since:
+                visits = list(self.get_changed_visits(user, since))
+                changed = [visit for visit in visits if not visit.deleted_at]
+                deleted = [str(visit.id) for visit in visits if visit.deleted_at]
+                return delta_sync_response(watermark, self.serializer_class(changed, many=True).data, deleted)
             # Todo: Can check in UserEpisodeAccess, and only return visits for episodes user currently has access to
-            visits = models.Visit.objects.select_related("visit_miles", "report_item", "report_item__report").filter(user=user)
-            serializer = self.serializer_class(visits, many=True)
-            return Response(serializer.data)
+            visits = models.Visit.objects.filter(user=user)
+            etag = get_sync_etag(request, get_rows_state(visits, 'visit_miles', 'report_item', 'report_item__report'))
+            not_modified = not_modified_sync_response(request, watermark, etag)
+            if not_modified is not None:
+                return not_modified
+            return full_sync_list_response(watermark, self.values_serializer_class.get_rows(visits),
+                                           self.values_serializer_class.serialize_rows, etag)
         except Exception as e:
             logger.error('Error in fetching visits for this user: %s' % str(user))
             return Response(status=status.HTTP_400_BAD_REQUEST, data={'success': False, 'error': errors.UNKNOWN_ERROR})
@@ -42,6 +71,7 @@ class GetVisitsByOrg(APIView):
     queryset = models.Visit.objects.all()
     permission_classes = (IsAuthenticated,)
     serializer_class = VisitForOrgResponseSerializer
+    values_serializer_class = VisitForOrgValuesSerializer
 
     def get(self, request):
         user = request.user.profile
@@ -49,13 +79,13 @@ class GetVisitsByOrg(APIView):
         start = query_params.get('start', None)
         end = query_params.get('end', None)
         try:
-            user_org = UserOrganizationAccess.objects.filter(user=user).get(is_admin=True)
+            user_org = get_request_identity(request).get_admin_org_access()
             midnight_epoch_start = int(datetime.datetime.strptime(start, "%Y-%m-%d").date().strftime('%s')) * 1000
             midnight_epoch_end = int(datetime.datetime.strptime(end, "%Y-%m-%d").date().strftime('%s')) * 1000
             visits = models.Visit.objects.filter(organization=user_org.organization)\
                 .filter(midnight_epoch__range=(midnight_epoch_start, midnight_epoch_end))
-            serializer = self.serializer_class(visits, many=True)
-            return Response(serializer.data)
+            return list_response(self.values_serializer_class.get_rows(visits),
+                                 self.values_serializer_class.serialize_rows)
         except Exception as e:
             logger.error('Error in fetching visits for this user: %s' % str(user))
             logger.error(e)
@@ -73,9 +103,9 @@ class GetVisitsView(APIView):
             visit_ids = data['visitIDs']
             try:
                 # Allow users to query all visits from the same Org
-                orgs = UserOrganizationAccess.objects.filter(user=request.user.profile).values_list('organization',
-                                                                                                    flat=True)
-                visit_objects = models.Visit.objects.filter(organization__in=orgs, id__in=visit_ids)
+                orgs = [access.organization_id for access in get_request_identity(request).org_accesses]
+                visit_objects = models.Visit.objects.filter(organization__in=orgs, id__in=visit_ids)\
+                    .select_related('visit_miles', 'report_item__report')
                 success = list(visit_objects)
                 success_ids = list(map(lambda visit: str(visit.id), visit_objects))
             except Exception as e:
@@ -110,11 +140,10 @@ class AddVisitsView(APIView):
     #     logger.debug('Events being published for visit_id: %s' % str(visit_id))
     #     return
 
-    def create_dummy_patient_and_episode(self, user_profile, episode_id):
+    def create_dummy_patient_and_episode(self, organization, episode_id):
         address = Address.objects.create()
         patient = models.Patient.objects.create(first_name='Dummy',last_name='Patient',title='Mr', address=address)
-        user_org = UserOrganizationAccess.objects.get(user=user_profile)
-        mapping_serializer = OrganizationPatientMappingSerializer(data={'organization_id': user_org.organization.uuid,
+        mapping_serializer = OrganizationPatientMappingSerializer(data={'organization_id': organization.uuid,
                                                                         'patient_id': patient.uuid})
         mapping_serializer.is_valid()
         mapping_serializer.save()
@@ -139,74 +168,112 @@ class AddVisitsView(APIView):
         episode_serializer.save()
         logger.debug('Created Dummy patient and episode')
 
-    def create_dummy_place(self, user_profile, place_id):
+    def create_dummy_place(self, organization, place_id):
         address = Address.objects.create()
-        user_org = UserOrganizationAccess.objects.get(user=user_profile)
-        models.Place.objects.create(uuid=place_id, name='Dummy Place',organization=user_org.organization, address=address)
+        models.Place.objects.create(uuid=place_id, name='Dummy Place',organization=organization, address=address)
         logger.info('Created Dummy place ')
 
-    def handle_missing_episode(self, visit, user_profile, payload):
-        episode_id = visit.get('episodeID')
-        if episode_id:
-            try:
-                models.Episode.all_objects.get(uuid=episode_id)
-            except models.Episode.DoesNotExist:
-                logger.debug('Episode Does not exist. Creating Dummy patient for payload: ')
-                logger.debug(payload)
-                self.create_dummy_patient_and_episode(user_profile, episode_id)
-
-    def handle_missing_place(self, visit, user_profile, payload):
-        place_id = visit.get('placeID')
-        if place_id:
+    def handle_missing_episodes(self, organization, episode_ids, payload):
+        existing = models.Episode.all_objects.in_bulk(episode_ids)
+        for episode_id in set(episode_ids) - set(existing.keys()):
+            logger.debug('Episode Does not exist. Creating Dummy patient for payload: ')
+            logger.debug(payload)
+            self.create_dummy_patient_and_episode(organization, episode_id)
+
+    def handle_missing_places(self, organization, place_ids, payload):
+        existing = models.Place.all_objects.in_bulk(place_ids)
+        for place_id in set(place_ids) - set(existing.keys()):
+            logger.debug('Place Does not exist. Creating Dummy place for payload: ')
+            logger.debug(payload)
+            self.create_dummy_place(organization, place_id)
+
+    def validate_visits(self, visits):
+        """
+        Returns the (visit, visit miles) validated data pairs of the valid visits, and the invalid visits
+        """
+        valid = list()
+        invalid = list()
+        for visit in visits:
+            serializer = VisitSerializer(data=visit)
+            visit_miles = visit.get('visitMiles', {})
+            MigrationHelpers.handle_miles_migration(visit_miles)
+            visit_miles_serializer = VisitMilesSerializer(data=visit_miles)
+            if serializer.is_valid() and visit_miles_serializer.is_valid():
+                valid.append((visit, serializer.validated_data, visit_miles_serializer.validated_data))
+            else:
+                logger.warning('Not saving. Invalid data received for visit: %s' % str(visit))
+                invalid.append(visit)
+        return valid, invalid
+
+    def add_visits(self, user_profile, organization, visits, payload):
+        """
+        Inserts the visits, after creating the dummy episodes and places they point to that do not exist. To be
+        called in a transaction, so that the dummy rows are rolled back with a failed insert
+        """
+        # TODO - remove this - only temporary fix
+        # https://flocare.atlassian.net/browse/FC-115phi/response_serializers.py
+        self.handle_missing_episodes(organization, list({visit_data['episode_id'] for _, visit_data, _ in visits
+                                                         if visit_data.get('episode_id')}), payload)
+        self.handle_missing_places(organization, list({visit_data['place_id'] for _, visit_data, _ in visits
+                                                       if visit_data.get('place_id')}), payload)
+        DataServices.visit_data_service().add_visits(
+            user_profile, organization, [(visit_data, visit_miles_data) for _, visit_data, visit_miles_data in visits])
+
+    def save_visits_one_by_one(self, user_profile, organization, visits, payload):
+        success = list()
+        failure = list()
+        for visit, visit_data, visit_miles_data in visits:
             try:
-                models.Place.all_objects.get(uuid=place_id)
-            except models.Place.DoesNotExist:
-                logger.debug('Place Does not exist. Creating Dummy place for payload: ')
-                logger.debug(payload)
-                self.create_dummy_place(user_profile, place_id)
+                with transaction.atomic():
+                    self.add_visits(user_profile, organization, [(visit, visit_data, visit_miles_data)], payload)
+                success.append(visit_data.get('id'))
+            except Exception as e:
+                logger.error('Error in saving visit: %s' % str(e))
+                failure.append(visit)
+        return success, failure
 
     def post(self, request):
         # Check user permissions for that episode
-        user = request.user
+        user_profile = request.user.profile
         visits = request.data.get('visits')
         if not visits:
             logger.error('"visits" not present in request')
             return Response(status=status.HTTP_400_BAD_REQUEST, data={'success': False, 'error': errors.DATA_INVALID})
 
-        success = list()
-        failure = list()
-
-        # Check permission for, validate and save each visit
-        for visit in visits:
-            # Todo: Handle case of same-user-multiple-orgs
-            try:
-                org = UserOrganizationAccess.objects.get(user=request.user.profile).organization
-            except UserOrganizationAccess.DoesNotExist as e:
-                logger.warning('Not saving visit. Error: %s' % str(e))
+        # Todo: Handle case of same-user-multiple-orgs
+        try:
+            organization = get_request_identity(request).organization
+        except UserOrganizationAccess.DoesNotExist as e:
+            logger.warning('Not saving visits. Error: %s' % str(e))
+            return Response({'success': [], 'failure': visits})
+
+        valid, failure = self.validate_visits(visits)
+
+        # Visits are created on the phone, and may be uploaded again after a retry. Those already saved fail, as before
+        existing_ids = models.Visit.all_objects.in_bulk([visit_data.get('id') for _, visit_data, _ in valid])
+        new = list()
+        seen_ids = set()
+        for visit, visit_data, visit_miles_data in valid:
+            if visit_data.get('id') in existing_ids or visit_data.get('id') in seen_ids:
+                logger.error('Error in saving visit: visit %s already exists' % str(visit_data.get('id')))
                 failure.append(visit)
-                continue
-            # TODO - remove this - only temporary fix
-            # https://flocare.atlassian.net/browse/FC-115phi/response_serializers.py
-            self.handle_missing_episode(visit, user.profile, request.data)
-            self.handle_missing_place(visit, user.profile, request.data)
-
-            serializer = VisitSerializer(data=visit)
-            visit_miles = visit.get('visitMiles', {})
-            MigrationHelpers.handle_miles_migration(visit_miles)
-            visit_miles_serializer = VisitMilesSerializer(data=visit_miles)
-            if serializer.is_valid() and visit_miles_serializer.is_valid():
-                try:
-                    visit_obj = serializer.save(user=request.user.profile, organization=org)
-                    visit_miles_serializer.save(visit=visit_obj)
-                    visit_id = serializer.validated_data.get('id')
-                    success.append(visit_id)
-                    # self.publish_events(visit_id, episode_id)
-                except Exception as e:
-                    logger.error('Error in saving visit: %s' % str(e))
-                    failure.append(serializer.initial_data)
             else:
-                logger.warning('Not saving. Invalid data received for visit: %s' % str(visit))
-                failure.append(serializer.initial_data)
+                seen_ids.add(visit_data.get('id'))
+                new.append((visit, visit_data, visit_miles_data))
+
+        success = list()
+        if new:
+            try:
+                with transaction.atomic():
+                    self.add_visits(user_profile, organization, new, request.data)
+                success = [visit_data.get('id') for _, visit_data, _ in new]
+            except Exception as e:
+                # Raced with another upload of some of these visits, or the DB rejected one of them. Save what can be
+                # saved
+                logger.warning('Bulk insert of visits failed, saving one by one: %s' % str(e))
+                saved, not_saved = self.save_visits_one_by_one(user_profile, organization, new, request.data)
+                success.extend(saved)
+                failure.extend(not_saved)
         logger.debug('Success: %s, Failure: %s' % (str(success), str(failure)))
         return Response({'success': success, 'failure': failure})
 
@@ -236,7 +303,7 @@ class UpdateVisitView(APIView):
         # Todo: Handle case of same-user-multiple-orgs
         # Get organization of requesting user
         try:
-            UserOrganizationAccess.objects.get(user=request.user.profile).organization
+            get_request_identity(request).get_org_access()
         except UserOrganizationAccess.DoesNotExist as e:
             logger.error('Not saving visit. Error: %s' % str(e))
             return Response(status=status.HTTP_400_BAD_REQUEST, data={'success': False, 'error': 'User has no organisation'})
@@ -262,28 +329,16 @@ class BulkUpdateVisitView(APIView):
     queryset = models.Visit.objects.all()
     permission_classes = (IsAuthenticated,)
 
-    def update_single_visit(self, user_profile, visit_id, data):
-        try:
-            visit = models.Visit.objects.get(pk=visit_id)
-            DataServices.visit_data_service().update_visit(user_profile, visit, data)
-        except models.Visit.DoesNotExist:
-            logger.error('Visit with id : %s does not exist' % str(visit_id))
-
     def post(self, request):
-        data = request.data
-        counter = 0
-        visits = data.get('visits', [])
-        for visit in visits:
-            try:
-                self.update_single_visit(request.user.profile, visit['visitID'], visit)
-                counter += 1
-            except InvalidDataForSerializerException as e:
-                logger.error('Invalid data for serializer exception, %s ' % str(e))
-                logger.error(traceback.format_exc(e))
-            except IntegrityError as e:
-                logger.error('IntegrityError. Cannot update visit: %s' % str(e))
-                logger.error(traceback.format_exc(e))
-        return Response(status=status.HTTP_200_OK, data={'success': True, 'count': counter})
+        visits = request.data.get('visits', [])
+        try:
+            updated_ids, failure = DataServices.visit_data_service().update_visits(request.user.profile, visits)
+        except IntegrityError as e:
+            logger.error('IntegrityError. Cannot update visits: %s' % str(e))
+            logger.error(traceback.format_exc())
+            return Response(status=status.HTTP_400_BAD_REQUEST, data={'success': False, 'error': errors.DATA_INVALID})
+        return Response(status=status.HTTP_200_OK, data={'success': True, 'count': len(updated_ids),
+                                                         'failure': failure})
 
 
 # Todo: When an episode access is removed, deleteAPI is also fired to corresponding remove visits.
@@ -299,10 +354,11 @@ class DeleteVisitView(APIView):
             visit_ids = data['visitIDs']
             try:
                 visit_objects = models.Visit.objects.filter(user=user.profile, id__in=visit_ids)
-                if visit_objects.exists():
-                    success_ids = list(map(lambda visit: str(visit.id), visit_objects))
-                    # Todo: Should use bulk delete
-                    [visit.soft_delete() for visit in visit_objects]
+                success_ids = [str(visit_id) for visit_id in visit_objects.values_list('id', flat=True)]
+                if success_ids:
+                    with transaction.atomic():
+                        models.Visit.objects.filter(id__in=success_ids).soft_delete()
+                        models.Visit.touch_reports(success_ids)
                 else:
                     logger.error("These visits don't exist for this user")
                     success_ids = list()
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class UserAuthConfig(AppConfig):
     name = 'user_auth'
+
+    def ready(self):
+        from user_auth import signals    # noqa
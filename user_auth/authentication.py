@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import authentication, exceptions
+from user_auth.identity import RequestIdentity
+
+import hashlib
+
+
+def get_token_cache():
+    return caches[settings.AUTH_TOKEN_CACHE_ALIAS]
+
+
+def get_token_cache_key(key):
+    # Hashed, so that the tokens themselves are never stored in the cache
+    return 'auth_token:' + hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def invalidate_cached_tokens(keys):
+    cache_keys = [get_token_cache_key(key) for key in keys]
+    if cache_keys:
+        get_token_cache().delete_many(cache_keys)
+
+
+class TokenAuthentication(authentication.TokenAuthentication):
+    """
+    Loads the profile of the user with the token, and attaches the identity of the caller to it
+    """
+
+    def get_token(self, key):
+        model = self.get_model()
+        try:
+            return model.objects.select_related('user__profile').get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+    def get_credentials(self, token, org_accesses=None):
+        user = token.user
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        # Users without a profile, eg: superusers, have no identity
+        profile = getattr(user, 'profile', None)
+        if profile is not None:
+            profile.identity = RequestIdentity(profile, org_accesses)
+        return user, token
+
+    def authenticate_credentials(self, key):
+        return self.get_credentials(self.get_token(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Caches the token with its user, profile and organization accesses for settings.AUTH_TOKEN_CACHE_TTL seconds, so
+    that authenticating a request needs no query. The entries are invalidated by user_auth.signals when the token is
+    deleted, or its user, profile or accesses are saved. Updates through QuerySet.update send no signals, and show up
+    once the entry expires
+    """
+
+    def authenticate_credentials(self, key):
+        cache = get_token_cache()
+        cache_key = get_token_cache_key(key)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return self.get_credentials(*cached)
+
+        token = self.get_token(key)
+        org_accesses = None
+        # Inactive users are rejected by get_credentials, and never cached
+        if token.user.is_active:
+            profile = getattr(token.user, 'profile', None)
+            if profile is not None:
+                org_accesses = RequestIdentity(profile).org_accesses
+            cache.set(cache_key, (token, org_accesses), settings.AUTH_TOKEN_CACHE_TTL)
+        return self.get_credentials(token, org_accesses)
@@ -1,6 +1,7 @@
+from flocarebase.common.search import filter_by_name
 from user_auth import models
-from django.db.models import Q
 from user_auth.exceptions import UserOrgAccessDoesNotExistError
+from user_auth.identity import get_profile_identity
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,7 +18,11 @@ class UserOrgAccessDataService:
 
     @staticmethod
     def get_user_org_access_by_user_profile(user_profile):
+        # The caller's access is resolved once per request, by its identity
+        identity = get_profile_identity(user_profile)
         try:
+            if identity is not None:
+                return identity.get_org_access()
             return models.UserOrganizationAccess.objects.get(user=user_profile)
         except models.UserOrganizationAccess.DoesNotExist:
             raise UserOrgAccessDoesNotExistError(user_profile.uuid)
@@ -32,5 +37,5 @@ class UserOrgAccessDataService:
 
     @staticmethod
     def filter_accesses_by_name(accesses, query):
-        return accesses.filter(Q(user__user__first_name__istartswith=query) | Q(user__user__last_name__istartswith=query))
+        return filter_by_name(accesses, query, 'user__user__first_name', 'user__user__last_name')
 
@@ -0,0 +1,71 @@
+"""
+The caller of a request. Its organization accesses are fetched once, on first use, and shared by the permission
+classes, the data services and the views for the rest of the request
+"""
+from django.utils.functional import cached_property
+from user_auth import models
+
+
+class RequestIdentity:
+
+    def __init__(self, profile, org_accesses=None):
+        self.profile = profile
+        if org_accesses is not None:
+            # Already resolved, eg: by the cached token authentication
+            self.__dict__['org_accesses'] = org_accesses
+
+    @cached_property
+    def org_accesses(self):
+        return list(models.UserOrganizationAccess.objects.select_related('organization').filter(user=self.profile))
+
+    @staticmethod
+    def get_only(accesses):
+        # Raises like QuerySet.get, so that the existing error handling of the views keeps working
+        if not accesses:
+            raise models.UserOrganizationAccess.DoesNotExist('UserOrganizationAccess matching query does not exist.')
+        if len(accesses) > 1:
+            raise models.UserOrganizationAccess.MultipleObjectsReturned(
+                'get() returned more than one UserOrganizationAccess -- it returned %d!' % len(accesses))
+        return accesses[0]
+
+    def get_org_access(self):
+        """
+        Same as UserOrganizationAccess.objects.get(user=profile)
+        """
+        return self.get_only(self.org_accesses)
+
+    def get_admin_org_access(self):
+        """
+        Same as UserOrganizationAccess.objects.get(user=profile, is_admin=True)
+        """
+        return self.get_only([access for access in self.org_accesses if access.is_admin])
+
+    @property
+    def is_admin(self):
+        return any(access.is_admin for access in self.org_accesses)
+
+    @property
+    def organization(self):
+        return self.get_org_access().organization
+
+    @property
+    def role(self):
+        return self.get_org_access().user_role
+
+
+def get_request_identity(request):
+    """
+    The identity is kept on the profile of the request's user, which stays the same instance for the whole request
+    """
+    profile = request.user.profile
+    if not isinstance(profile.__dict__.get('identity'), RequestIdentity):
+        profile.identity = RequestIdentity(profile)
+    return profile.identity
+
+
+def get_profile_identity(user_profile):
+    """
+    The identity of the caller, if this is the caller's profile
+    """
+    identity = getattr(user_profile, '__dict__', {}).get('identity')
+    return identity if isinstance(identity, RequestIdentity) else None
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+# Indexes for the name search of flocarebase.common.search on the staff names, which live on the auth user.
+# See phi/migrations/0041_name_search_indexes for the expression
+NAME_INDEXES = [
+    ('user_auth_user_first_name_search_idx', 'auth_user', 'first_name'),
+    ('user_auth_user_last_name_search_idx', 'auth_user', 'last_name'),
+]
+
+
+def create_index_operation(name, table, column):
+    return migrations.RunSQL(
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS %s ON %s (UPPER(%s::text) text_pattern_ops)' % (name, table, column),
+        'DROP INDEX CONCURRENTLY IF EXISTS %s' % name,
+    )
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('auth', '0009_alter_user_last_name_max_length'),
+        ('user_auth', '0015_auto_20181008_1110'),
+    ]
+
+    operations = [create_index_operation(*index) for index in NAME_INDEXES]
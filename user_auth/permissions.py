@@ -1,6 +1,7 @@
 from rest_framework import permissions
 from user_auth.data_services import UserOrgAccessDataService
 from user_auth.exceptions import UserOrgAccessDoesNotExistError
+from user_auth.identity import get_request_identity
 
 import logging
 
@@ -15,7 +16,7 @@ class IsAdminForOrg(permissions.BasePermission):
 
     def has_permission(self, request, view):
         try:
-            user_org = UserOrgAccessDataService.get_user_org_access_by_user_profile(request.user.profile)
+            user_org = UserOrgAccessDataService.get_user_org_access_by_user_profile(get_request_identity(request).profile)
             return (user_org is not None) and user_org.is_admin
         except UserOrgAccessDoesNotExistError:
             logger.error('User org access does not exist for user')
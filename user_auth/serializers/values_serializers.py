@@ -0,0 +1,21 @@
+from flocarebase.common.values_serializer import Value
+
+# AddressSerializer
+ADDRESS_FIELDS = (
+    ('addressID', Value('uuid', str)),
+    ('apartmentNo', Value('apartment_no')),
+    ('streetAddress', Value('street_address')),
+    ('zipCode', Value('zip')),
+    ('city', Value('city')),
+    ('state', Value('state')),
+    ('country', Value('country')),
+    ('latitude', Value('latitude')),
+    ('longitude', Value('longitude')),
+)
+
+# AddressIDWithLatLngSerializer
+ADDRESS_ID_WITH_LAT_LNG_FIELDS = (
+    ('addressID', Value('uuid', str)),
+    ('latitude', Value('latitude')),
+    ('longitude', Value('longitude')),
+)
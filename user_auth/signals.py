@@ -0,0 +1,33 @@
+"""
+Invalidates the tokens cached by CachedTokenAuthentication when what they were resolved from changes
+"""
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from user_auth import models
+from user_auth.authentication import invalidate_cached_tokens
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_cached_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    # Covers deactivation, eg: UserDataService.delete_user_by_user_profile
+    if not created:
+        invalidate_cached_tokens(Token.objects.filter(user_id=instance.pk).values_list('key', flat=True))
+
+
+@receiver(post_save, sender=models.UserProfile)
+def invalidate_profile_tokens(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_cached_tokens(Token.objects.filter(user_id=instance.user_id).values_list('key', flat=True))
+
+
+@receiver(post_save, sender=models.UserOrganizationAccess)
+@receiver(post_delete, sender=models.UserOrganizationAccess)
+def invalidate_org_access_tokens(sender, instance, **kwargs):
+    invalidate_cached_tokens(Token.objects.filter(user__profile=instance.user_id).values_list('key', flat=True))
@@ -0,0 +1,57 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from flocarebase.common import test_helpers
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from user_auth.authentication import CachedTokenAuthentication, get_token_cache
+from user_auth.data_services.user_data_service import UserDataService
+from user_auth.models import UserOrganizationAccess
+
+
+class TestCachedTokenAuthentication(test_helpers.UserRequestTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.initObjects()
+        cls.key = Token.objects.get(user=cls.user_profile.user).key
+
+    def setUp(self):
+        get_token_cache().clear()
+        self.addCleanup(get_token_cache().clear)
+
+    def authenticate(self):
+        return CachedTokenAuthentication().authenticate_credentials(self.key)
+
+    def test_authenticates_from_cache(self):
+        "Should authenticate a cached token, with the profile and accesses of the caller, without any query"
+        self.authenticate()
+        with CaptureQueriesContext(connection) as captured:
+            user, token = self.authenticate()
+            identity = user.profile.identity
+            self.assertEqual(token.key, self.key)
+            self.assertEqual(user.profile, self.user_profile)
+            self.assertEqual(identity.organization, self.organization)
+            self.assertFalse(identity.is_admin)
+        self.assertEqual(len(captured.captured_queries), 0)
+
+    def test_rejects_deleted_token(self):
+        "Should reject a cached token once it is deleted"
+        self.authenticate()
+        Token.objects.filter(key=self.key).get().delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_rejects_deactivated_user(self):
+        "Should reject a cached token once its user is deleted"
+        self.authenticate()
+        UserDataService.delete_user_by_user_profile(self.user_profile)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_reloads_changed_org_access(self):
+        "Should load the accesses of the caller again once one of them is saved"
+        self.assertFalse(self.authenticate()[0].profile.identity.is_admin)
+        access = UserOrganizationAccess.objects.get(user=self.user_profile)
+        access.is_admin = True
+        access.save()
+        self.assertTrue(self.authenticate()[0].profile.identity.is_admin)
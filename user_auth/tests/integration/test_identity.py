@@ -0,0 +1,64 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from flocarebase.common import test_helpers
+from rest_framework import status
+from unittest.mock import MagicMock
+from user_auth.identity import get_request_identity
+from user_auth.models import UserOrganizationAccess
+
+
+class TestRequestIdentity(test_helpers.UserRequestTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.initObjects()
+
+    def get_identity(self):
+        # A fresh user instance per request, like the authentication returns
+        user = User.objects.get(pk=self.user_profile.user_id)
+        return get_request_identity(MagicMock(name='request', user=user))
+
+    def count_queries(self, captured, table):
+        return len([query for query in captured.captured_queries if ('FROM "%s"' % table) in query['sql']])
+
+    def test_resolves_org_access_once(self):
+        "Should fetch the accesses of the caller once, however often they are read"
+        identity = self.get_identity()
+        with CaptureQueriesContext(connection) as captured:
+            access = identity.get_org_access()
+            self.assertEqual(identity.organization, self.organization)
+            self.assertEqual(identity.role, access.user_role)
+            self.assertFalse(identity.is_admin)
+        self.assertEqual(len(captured.captured_queries), 1)
+
+    def test_raises_like_queryset_get(self):
+        "Should raise DoesNotExist when the caller has no matching access, and MultipleObjectsReturned for many"
+        with self.assertRaises(UserOrganizationAccess.DoesNotExist):
+            self.get_identity().get_admin_org_access()
+        UserOrganizationAccess.objects.create(user=self.user_profile, organization=test_helpers.create_organization(),
+                                              user_role='user_role', is_admin=True)
+        identity = self.get_identity()
+        self.assertTrue(identity.get_admin_org_access().is_admin)
+        with self.assertRaises(UserOrganizationAccess.MultipleObjectsReturned):
+            identity.get_org_access()
+
+    def test_admin_request_queries_caller_once(self):
+        "Should share the caller's access between the permission class and the view, and load the profile with the token"
+        test_helpers.make_user_admin(self.user_profile)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('org-access'), **self.get_base_headers())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        caller_queries = [query for query in captured.captured_queries
+                          if '"user_auth_userorganizationaccess"."user_id" = \'' in query['sql']]
+        self.assertEqual(len(caller_queries), 1)
+        self.assertEqual(self.count_queries(captured, 'user_auth_userprofile'), 0)
+
+    def test_phi_request_queries_caller_once(self):
+        "Should resolve the caller's organization for the phi views without querying the profile"
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get('/phi/v1.0/places/', **self.get_base_headers())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.count_queries(captured, 'user_auth_userorganizationaccess'), 1)
+        self.assertEqual(self.count_queries(captured, 'user_auth_userprofile'), 0)
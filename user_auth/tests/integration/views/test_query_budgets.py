@@ -0,0 +1,43 @@
+from flocarebase.common.test_helpers import QueryBudget, UserRequestTestCase, create_user, make_user_admin
+from user_auth import urls
+
+# Staff in the seeded organization. Above REPEATED_QUERY_THRESHOLD, so that a query per user shows up
+ROWS = 5
+
+
+class TestUserAuthQueryBudgets(UserRequestTestCase):
+    """
+    The most queries every route of user_auth.urls may take on the seeded dataset. Raise a budget only along-with a
+    change that needs more queries, never to make an N+1 pass
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.initObjects()
+        make_user_admin(cls.user_profile)
+        cls.staff = [create_user(cls.organization) for _ in range(ROWS)]
+
+    def get_budgets(self):
+        staff_id = self.staff[0].uuid
+        return [
+            QueryBudget('post', '/users/v1.0/get-user-for-id/', queries=2),
+            QueryBudget('post', '/users/v1.0/get-user-for-id/', {'userID': str(staff_id)}, queries=5),
+            QueryBudget('post', '/users/v1.0/create-staff/', {'user': {
+                'firstName': 'first', 'lastName': 'last', 'email': 'new_staff@example.com', 'password': 'password',
+                'phone': '1234567890', 'role': 'RN'}}, queries=12, status=201),
+            QueryBudget('get', '/users/v1.0/get-staff-for-id/%s/' % staff_id, queries=6),
+            QueryBudget('put', '/users/v1.0/update-staff-for-id/%s/' % staff_id,
+                        {'user': {'firstName': 'first', 'role': 'PT'}}, queries=17),
+            QueryBudget('delete', '/users/v1.0/delete-staff-for-id/%s/' % staff_id, queries=35),
+            QueryBudget('get', '/users/v1.0/org-access/', queries=3),
+            QueryBudget('get', '/users/v1.0/org-access/', {'cursor': '', 'size': ROWS}, queries=3),
+            QueryBudget('get', '/users/v1.0/org-access/', {'query': 'firstName', 'sort': 'lastName'}, queries=3),
+        ]
+
+    def test_query_budgets(self):
+        "Should keep every route within its query budget, without repeated statements"
+        self.assertQueryBudgets(self.get_budgets())
+
+    def test_budgets_cover_every_route(self):
+        "Should have a query budget for every route"
+        self.assertRoutesCovered(urls, self.get_budgets())
@@ -357,3 +357,24 @@ class TestUserOrganizationView(test_helpers.UserRequestTestCase):
                 ]
         }
         self.assertJSONEqual(str(response.content, encoding='utf8'), expected_response)
+
+    def test_with_cursor(self):
+        """Pages through the users with the next-cursor header if a cursor is passed"""
+        test_helpers.make_user_admin(self.user_profile)
+        for last_name in ['b', 'a', 'b', 'c']:
+            test_helpers.create_user(self.organization, last_name=last_name)
+
+        url = reverse('org-access')
+        params = {'cursor': '', 'size': 2, 'sort': 'last_name'}
+        user_ids = list()
+        while True:
+            response = self.client.get(url, params, **self.get_base_headers())
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            user_ids.extend(user['id'] for user in response.data['users'])
+            if not response.has_header('next-cursor'):
+                break
+            params['cursor'] = response['next-cursor']
+
+        accesses = UserOrganizationAccess.objects.filter(organization=self.organization)\
+            .order_by('user__user__last_name', 'pk')
+        self.assertListEqual(user_ids, [str(access.user_id) for access in accesses])
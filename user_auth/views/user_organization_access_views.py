@@ -3,8 +3,9 @@ from rest_framework import status
 from rest_framework.views import APIView
 from user_auth.constants import query_to_db_field_map
 from user_auth.data_services import UserOrgAccessDataService
-from user_auth.decorators import handle_user_org_missing
+from user_auth.decorators import handle_request_exceptions, handle_user_org_missing
 from user_auth.permissions import IsAdminForOrg
+from flocarebase.common.pagination import is_cursor_request, paginate_by_cursor, set_next_cursor
 from flocarebase.response_formats import SuccessResponse
 from user_auth.serializers.response_serializers import AdminUserResponseSerializer
 
@@ -47,15 +48,23 @@ class UserOrganizationView(APIView):
             query_set = query_set[:size]
         return query_set
 
+    @handle_request_exceptions
     @handle_user_org_missing
     def get(self, request):
         user_org = UserOrgAccessDataService.get_user_org_access_by_user_profile(request.user.profile)
         organization = user_org.organization
         query, sort_field, size = self.parse_query_params(request.query_params)
+        cursor_request = is_cursor_request(request.query_params)
 
         # Get list of all users in that org
         user_ids = request.GET.getlist('ids')
-        accesses = self.filter_by_params(user_ids, organization, query, sort_field, size)
+        # The page size of a cursor request is applied by the cursor pagination
+        accesses = self.filter_by_params(user_ids, organization, query, sort_field, None if cursor_request else size)
+        if cursor_request:
+            accesses, next_cursor = paginate_by_cursor(accesses, sort_field, request.query_params)
         # TODO Remove organization - why is org required?
         serializer = AdminUserResponseSerializer({'organization': organization, 'users': accesses})
-        return SuccessResponse(status.HTTP_200_OK, serializer.data)
+        response = SuccessResponse(status.HTTP_200_OK, serializer.data)
+        if cursor_request:
+            set_next_cursor(response, next_cursor)
+        return response